@@ -0,0 +1,217 @@
+"""Benchmarks the DocuMint pipeline on synthetic data.
+
+Every scenario generates a data file and a template, then times reading
+the rows, validating them and a full run through `process_emails` with
+the stub converter and the stub transport. No Word, LibreOffice or mail
+server is needed, so the suite runs on plain Linux. Results are saved per
+commit in benchmarks/results/, so runs can be compared across commits.
+
+Usage:
+    python benchmarks/bench.py run [--rows 1000 10000] [--columns 8] [--templates plain tables full]
+                                   [--format csv] [--mode pipeline] [--render-workers 2] [--native-pdf]
+    python benchmarks/bench.py run --suite full
+    python benchmarks/bench.py compare BASE_COMMIT [NEW_COMMIT]
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCHMARKS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+REPO_FOLDER = os.path.dirname(BENCHMARKS_FOLDER)
+RESULTS_FOLDER = os.path.join(BENCHMARKS_FOLDER, "results")
+sys.path.insert(0, REPO_FOLDER)
+
+from synthetic import TEMPLATES, write_dataset, write_template
+
+SUITES = {
+    "quick": [1000],
+    "standard": [1000, 10000],
+    "full": [1000, 10000, 100000, 1000000],
+}
+
+def git_revision():
+    """Returns the current commit, with "-dirty" if there are local changes."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_FOLDER,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_FOLDER,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if dirty else commit
+
+def run_scenario(work_folder, rows, columns, complexity, data_format, mode, render_workers, native_pdf=False):
+    """Times one dataset size and template through every stage.
+
+    Returns:
+        dict: The scenario's settings and timings.
+    """
+    from core import process_emails
+    from metrics import Metrics
+    from ratelimit import RateLimiter
+    from sources import iter_rows, read_columns
+    from template import CompiledTemplate
+    from transports import StubTransport
+    from validation import validate_dataset
+
+    folder = tempfile.mkdtemp(dir=work_folder)
+    data_file = os.path.join(folder, f"data.{data_format}")
+    template_file = os.path.join(folder, "template.docx")
+    pdf_folder = os.path.join(folder, "pdf")
+    logs_folder = os.path.join(folder, "logs")
+    os.makedirs(pdf_folder)
+    os.makedirs(logs_folder)
+    write_dataset(data_file, rows, columns)
+    write_template(template_file, columns, complexity)
+
+    start = time.perf_counter()
+    for _ in iter_rows(data_file):
+        pass
+    read_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    template = CompiledTemplate(template_file)
+    compile_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    report = validate_dataset(data_file, read_columns(data_file), template.placeholders, "Admit_{<ID>}")
+    validate_seconds = time.perf_counter() - start
+
+    metrics = Metrics()
+    transport = StubTransport()
+    errors = []
+    start = time.perf_counter()
+    process_emails(
+        data_file, template_file, pdf_folder, logs_folder,
+        lambda message: errors.append(message) if message.startswith(("❌", "FAILED")) else None,
+        "Benchmark", "<p>Dear {<Name>}, your ID is {<ID>}.</p>", "Admit_{<ID>}",
+        retries=1, delay=0,
+        converter="stub",
+        render_workers=render_workers if mode == "pipeline" else 0,
+        batch_size=100 if mode == "batch" else 0,
+        rate_limiter=RateLimiter(),
+        transport=transport,
+        validate=False,
+        metrics=metrics,
+        native_pdf=native_pdf,
+    )
+    run_seconds = time.perf_counter() - start
+    shutil.rmtree(folder, ignore_errors=True)
+
+    snapshot = metrics.snapshot()
+    return {
+        "rows": rows,
+        "columns": columns,
+        "template": complexity,
+        "format": data_format,
+        "mode": mode,
+        "render_workers": render_workers if mode == "pipeline" else 0,
+        "native_pdf": native_pdf,
+        "read_seconds": read_seconds,
+        "compile_seconds": compile_seconds,
+        "validate_seconds": validate_seconds,
+        "run_seconds": run_seconds,
+        "rows_per_minute": rows / run_seconds * 60 if run_seconds else 0.0,
+        "sent": transport.sent,
+        "errors": len(errors) + len(report.errors),
+        "stages": snapshot["stages"],
+    }
+
+def scenario_name(result):
+    name = (f"{result['rows']} rows x {result['columns']} cols, {result['template']}, "
+            f"{result['format']}, {result['mode']}")
+    return name + ", native PDF" if result.get("native_pdf") else name
+
+def print_result(result):
+    stages = ", ".join(f"{stage} p50 {figures['p50'] * 1000:.1f} ms" for stage, figures in result["stages"].items())
+    print(f"{scenario_name(result)}: {result['rows_per_minute']:.0f} rows/min "
+          f"(read {result['read_seconds']:.2f}s, validate {result['validate_seconds']:.2f}s, "
+          f"run {result['run_seconds']:.2f}s; {stages})", flush=True)
+    if result["errors"]:
+        print(f"  ⚠ {result['errors']} rows failed; the timings may be misleading.", flush=True)
+
+def save_results(revision, results):
+    """Writes the results of this commit to benchmarks/results/<commit>.json."""
+    os.makedirs(RESULTS_FOLDER, exist_ok=True)
+    path = os.path.join(RESULTS_FOLDER, f"{revision}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "commit": revision,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": sys.platform,
+            "results": results,
+        }, f, indent=4)
+    return path
+
+def load_results(revision):
+    path = os.path.join(RESULTS_FOLDER, f"{revision}.json")
+    with open(path, encoding="utf-8") as f:
+        return {scenario_name(result): result for result in json.load(f)["results"]}
+
+def compare(base, new):
+    """Prints the throughput and stage latencies of two commits side by side."""
+    old_results = load_results(base)
+    new_results = load_results(new)
+    for name, result in new_results.items():
+        previous = old_results.get(name)
+        if previous is None:
+            print(f"{name}: {result['rows_per_minute']:.0f} rows/min (no result for {base})")
+            continue
+        change = (result["rows_per_minute"] / previous["rows_per_minute"] - 1) * 100 if previous["rows_per_minute"] else 0
+        print(f"{name}: {previous['rows_per_minute']:.0f} -> {result['rows_per_minute']:.0f} rows/min ({change:+.1f}%)")
+        for stage, figures in result["stages"].items():
+            before = previous["stages"].get(stage)
+            if before:
+                print(f"  {stage}: p50 {before['p50'] * 1000:.1f} -> {figures['p50'] * 1000:.1f} ms, "
+                      f"p95 {before['p95'] * 1000:.1f} -> {figures['p95'] * 1000:.1f} ms")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="Run the benchmarks and save the results for this commit.")
+    run.add_argument("--suite", choices=sorted(SUITES), default="quick", help="Preset dataset sizes (default: quick).")
+    run.add_argument("--rows", type=int, nargs="+", help="Dataset sizes; overrides --suite.")
+    run.add_argument("--columns", type=int, nargs="+", default=[8], help="Column counts (default: 8).")
+    run.add_argument("--templates", nargs="+", choices=TEMPLATES, default=list(TEMPLATES), help="Template complexities.")
+    run.add_argument("--format", choices=("csv", "xlsx", "parquet"), default="csv", help="Data file format (default: csv).")
+    run.add_argument("--mode", choices=("serial", "pipeline", "batch"), default="pipeline",
+                     help="How process_emails runs (default: pipeline).")
+    run.add_argument("--render-workers", type=int, default=2, help="Render processes in pipeline mode (default: 2).")
+    run.add_argument("--native-pdf", action="store_true",
+                     help="Render PDFs natively instead of with the stub converter where the template allows.")
+    run.add_argument("--no-save", action="store_true", help="Don't write the results file.")
+    comparison = commands.add_parser("compare", help="Compare the saved results of two commits.")
+    comparison.add_argument("base", help="The earlier commit.")
+    comparison.add_argument("new", nargs="?", help="The later commit (default: the current one).")
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        compare(args.base, args.new or git_revision())
+        return 0
+
+    revision = git_revision()
+    results = []
+    work_folder = tempfile.mkdtemp(prefix="documint-bench-")
+    try:
+        for rows in args.rows or SUITES[args.suite]:
+            for columns in args.columns:
+                for complexity in args.templates:
+                    result = run_scenario(work_folder, rows, columns, complexity, args.format, args.mode,
+                                          args.render_workers, args.native_pdf)
+                    print_result(result)
+                    results.append(result)
+    finally:
+        shutil.rmtree(work_folder, ignore_errors=True)
+    if not args.no_save:
+        print(f"Saved results to {save_results(revision, results)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
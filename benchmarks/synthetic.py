@@ -0,0 +1,124 @@
+"""Synthetic data files and templates for the benchmarks."""
+import csv
+import os
+import random
+
+# Template complexities, from cheapest to most expensive to render.
+TEMPLATES = ("plain", "tables", "full")
+
+FIRST_NAMES = ("Ava", "Noah", "Mia", "Liam", "Zoe", "Omar", "Priya", "Chen", "Sofia", "Kwame")
+LAST_NAMES = ("Khan", "Smith", "Garcia", "Okafor", "Nguyen", "Rossi", "Müller", "Silva", "Ito", "Haddad")
+
+def column_names(columns):
+    """Returns `columns` column names: ID, Name and Email, then Field4, Field5, ..."""
+    names = ["ID", "Name", "Email"]
+    return names + [f"Field{i}" for i in range(len(names) + 1, columns + 1)]
+
+def _rows(rows, columns, seed):
+    rng = random.Random(seed)
+    extra = len(column_names(columns)) - 3
+    for i in range(rows):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        values = [100000 + i, name, f"user{i}@example.com"]
+        values += ["".join(rng.choices("abcdefghijklmnopqrstuvwxyz ", k=rng.randint(4, 24))).strip() or "x"
+                   for _ in range(extra)]
+        yield values
+
+def write_dataset(path, rows, columns=8, seed=0):
+    """Writes a data file of `rows` rows with unique IDs and emails.
+
+    The format follows the extension: .csv, .xlsx (requires openpyxl) or
+    .parquet (requires pyarrow). Rows are written as they are generated, so
+    a million rows need little memory except for Parquet.
+
+    Args:
+        path (str): The file to write.
+        rows (int): Number of data rows.
+        columns (int, optional): Number of columns, at least 3.
+        seed (int, optional): Seed for the random values.
+    """
+    columns = max(3, columns)
+    header = column_names(columns)
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(_rows(rows, columns, seed))
+    elif extension == ".xlsx":
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(header)
+        for values in _rows(rows, columns, seed):
+            sheet.append(values)
+        workbook.save(path)
+    elif extension == ".parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        data = list(zip(*_rows(rows, columns, seed))) or [[] for _ in header]
+        pq.write_table(pa.table({name: list(values) for name, values in zip(header, data)}), path)
+    else:
+        raise ValueError(f"Unsupported dataset type '{extension}'")
+
+def _add_placeholder_run(paragraph, column, split):
+    """Adds `<column>`, optionally split over runs like Word often does."""
+    placeholder = f"<{column}>"
+    if split and len(placeholder) > 3:
+        paragraph.add_run(placeholder[:2])
+        paragraph.add_run(placeholder[2:-1]).bold = True
+        paragraph.add_run(placeholder[-1:])
+    else:
+        paragraph.add_run(placeholder)
+
+def write_template(path, columns=8, complexity="plain"):
+    """Writes a .docx template that uses every column of a synthetic dataset.
+
+    Args:
+        path (str): The .docx file to write.
+        columns (int, optional): Number of dataset columns.
+        complexity (str, optional): "plain" is a few paragraphs. "tables"
+            adds a table with one row per column and a nested table.
+            "full" adds placeholders in the header and footer, placeholders
+            split over several runs, and ten pages of body text.
+    """
+    from docx import Document
+
+    if complexity not in TEMPLATES:
+        raise ValueError(f"Unknown template complexity '{complexity}'. Choose from: {', '.join(TEMPLATES)}")
+    names = column_names(max(3, columns))
+    split = complexity == "full"
+    doc = Document()
+    doc.add_heading("Admit Card", level=1)
+    paragraph = doc.add_paragraph("Dear ")
+    _add_placeholder_run(paragraph, "Name", split)
+    paragraph.add_run(", your ID is ")
+    _add_placeholder_run(paragraph, "ID", split)
+    paragraph.add_run(".")
+    for name in names[3:]:
+        paragraph = doc.add_paragraph(f"{name}: ")
+        _add_placeholder_run(paragraph, name, split)
+
+    if complexity in ("tables", "full"):
+        table = doc.add_table(rows=len(names), cols=2)
+        for row, name in zip(table.rows, names):
+            row.cells[0].text = name
+            _add_placeholder_run(row.cells[1].paragraphs[0], name, split)
+        nested = table.rows[0].cells[0].add_table(rows=1, cols=2)
+        nested.rows[0].cells[0].text = "Candidate"
+        nested.rows[0].cells[1].text = "<Name> (<ID>)"
+
+    if complexity == "full":
+        section = doc.sections[0]
+        section.header.paragraphs[0].text = "Admit card for <Name>, ID <ID>"
+        section.footer.paragraphs[0].text = "Sent to <Email>"
+        filler = "Candidates must bring this card and a photo ID. " * 8
+        for page in range(10):
+            doc.add_page_break()
+            doc.add_heading(f"Instructions, page {page + 1}", level=2)
+            for name in names:
+                paragraph = doc.add_paragraph(filler)
+                _add_placeholder_run(paragraph, name, split)
+    doc.save(path)
@@ -0,0 +1,299 @@
+"""Writes the documents of every row into one bundle instead of separate files.
+
+Two bundle formats are supported, chosen by the extension of the bundle:
+
+* .pdf: one merged PDF, every row starting on a new page, optionally with
+  a bookmark per row in the PDF outline.
+* .zip: an archive of the individual PDFs, streamed into it as they are
+  made.
+
+Where the template allows it, rows are laid out by the native PDF renderer
+and written straight into the bundle, so no .docx or per-row PDF ever
+touches the disk. Otherwise a merged PDF comes from converting one merged
+.docx in a single converter call, and zipped PDFs are converted in batches
+in a temporary folder.
+"""
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from docx import Document
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls, qn
+from converters import ConverterPool, get_converter_factory
+from pdfrender import NativePdfRenderer, PdfWriter, UnsupportedDocument
+from sources import iter_rows, read_columns
+from template import CompiledTemplate
+from texttemplate import RowFormatter, unique_filename
+
+BUNDLE_TYPES = {".pdf": "merged", ".zip": "zip"}
+
+# Rows converted per office converter call when zipping a template the
+# native renderer can't handle.
+ZIP_BATCH_SIZE = 50
+
+# Rows between progress messages.
+PROGRESS_EVERY = 500
+
+class _NativeFallback(Exception):
+    """A row of a natively merged PDF needs the office converter after all."""
+
+def bundle_type(bundle_path):
+    """Returns "merged" or "zip" for a bundle path, by its extension.
+
+    Raises:
+        ValueError: If the extension is neither .pdf nor .zip.
+    """
+    extension = os.path.splitext(bundle_path)[1].lower()
+    try:
+        return BUNDLE_TYPES[extension]
+    except KeyError:
+        raise ValueError(f"Unsupported bundle type '{extension}'. Use a .pdf or .zip file.")
+
+def _bookmark_name(number, title):
+    """Returns a valid Word bookmark name: a letter first, at most 40 characters."""
+    return f"R{number}_{re.sub(r'[^0-9A-Za-z]+', '_', title)}".rstrip("_")[:40]
+
+def _plan(rows, formatter, log_callback):
+    """Works out the replacements, file name and bookmark title of each row.
+
+    Rows whose name or title can't be formatted are logged and left out.
+
+    Yields:
+        tuple: `(index, replacements, filename, title)`; title is None
+            unless the formatter has a `bookmark` format.
+    """
+    with_titles = "bookmark" in formatter.templates
+    for index, row in rows:
+        replacements = formatter.replacements(row)
+        try:
+            filename = formatter.filename(replacements)
+            title = formatter.format("bookmark", replacements) if with_titles else None
+        except (KeyError, ValueError, IndexError) as e:
+            log_callback(f"FAILED: Could not name row {index + 2}: {str(e)}")
+            continue
+        yield index, replacements, filename, title
+
+def _progress(count, log_callback):
+    if count % PROGRESS_EVERY == 0:
+        log_callback(f"Bundled {count} documents...")
+
+def export_bundle(data_file, template_file, bundle_path, log_callback, pdf_filename_format="Admit_{<ID>}",
+                  bookmark_format=None, converter="auto", native_pdf=True):
+    """Renders every row of a data file into one merged PDF or zip archive.
+
+    No email is sent. The bundle is written next to its final path and
+    only renamed into place once complete, so a failed run never leaves a
+    half-written bundle behind.
+
+    Args:
+        data_file (str): Path to the data file (.xlsx, .xls, .csv or .parquet).
+        template_file (str): Path to the .docx template file.
+        bundle_path (str): The .pdf or .zip file to write.
+        log_callback (function): A function to call for logging messages.
+        pdf_filename_format (str, optional): The format for the names of
+            the PDFs in a zip archive.
+        bookmark_format (str, optional): The format of each row's bookmark
+            in a merged PDF, e.g. "{<Name>} ({<ID>})". The bookmarks form the
+            PDF outline when the native renderer is used; an office suite
+            only gets them as Word bookmarks in the merged .docx. Defaults to
+            no bookmarks.
+        converter (str, optional): The PDF converter backend for templates
+            the native renderer can't handle. Defaults to "auto".
+        native_pdf (bool, optional): Lay out simple templates in-process.
+            Defaults to True.
+
+    Returns:
+        int: The number of documents in the bundle, or None if no bundle
+            was written.
+    """
+    try:
+        kind = bundle_type(bundle_path)
+    except ValueError as e:
+        log_callback(f"❌ {str(e)}")
+        return None
+    if not os.access(data_file, os.R_OK):
+        log_callback(f"❌ The data file '{data_file}' is not accessible. Please close it and try again.")
+        return None
+    try:
+        read_columns(data_file)
+    except Exception as e:
+        log_callback(f"❌ Error reading data file: {str(e)}")
+        return None
+    try:
+        template = CompiledTemplate(template_file)
+    except Exception as e:
+        log_callback(f"❌ Error reading template file: {str(e)}")
+        return None
+    try:
+        formatter = RowFormatter(template.placeholders, filename=pdf_filename_format, bookmark=bookmark_format or None)
+    except ValueError as e:
+        log_callback(f"❌ {str(e)}")
+        return None
+
+    native = None
+    if native_pdf:
+        try:
+            native = NativePdfRenderer(template)
+        except Exception as e:
+            log_callback(f"⚠ Native PDF rendering disabled: {str(e)}")
+        else:
+            if native.unsupported:
+                log_callback(f"⚠ The template uses {', '.join(native.unsupported)}, which the native PDF renderer "
+                             f"doesn't support; converting with the '{converter}' converter instead.")
+                native = None
+
+    planned = _plan(iter_rows(data_file), formatter, log_callback)
+    partial_path = bundle_path + ".part"
+    try:
+        if kind == "zip":
+            count = _write_zip(partial_path, template, native, planned, converter, log_callback)
+        else:
+            count = None
+            if native is not None:
+                try:
+                    count = _write_merged_native(partial_path, template, native, planned, log_callback)
+                except _NativeFallback as e:
+                    log_callback(f"⚠ {str(e)}; merging with the '{converter}' converter instead.")
+                    # The rows are read again rather than kept in memory, so
+                    # rows that can't be named may be reported twice.
+                    planned = _plan(iter_rows(data_file), formatter, log_callback)
+            if count is None:
+                if template.has_placeholders_outside_body:
+                    log_callback("⚠ Placeholders in headers, footers or notes are left as is in a merged document.")
+                count = _write_merged_docx(partial_path, template_file, template, planned, converter, log_callback)
+        os.replace(partial_path, bundle_path)
+    except Exception as e:
+        log_callback(f"❌ Error writing the bundle: {str(e)}")
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        return None
+    log_callback(f"SUCCESS: Wrote {count} documents to {bundle_path}")
+    return count
+
+def _write_merged_native(path, template, native, planned, log_callback):
+    """Lays out every row natively and appends its pages to one PDF.
+
+    Raises:
+        _NativeFallback: If a row can't be rendered natively.
+    """
+    count = 0
+    with open(path, "wb") as f:
+        writer = PdfWriter(f)
+        for index, replacements, filename, title in planned:
+            try:
+                pages, width, height = native.pages(template.render(replacements))
+            except UnsupportedDocument as e:
+                raise _NativeFallback(f"Row {index + 2} can't be rendered natively ({str(e)})") from e
+            first_page = None
+            for content in pages:
+                page = writer.add_page(content, width, height)
+                first_page = first_page or page
+            if title and first_page:
+                writer.add_bookmark(title, first_page)
+            count += 1
+            _progress(count, log_callback)
+        writer.close()
+    return count
+
+def _write_merged_docx(path, template_file, template, planned, converter, log_callback):
+    """Merges the bodies of every row into one .docx and converts it once."""
+    folder = tempfile.mkdtemp(prefix="documint-bundle-")
+    try:
+        merged = Document(template_file)
+        body = merged.element.body
+        sect_pr = body.find(qn("w:sectPr"))
+        for child in list(body):
+            if child is not sect_pr:
+                body.remove(child)
+
+        def add(element):
+            if sect_pr is not None:
+                sect_pr.addprevious(element)
+            else:
+                body.append(element)
+
+        count = 0
+        for index, replacements, filename, title in planned:
+            rendered = template.render(replacements).element.body
+            if count:
+                add(parse_xml(f'<w:p {nsdecls("w")}><w:r><w:br w:type="page"/></w:r></w:p>'))
+            if title:
+                add(parse_xml(f'<w:bookmarkStart {nsdecls("w")} w:id="{count}" w:name="{_bookmark_name(count, title)}"/>'))
+            for child in list(rendered):
+                if child.tag != qn("w:sectPr"):
+                    add(child)
+            if title:
+                add(parse_xml(f'<w:bookmarkEnd {nsdecls("w")} w:id="{count}"/>'))
+            count += 1
+            _progress(count, log_callback)
+
+        docx_path = os.path.join(folder, "bundle.docx")
+        merged.save(docx_path)
+        log_callback(f"Converting the merged document of {count} rows...")
+        # One call converts the whole bundle, so allow it time per row.
+        pool = ConverterPool(get_converter_factory(converter), timeout=120 + 2 * count)
+        try:
+            pool.convert(docx_path, path)
+        finally:
+            pool.close()
+        return count
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+def _write_zip(path, template, native, planned, converter, log_callback):
+    """Streams the PDF of every row into a zip archive."""
+    count = 0
+    used = set()
+    pending = []
+    folder = pool = None
+    try:
+        # PDFs are compressed already; storing them is much faster.
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED, allowZip64=True) as archive:
+
+            def flush():
+                nonlocal count
+                if not pending:
+                    return
+                results = pool.convert_many([(docx_path, pdf_path) for _, _, docx_path, pdf_path in pending],
+                                            ZIP_BATCH_SIZE)
+                for (index, name, docx_path, pdf_path), error in zip(pending, results):
+                    if error is None:
+                        archive.write(pdf_path, name)
+                        count += 1
+                        _progress(count, log_callback)
+                    else:
+                        log_callback(f"FAILED: Word to PDF conversion error for row {index + 2}: {str(error)}")
+                    for leftover in (docx_path, pdf_path):
+                        if os.path.exists(leftover):
+                            os.remove(leftover)
+                pending.clear()
+
+            for index, replacements, filename, title in planned:
+                name = unique_filename(f"{filename}.pdf", used)
+                document = template.render(replacements)
+                if native is not None:
+                    try:
+                        archive.writestr(name, native.to_pdf(document))
+                    except UnsupportedDocument:
+                        pass
+                    else:
+                        count += 1
+                        _progress(count, log_callback)
+                        continue
+                if pool is None:
+                    folder = tempfile.mkdtemp(prefix="documint-bundle-")
+                    pool = ConverterPool(get_converter_factory(converter))
+                stem = os.path.join(folder, str(index))
+                document.save(stem + ".docx")
+                pending.append((index, name, stem + ".docx", stem + ".pdf"))
+                if len(pending) >= ZIP_BATCH_SIZE:
+                    flush()
+            flush()
+    finally:
+        if pool is not None:
+            pool.close()
+        if folder is not None:
+            shutil.rmtree(folder, ignore_errors=True)
+    return count
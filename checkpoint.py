@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+from runlog import RunLog, read_records
+
+JOURNAL_FILENAME = "documint_journal.jsonl"
+
+RENDERED = "rendered"
+CONVERTED = "converted"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+class UnfinishedRunError(Exception):
+    """Raised when a new run would replace the journal of a run that didn't finish."""
+
+def is_unfinished(path):
+    """Returns True if the journal at `path` belongs to a run that stopped early.
+
+    A run that got through all of its rows ends its journal with a
+    `finished` record. A journal with row states after the last such record
+    was left by a run that crashed, was closed or was cancelled.
+    """
+    if not os.path.exists(path):
+        return False
+    unfinished = False
+    for record in read_records(path):
+        if "finished" in record:
+            unfinished = False
+        elif "key" in record:
+            unfinished = True
+    return unfinished
+
+def archive_journal(path):
+    """Renames a journal with a timestamp, e.g. to documint_journal.20240101-120000.jsonl.
+
+    Returns:
+        str: The new path.
+    """
+    stem, extension = os.path.splitext(path)
+    target = f"{stem}.{datetime.now():%Y%m%d-%H%M%S}{extension}"
+    number = 2
+    while os.path.exists(target):
+        target = f"{stem}.{datetime.now():%Y%m%d-%H%M%S}-{number}{extension}"
+        number += 1
+    os.replace(path, target)
+    return target
+
+def row_key(row, id_column=None):
+    """Returns a stable identity for a data row.
+
+    Args:
+        row (dict): The data row, mapping column names to values.
+        id_column (str, optional): A column that uniquely identifies rows.
+            If omitted, the key is a hash of all of the row's values, so
+            identical rows share a key.
+
+    Returns:
+        str: The row's key.
+    """
+    if id_column:
+        return f"{id_column}={str(row.get(id_column, '')).strip()}"
+    values = json.dumps([(str(column), str(value).strip()) for column, value in sorted(row.items())], ensure_ascii=False)
+    return hashlib.sha1(values.encode("utf-8")).hexdigest()
+
+class Checkpoint:
+    """A durable journal of how far each row of a run has got.
+
+    Every state change is appended to a .jsonl file as it happens, so the
+    journal survives a crash and a later run can pick up where this one
+    stopped. A row is marked `sending` before its email is handed to the
+    transport and `sent` afterwards. If a run dies between the two, the row
+    stays `sending` and is never sent again automatically, because nobody
+    can tell whether the email went out.
+    """
+
+    def __init__(self, path, id_column=None, resume=False, run_info=None, fresh=False):
+        """Opens the journal.
+
+        Args:
+            path (str): Path to the journal file.
+            id_column (str, optional): Passed to `row_key`.
+            resume (bool, optional): If True, the states recorded by earlier
+                runs are loaded and kept; otherwise the journal starts empty.
+            run_info (dict, optional): Describes the run, e.g. the data and
+                template files. Recorded when a journal is started.
+            fresh (bool, optional): Start empty even if the journal belongs
+                to a run that didn't finish. That journal is archived, see
+                `archive_journal`, rather than deleted.
+
+        Raises:
+            UnfinishedRunError: If the journal belongs to a run that didn't
+                finish and neither `resume` nor `fresh` is set.
+        """
+        self.path = path
+        self.id_column = id_column
+        self.states = {}
+        self.run_info = {}
+        self.archived = None
+        if resume and os.path.exists(path):
+            for record in read_records(path):
+                if "run" in record:
+                    self.run_info = record["run"]
+                elif "key" in record:
+                    self.states[record["key"]] = record["state"]
+        elif is_unfinished(path):
+            if not fresh:
+                raise UnfinishedRunError("The last run in this logs folder did not finish. Resume it, or start a "
+                                         "fresh run explicitly; rows it already sent would then be sent again.")
+            self.archived = archive_journal(path)
+        elif os.path.exists(path):
+            os.remove(path)
+        self._log = RunLog(path)
+        if not self.run_info and run_info:
+            self.run_info = dict(run_info)
+            self._log.append({"run": self.run_info})
+
+    def key(self, row):
+        """Returns the journal key of a data row."""
+        return row_key(row, self.id_column)
+
+    def state(self, row):
+        """Returns the last recorded state of a row, or None."""
+        return self.states.get(self.key(row))
+
+    def mark(self, row, state, error=None):
+        """Records that a row reached a state.
+
+        Args:
+            row (dict): The data row.
+            state (str): One of RENDERED, CONVERTED, SENDING, SENT or FAILED.
+            error (str, optional): Why the row failed.
+        """
+        key = self.key(row)
+        self.states[key] = state
+        record = {"key": key, "state": state}
+        if error is not None:
+            record["error"] = str(error)
+        self._log.append(record)
+
+    def counts(self):
+        """Returns the number of rows in each state."""
+        counts = {}
+        for state in self.states.values():
+            counts[state] = counts.get(state, 0) + 1
+        return counts
+
+    def finish(self):
+        """Records that the run got through all of its rows."""
+        self._log.append({"finished": datetime.now().isoformat(timespec="seconds")})
+
+    def close(self):
+        self._log.close()
@@ -0,0 +1,312 @@
+"""Runs DocuMint without the GUI, e.g. from a scheduler.
+
+Usage:
+    python cli.py --config config.json [--dry-run | --test-email ADDRESS | --resume | --bundle FILE]
+                  [--render-workers N] [--converter-workers N] [--send-workers N]
+                  [--async-sends N] [--converter NAME] [--native-pdf] [--json]
+
+With --bundle, no email is sent: every row is written into one merged .pdf
+or a .zip of PDFs instead, see `bundle.export_bundle`.
+
+The config file is the one the GUI saves. Settings given as flags override
+it. The SMTP password is read from the DOCUMINT_SMTP_PASSWORD environment
+variable, because it is never stored in the config.
+
+Exit codes:
+    0  Every row succeeded.
+    1  The run finished, but some rows failed.
+    2  The command line or config file is invalid.
+    3  The run could not start, e.g. the data file is unreadable.
+    130  Interrupted.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+EXIT_OK = 0
+EXIT_ROWS_FAILED = 1
+EXIT_USAGE = 2
+EXIT_ABORTED = 3
+EXIT_INTERRUPTED = 130
+
+REQUIRED_SETTINGS = ("data_file", "template_file", "pdf_folder", "logs_folder")
+BUNDLE_SETTINGS = ("data_file", "template_file")
+
+# Defaults match the GUI's, except that settings missing from the config
+# keep the plain serial run of `process_emails`: no render processes and no
+# PDF cache unless the config or a flag asks for them.
+DEFAULTS = {
+    "pdf_filename_format": "Admit_{<ID>}",
+    "email_subject": "Your Admit Card and Instructions",
+    "email_body": "",
+    "attachments": "",
+    "retries": 2,
+    "delay": 2,
+    "burst": 1,
+    "domain_limit": 0,
+    "id_column": "",
+    "render_workers": 0,
+    "converter_workers": 1,
+    "send_workers": 1,
+    "async_sends": 0,
+    "pdf_cache_mb": 0,
+    "native_pdf": False,
+    "bookmark_format": "",
+    "converter": "auto",
+    "batch_size": 0,
+    "transport": "outlook",
+    "smtp_host": "",
+    "smtp_port": 587,
+    "smtp_starttls": True,
+    "smtp_username": "",
+    "smtp_sender": "",
+    "smtp_connections": 4,
+}
+
+def classify(message):
+    """Returns the kind of a `process_emails` log message.
+
+    Returns:
+        str: "success", "failed", "skipped", "error", "warning" or "info".
+    """
+    if message.startswith("["):
+        # Messages of queued jobs start with the job's name, see jobqueue.py.
+        message = message.partition("] ")[2] or message
+    if message.startswith(("SUCCESS", "DRY RUN")):
+        return "success"
+    if message.startswith("FAILED"):
+        return "failed"
+    if message.startswith("SKIPPED"):
+        return "skipped"
+    if message.startswith("❌"):
+        return "error"
+    if message.startswith("⚠"):
+        return "warning"
+    return "info"
+
+class ProgressReporter:
+    """Prints `process_emails` log messages and counts row outcomes.
+
+    In JSON mode every message is one JSON object per line on stdout, with
+    running totals, so another program can follow the run.
+    """
+
+    def __init__(self, as_json=False, stream=sys.stdout):
+        self.as_json = as_json
+        self.stream = stream
+        self.counts = {"success": 0, "failed": 0, "skipped": 0, "error": 0, "warning": 0, "info": 0}
+        self.started = time.monotonic()
+
+    def __call__(self, message):
+        kind = classify(message)
+        self.counts[kind] += 1
+        if self.as_json:
+            self.emit("log", kind=kind, message=message)
+        else:
+            print(message, file=self.stream, flush=True)
+
+    def emit(self, event, **fields):
+        record = {
+            "event": event,
+            "elapsed": round(time.monotonic() - self.started, 3),
+            "succeeded": self.counts["success"],
+            "failed": self.counts["failed"],
+            "skipped": self.counts["skipped"],
+        }
+        record.update(fields)
+        print(json.dumps(record), file=self.stream, flush=True)
+
+    def exit_code(self):
+        if self.counts["error"]:
+            return EXIT_ABORTED
+        if self.counts["failed"]:
+            return EXIT_ROWS_FAILED
+        return EXIT_OK
+
+def load_config(path):
+    """Reads a config file saved by the GUI, filling in the defaults."""
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    if not isinstance(config, dict):
+        raise ValueError("the config file must hold a JSON object")
+    return {**DEFAULTS, **config}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python cli.py",
+        description="Generate personalized PDFs from a Word template and email them, without the GUI.",
+    )
+    parser.add_argument("--config", default="config.json", help="Config file saved by the GUI (default: config.json).")
+    for name in REQUIRED_SETTINGS:
+        parser.add_argument(f"--{name.replace('_', '-')}", dest=name, help=f"Overrides '{name}' from the config.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--dry-run", action="store_true", help="Generate the PDFs but send no email.")
+    mode.add_argument("--test-email", metavar="ADDRESS", help="Send one test email to this address.")
+    mode.add_argument("--resume", action="store_true", help="Continue the last run, skipping rows already sent.")
+    mode.add_argument("--fresh", action="store_true",
+                      help="Start over even if the last run didn't finish; its journal is archived.")
+    mode.add_argument("--bundle", metavar="FILE", help="Write every row into one merged .pdf or a .zip of PDFs; send no email.")
+    parser.add_argument("--bookmark-format", help="Bookmark title per row in a merged PDF, e.g. '{<Name>} ({<ID>})'.")
+    for name in ("render_workers", "converter_workers", "send_workers", "async_sends", "batch_size", "pdf_cache_mb"):
+        parser.add_argument(f"--{name.replace('_', '-')}", dest=name, type=int, metavar="N",
+                            help=f"Overrides '{name}' from the config.")
+    parser.add_argument("--converter", choices=("auto", "word", "libreoffice", "stub"), help="PDF converter backend.")
+    parser.add_argument("--native-pdf", action="store_true", default=None,
+                        help="Write PDFs of simple templates directly, using the converter only as a fallback.")
+    parser.add_argument("--transport", choices=("outlook", "smtp", "stub"), help="How to send the emails.")
+    parser.add_argument("--json", action="store_true", help="Print progress as one JSON object per line.")
+    return parser.parse_args(argv)
+
+def create_transport_from_config(config):
+    """Creates the mail transport a config file describes."""
+    from transports import create_transport
+
+    if config["transport"] == "smtp":
+        return create_transport(
+            "smtp",
+            host=config["smtp_host"],
+            port=int(config["smtp_port"]),
+            username=config["smtp_username"] or None,
+            password=os.environ.get("DOCUMINT_SMTP_PASSWORD") or None,
+            sender=config["smtp_sender"] or None,
+            starttls=bool(config["smtp_starttls"]),
+            pool_size=int(config["smtp_connections"]),
+        )
+    return create_transport(config["transport"])
+
+def run(args, reporter):
+    """Runs one campaign as described by the parsed arguments.
+
+    Returns:
+        int: The exit code.
+    """
+    try:
+        config = load_config(args.config)
+    except (OSError, ValueError) as e:
+        print(f"documint: cannot read config '{args.config}': {e}", file=sys.stderr)
+        return EXIT_USAGE
+    for name, value in vars(args).items():
+        if name in config and value is not None:
+            config[name] = value
+    missing = [name for name in (BUNDLE_SETTINGS if args.bundle else REQUIRED_SETTINGS) if not config.get(name)]
+    if missing:
+        print(f"documint: missing settings: {', '.join(missing)}", file=sys.stderr)
+        return EXIT_USAGE
+
+    if args.json:
+        reporter.emit("start", dry_run=args.dry_run, test_email=args.test_email, resume=args.resume, bundle=args.bundle)
+    if args.bundle:
+        from bundle import export_bundle
+
+        export_bundle(config["data_file"], config["template_file"], args.bundle, reporter,
+                      config["pdf_filename_format"], config["bookmark_format"] or None,
+                      config["converter"], bool(config["native_pdf"]))
+    else:
+        try:
+            run_config(config, reporter, dry_run=args.dry_run, test_email=args.test_email, resume=args.resume,
+                       fresh=args.fresh)
+        except TransportError as e:
+            reporter(f"❌ Error setting up the mail transport: {e}")
+    code = reporter.exit_code()
+    if args.json:
+        reporter.emit("done", exit_code=code)
+    return code
+
+class TransportError(Exception):
+    """Raised by `run_config` when the mail transport can't be created."""
+
+def run_config(config, log_callback, data_file=None, logs_folder=None, dry_run=False,
+               test_email=None, resume=False, validate=True, transport=None, metrics=None, control=None,
+               fresh=False):
+    """Calls `core.process_emails` with the settings of a config.
+
+    Args:
+        config (dict): The settings, see `load_config`.
+        log_callback (function): Receives the log messages.
+        data_file (str, optional): Overrides the config's data file.
+        logs_folder (str, optional): Overrides the config's logs folder.
+        dry_run (bool, optional): Generate the PDFs but send no email.
+        test_email (str, optional): Send one test email to this address.
+        resume (bool, optional): Continue the run recorded in the journal.
+        validate (bool, optional): Check the data file before rendering.
+        transport (Transport, optional): Sends the emails instead of a
+            transport created from the config; it is left open.
+        metrics (Metrics, optional): Collects the run's timings.
+        control (RunControl, optional): Pauses or cancels the run.
+        fresh (bool, optional): Start over even if the last run didn't finish.
+
+    Raises:
+        TransportError: If the mail transport can't be created.
+    """
+    # Imported here so that --help and usage errors return at once.
+    from core import process_emails
+    from payload import split_paths
+    from ratelimit import RateLimiter
+
+    own_transport = transport is None and not dry_run
+    if own_transport:
+        try:
+            transport = create_transport_from_config(config)
+        except Exception as e:
+            raise TransportError(str(e)) from e
+    try:
+        process_emails(
+            data_file or config["data_file"],
+            config["template_file"],
+            config["pdf_folder"],
+            logs_folder or config["logs_folder"],
+            log_callback,
+            config["email_subject"],
+            config["email_body"],
+            config["pdf_filename_format"],
+            int(config["retries"]),
+            int(config["delay"]),
+            dry_run=dry_run,
+            test_email=test_email,
+            converter=config["converter"],
+            converter_workers=int(config["converter_workers"]),
+            batch_size=int(config["batch_size"]),
+            render_workers=int(config["render_workers"]),
+            send_workers=int(config["send_workers"]),
+            async_sends=int(config["async_sends"]),
+            rate_limiter=RateLimiter.from_delay(
+                int(config["delay"]),
+                burst=int(config["burst"]),
+                domain_per_minute=int(config["domain_limit"])
+            ),
+            transport=transport,
+            validate=validate,
+            resume=resume,
+            id_column=str(config["id_column"]).strip() or None,
+            pdf_cache_mb=int(config["pdf_cache_mb"]),
+            native_pdf=bool(config["native_pdf"]),
+            attachments=split_paths(config["attachments"]),
+            metrics=metrics,
+            control=control,
+            fresh=fresh,
+        )
+    finally:
+        if own_transport:
+            transport.close()
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Log messages contain emoji, which a redirected stdout on Windows can't encode.
+    if hasattr(sys.stdout, "reconfigure"):
+        sys.stdout.reconfigure(errors="backslashreplace")
+    reporter = ProgressReporter(as_json=args.json)
+    try:
+        return run(args, reporter)
+    except KeyboardInterrupt:
+        if args.json:
+            reporter.emit("interrupted", exit_code=EXIT_INTERRUPTED)
+        return EXIT_INTERRUPTED
+
+if __name__ == "__main__":
+    # Render workers are separate processes; needed for the frozen executable.
+    import multiprocessing
+
+    multiprocessing.freeze_support()
+    sys.exit(main())
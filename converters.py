@@ -0,0 +1,566 @@
+import os
+import pathlib
+import queue
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+# Word's SaveAs format code for PDF (`wdFormatPDF`). Spelled out so that the
+# makepy constants cache is not needed.
+WD_FORMAT_PDF = 17
+
+class ConversionError(Exception):
+    """Raised when a document could not be converted to PDF."""
+
+class Converter:
+    """Base class for .docx to PDF converters.
+
+    A converter may hold an expensive resource (an office process) between
+    calls. It is only ever used from the thread that created it.
+    """
+
+    name = "base"
+
+    @property
+    def version(self):
+        """A string identifying the converter and its backend version."""
+        return self.name
+
+    def convert(self, docx_path, pdf_path):
+        """Converts a single .docx file to PDF.
+
+        Args:
+            docx_path (str): Path to the source .docx file.
+            pdf_path (str): Path of the PDF file to write.
+        """
+        raise NotImplementedError
+
+    def convert_batch(self, pairs):
+        """Converts several .docx files in one session.
+
+        Backends that can convert many files per call override this; the
+        default converts them one by one with the same converter.
+
+        Args:
+            pairs (list): `(docx_path, pdf_path)` tuples.
+
+        Returns:
+            list: For each pair, None on success or the exception raised.
+        """
+        results = []
+        for docx_path, pdf_path in pairs:
+            try:
+                self.convert(docx_path, pdf_path)
+                results.append(None)
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def abort(self):
+        """Stops a conversion that hangs, from another thread.
+
+        Called when the pool gives up on the converter. Backends that run a
+        separate process kill it here so it doesn't linger; the default does
+        nothing.
+        """
+
+    def close(self):
+        """Releases the resources held by the converter."""
+
+class WordConverter(Converter):
+    """Converts documents with a single, long-lived Microsoft Word instance."""
+
+    name = "word"
+
+    def __init__(self):
+        import pythoncom
+        import win32com.client
+
+        pythoncom.CoInitialize()
+        self._pythoncom = pythoncom
+        self._app = win32com.client.DispatchEx("Word.Application")
+        self._app.Visible = False
+        self._app.DisplayAlerts = 0
+        # COM objects can't be used from the thread that aborts a hung
+        # conversion, so the process id is looked up now. Word versions
+        # without `Application.Hwnd` (before 2013) leave it unknown.
+        self._pid = None
+        try:
+            import win32process
+            self._pid = win32process.GetWindowThreadProcessId(self._app.Hwnd)[1]
+        except Exception:
+            pass
+
+    @property
+    def version(self):
+        return f"word-{self._app.Version}"
+
+    def convert(self, docx_path, pdf_path):
+        word_doc = self._app.Documents.Open(os.path.abspath(docx_path), ReadOnly=True)
+        try:
+            word_doc.SaveAs(os.path.abspath(pdf_path), FileFormat=WD_FORMAT_PDF)
+        finally:
+            word_doc.Close(False)
+
+    def abort(self):
+        """Kills this converter's Word process, if its id is known."""
+        if self._pid:
+            os.kill(self._pid, signal.SIGTERM)
+
+    def close(self):
+        try:
+            self._app.Quit()
+        finally:
+            self._pythoncom.CoUninitialize()
+
+class LibreOfficeConverter(Converter):
+    """Converts documents with a headless LibreOffice (`soffice`) install.
+
+    Every converter uses its own user profile directory, so several of them
+    can run side by side. When LibreOffice's Python bridge (the `uno`
+    module, e.g. from the python3-uno package) is importable, the converter
+    starts one `soffice --accept` listener and converts every document
+    through it, so the office start-up is paid once per converter, like
+    with Word. Without the bridge, every call starts `soffice --convert-to`
+    again; `convert_batch` then at least converts many files per start.
+    """
+
+    name = "libreoffice"
+
+    def __init__(self, soffice=None, timeout=120):
+        """Locates `soffice`, prepares a private user profile and starts the listener.
+
+        Args:
+            soffice (str, optional): Path to the `soffice` executable.
+                Defaults to the one found on PATH.
+            timeout (int, optional): Seconds before a conversion is killed,
+                and before a listener that doesn't answer is given up on.
+
+        Raises:
+            ConversionError: If `soffice` is missing or the listener can't
+                be reached.
+        """
+        self.soffice = soffice or shutil.which("soffice") or shutil.which("libreoffice")
+        if not self.soffice:
+            raise ConversionError("LibreOffice (soffice) was not found on PATH.")
+        self.timeout = timeout
+        self._profile = tempfile.mkdtemp(prefix="documint-lo-")
+        self._version = None
+        self._process = None
+        self._desktop = None
+        try:
+            import uno
+        except ImportError:
+            self._uno = None
+        else:
+            self._uno = uno
+            try:
+                self._start_listener()
+            except Exception:
+                self.close()
+                raise
+
+    @property
+    def warm(self):
+        """True if documents are converted by a long-lived listener."""
+        return self._desktop is not None
+
+    @property
+    def version(self):
+        if self._version is None:
+            result = subprocess.run([self.soffice, "--version"], capture_output=True, text=True, timeout=self.timeout)
+            self._version = f"libreoffice-{result.stdout.strip()}"
+        return self._version
+
+    def _profile_argument(self):
+        return f"-env:UserInstallation={pathlib.Path(self._profile).resolve().as_uri()}"
+
+    def _start_listener(self):
+        """Starts `soffice --accept` on a private pipe and connects to it."""
+        from com.sun.star.connection import NoConnectException
+
+        pipe = f"documint-{uuid.uuid4().hex}"
+        self._process = subprocess.Popen(
+            [self.soffice, self._profile_argument(), "--headless", "--invisible", "--norestore", "--nologo",
+             "--nodefault", "--nolockcheck", f"--accept=pipe,name={pipe};urp;StarOffice.ComponentContext"],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        local = self._uno.getComponentContext()
+        resolver = local.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local)
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                context = resolver.resolve(f"uno:pipe,name={pipe};urp;StarOffice.ComponentContext")
+                break
+            except NoConnectException:
+                # The first start initialises the profile, which takes a while.
+                if self._process.poll() is not None:
+                    raise ConversionError(f"soffice exited with code {self._process.returncode} before accepting connections")
+                if time.monotonic() > deadline:
+                    raise ConversionError(f"soffice did not accept connections within {self.timeout}s")
+                time.sleep(0.25)
+        self._desktop = context.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", context)
+
+    def _properties(self, **values):
+        from com.sun.star.beans import PropertyValue
+
+        return tuple(PropertyValue(Name=name, Value=value) for name, value in values.items())
+
+    def _run(self, docx_paths, outdir):
+        """Runs one `soffice --convert-to pdf` call over several files."""
+        command = [
+            self.soffice, self._profile_argument(),
+            "--headless", "--norestore", "--nologo",
+            "--convert-to", "pdf", "--outdir", outdir,
+        ] + [os.path.abspath(path) for path in docx_paths]
+        result = subprocess.run(command, capture_output=True, text=True, timeout=self.timeout)
+        if result.returncode != 0:
+            raise ConversionError(result.stderr.strip() or f"soffice exited with code {result.returncode}")
+
+    def convert(self, docx_path, pdf_path):
+        if self.warm:
+            self._convert_warm(docx_path, pdf_path)
+            return
+        outdir = os.path.dirname(os.path.abspath(pdf_path))
+        self._run([docx_path], outdir)
+        produced = os.path.join(outdir, os.path.splitext(os.path.basename(docx_path))[0] + ".pdf")
+        if not os.path.exists(produced):
+            raise ConversionError(f"soffice did not produce {produced}")
+        if os.path.abspath(produced) != os.path.abspath(pdf_path):
+            os.replace(produced, pdf_path)
+
+    def _convert_warm(self, docx_path, pdf_path):
+        """Converts a document through the running listener."""
+        to_url = self._uno.systemPathToFileUrl
+        try:
+            document = self._desktop.loadComponentFromURL(
+                to_url(os.path.abspath(docx_path)), "_blank", 0, self._properties(Hidden=True, ReadOnly=True))
+        except Exception as e:
+            raise ConversionError(f"LibreOffice could not open {docx_path}: {e}") from e
+        if document is None:
+            raise ConversionError(f"LibreOffice could not open {docx_path}")
+        try:
+            document.storeToURL(to_url(os.path.abspath(pdf_path)), self._properties(FilterName="writer_pdf_Export"))
+        except Exception as e:
+            raise ConversionError(f"LibreOffice could not write {pdf_path}: {e}") from e
+        finally:
+            try:
+                document.close(True)
+            except Exception:
+                pass
+
+    def convert_batch(self, pairs):
+        if self.warm:
+            # The listener is already running; one call per file costs nothing extra.
+            return super().convert_batch(pairs)
+        # One soffice call per output folder. Files that come out with the
+        # wrong name are moved into place; files that don't come out at all
+        # are reported individually.
+        results = [None] * len(pairs)
+        by_outdir = {}
+        for i, (docx_path, pdf_path) in enumerate(pairs):
+            by_outdir.setdefault(os.path.dirname(os.path.abspath(pdf_path)), []).append(i)
+        for outdir, indexes in by_outdir.items():
+            try:
+                self._run([pairs[i][0] for i in indexes], outdir)
+            except Exception as e:
+                for i in indexes:
+                    results[i] = e
+                continue
+            for i in indexes:
+                docx_path, pdf_path = pairs[i]
+                produced = os.path.join(outdir, os.path.splitext(os.path.basename(docx_path))[0] + ".pdf")
+                if not os.path.exists(produced):
+                    results[i] = ConversionError(f"soffice did not produce {produced}")
+                elif os.path.abspath(produced) != os.path.abspath(pdf_path):
+                    os.replace(produced, pdf_path)
+        return results
+
+    def abort(self):
+        """Kills the listener, e.g. when a conversion hangs."""
+        if self._process is not None and self._process.poll() is None:
+            self._process.kill()
+
+    def close(self):
+        if self._desktop is not None:
+            try:
+                self._desktop.terminate()
+            except Exception:
+                # The listener may already be gone; it is killed below.
+                pass
+            self._desktop = None
+        if self._process is not None:
+            try:
+                self._process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+            self._process = None
+        shutil.rmtree(self._profile, ignore_errors=True)
+
+class StubConverter(Converter):
+    """Writes a minimal one-page PDF without any office software.
+
+    Intended for tests, benchmarks and dry runs on machines without Word or
+    LibreOffice; the PDF only names the source document.
+    """
+
+    name = "stub"
+
+    def convert(self, docx_path, pdf_path):
+        if not os.path.exists(docx_path):
+            raise ConversionError(f"{docx_path} does not exist")
+        label = os.path.basename(docx_path).replace("\\", "").replace("(", "").replace(")", "")
+        stream = f"BT /F1 12 Tf 72 720 Td ({label}) Tj ET".encode("latin-1", "replace")
+        objects = [
+            b"<< /Type /Catalog /Pages 2 0 R >>",
+            b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>",
+            b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream),
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        ]
+        out = bytearray(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(len(out))
+            out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+        xref = len(out)
+        out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+        for offset in offsets:
+            out += b"%010d 00000 n \n" % offset
+        out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+        with open(pdf_path, "wb") as f:
+            f.write(out)
+
+CONVERTERS = {
+    "word": WordConverter,
+    "libreoffice": LibreOfficeConverter,
+    "stub": StubConverter,
+}
+
+def get_converter_factory(name="auto"):
+    """Returns a callable that creates converters of the given backend.
+
+    Args:
+        name (str, optional): One of "word", "libreoffice", "stub" or "auto".
+            "auto" picks Word on Windows and LibreOffice elsewhere.
+
+    Returns:
+        callable: A zero-argument factory returning a `Converter`.
+    """
+    if name == "auto":
+        name = "word" if sys.platform == "win32" else "libreoffice"
+    try:
+        return CONVERTERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown converter '{name}'. Choose from: {', '.join(CONVERTERS)}, auto")
+
+class _ConverterJob(Future):
+    """A job queued to a converter worker.
+
+    `started_at` is the `time.monotonic()` at which a worker picked the job
+    up; `started` is set at the same moment.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+        self.started_at = None
+
+class _ConverterWorker:
+    """A thread that owns one converter and runs the jobs queued to it."""
+
+    def __init__(self, factory, name):
+        self.factory = factory
+        self.jobs = queue.Queue()
+        # Read by the pool to abort a hung conversion.
+        self.converter = None
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def submit(self, func, *args):
+        future = _ConverterJob()
+        self.jobs.put((func, args, future))
+        return future
+
+    def stop(self):
+        self.jobs.put(None)
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            func, args, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            future.started_at = time.monotonic()
+            future.started.set()
+            try:
+                if self.converter is None:
+                    self.converter = self.factory()
+                future.set_result(func(self.converter, *args))
+            except Exception as e:
+                future.set_exception(e)
+                # The backend may be left in a bad state; start a fresh one
+                # for the next job.
+                self.converter = _close_quietly(self.converter)
+        self.converter = _close_quietly(self.converter)
+
+def _close_quietly(converter):
+    """Closes a converter, ignoring errors. Always returns None."""
+    if converter is not None:
+        try:
+            converter.close()
+        except Exception:
+            pass
+    return None
+
+def _convert_batch(converter, batch):
+    return converter.convert_batch(batch)
+
+class ConverterPool:
+    """A pool of warm converter workers shared across a run.
+
+    Each worker is a thread owning one converter instance (and so one office
+    process, for Word and for LibreOffice with its Python bridge), created
+    on its first job and reused afterwards. Documents are
+    handed to workers round-robin. A worker whose conversion raises gets a
+    fresh converter; a worker that has not finished a job `timeout` seconds
+    after picking it up is abandoned, its office process killed, and
+    replaced.
+    """
+
+    def __init__(self, factory, size=1, timeout=120):
+        """Starts the pool.
+
+        Args:
+            factory (callable): Creates a new `Converter`; see
+                `get_converter_factory`.
+            size (int, optional): Number of converter workers.
+            timeout (int, optional): Seconds to wait for one conversion
+                before the worker is considered hung.
+        """
+        self.factory = factory
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._next = 0
+        self._workers = [self._spawn(i) for i in range(max(1, size))]
+
+    def _spawn(self, slot):
+        return _ConverterWorker(self.factory, f"converter-{slot}")
+
+    @property
+    def size(self):
+        return len(self._workers)
+
+    def submit(self, func, *args):
+        """Runs `func(converter, *args)` on the next worker.
+
+        Returns:
+            tuple: `(slot, future)` for the queued job.
+        """
+        with self._lock:
+            slot = self._next
+            self._next = (self._next + 1) % len(self._workers)
+            return slot, self._workers[slot].submit(func, *args)
+
+    def wait(self, slot, future, timeout=None):
+        """Waits for a job from `submit`, replacing its worker if it hangs.
+
+        The timeout counts from when the worker picks the job up, so time
+        spent queued behind other jobs doesn't count against it. Every job
+        ahead of it is waited for with its own timeout, which moves the
+        queue to a new worker if that job hangs.
+        """
+        limit = self.timeout if timeout is None else timeout
+        future.started.wait()
+        try:
+            return future.result(timeout=max(0, limit - (time.monotonic() - future.started_at)))
+        except FutureTimeoutError:
+            self._restart(slot)
+            raise ConversionError(f"Conversion timed out after {limit}s; converter restarted")
+
+    def _restart(self, slot):
+        with self._lock:
+            worker = self._workers[slot]
+            replacement = self._spawn(slot)
+            # Jobs already queued behind the hung one move to the new worker.
+            while True:
+                try:
+                    job = worker.jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if job is not None:
+                    replacement.jobs.put(job)
+            worker.stop()
+            self._workers[slot] = replacement
+        # Killing a hung office process lets the old worker finish and clean up.
+        converter = worker.converter
+        if converter is not None:
+            try:
+                converter.abort()
+            except Exception:
+                pass
+
+    def convert(self, docx_path, pdf_path):
+        """Converts a single .docx file to PDF on one of the pool's workers.
+
+        Args:
+            docx_path (str): Path to the source .docx file.
+            pdf_path (str): Path of the PDF file to write.
+        """
+        slot, future = self.submit(lambda converter: converter.convert(docx_path, pdf_path))
+        return self.wait(slot, future)
+
+    def convert_many(self, pairs, batch_size=50):
+        """Converts many .docx files, `batch_size` files per converter call.
+
+        Batches are spread over the workers round-robin and run in parallel.
+        A batch that hangs or fails as a whole marks each of its files as
+        failed; the other batches are unaffected.
+
+        Args:
+            pairs (list): `(docx_path, pdf_path)` tuples.
+            batch_size (int, optional): Number of files per converter call.
+
+        Returns:
+            list: For each pair, in order, None on success or the exception
+                that prevented its conversion.
+        """
+        batch_size = max(1, batch_size)
+        batches = [pairs[i:i + batch_size] for i in range(0, len(pairs), batch_size)]
+        submitted = [(batch, self.submit(_convert_batch, batch)) for batch in batches]
+        results = []
+        for batch, (slot, future) in submitted:
+            try:
+                results.extend(self.wait(slot, future, timeout=self.timeout * len(batch)))
+            except Exception as e:
+                results.extend([e] * len(batch))
+        return results
+
+    def version(self):
+        """Returns the version string reported by the converter backend."""
+        slot, future = self.submit(lambda converter: converter.version)
+        return self.wait(slot, future)
+
+    def close(self):
+        """Stops all workers and closes their converters."""
+        with self._lock:
+            for worker in self._workers:
+                worker.stop()
+        for worker in self._workers:
+            worker.thread.join(timeout=self.timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
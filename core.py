@@ -1,47 +1,40 @@
 import os
-import re
 import time
-import pandas as pd
-from docx import Document
-import win32com.client
-from win32com.client import constants
+from collections import namedtuple
+from contextlib import ExitStack, nullcontext
 from datetime import datetime
+from functools import partial
+from checkpoint import CONVERTED, FAILED, JOURNAL_FILENAME, RENDERED, SENDING, SENT, Checkpoint, UnfinishedRunError
+from converters import ConverterPool, get_converter_factory
+from metrics import Metrics
+from pdfcache import PdfCache, file_digest
+from payload import SharedAttachment
+from pdfrender import RENDERER_VERSION, NativePdfRenderer, UnsupportedDocument
+from pipeline import run_pipeline
+from runlog import open_run_log
+from sources import iter_rows, read_columns
+from validation import EMAIL_PATTERN, validate_dataset
+from ratelimit import RateLimiter, backoff_delay
+from sendengine import AsyncSendEngine
+from transports import OutgoingMessage, OutlookTransport
+from template import CompiledTemplate, replace_placeholders_in_element, text_parts
+from texttemplate import RowFormatter, unique_filename
 
 def replace_placeholders_in_doc(doc, replacements):
     """Replaces placeholders in a .docx document.
 
-    This function iterates through all paragraphs and tables in a document
-    and replaces placeholder strings (e.g., `<Name>`) with their corresponding
-    values from the replacements dictionary.
+    This function tokenizes every paragraph of the document body, headers,
+    footers, text boxes and nested tables once and replaces placeholder
+    strings (e.g., `<Name>`) with their corresponding values from the
+    replacements dictionary in a single pass, keeping run formatting.
 
     Args:
         doc (docx.Document): The python-docx Document object.
         replacements (dict): A dictionary where keys are placeholders
             and values are the replacement strings.
     """
-    for para in doc.paragraphs:
-        full_text = "".join(run.text for run in para.runs)
-        new_text = full_text
-        for key, val in replacements.items():
-            new_text = new_text.replace(key, str(val))
-        if new_text != full_text:
-            p = para._p
-            for child in list(p):
-                p.remove(child)
-            para.add_run(new_text)
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for para in cell.paragraphs:
-                    full_text = "".join(run.text for run in para.runs)
-                    new_text = full_text
-                    for key, val in replacements.items():
-                        new_text = new_text.replace(key, str(val))
-                    if new_text != full_text:
-                        p = para._p
-                        for child in list(p):
-                            p.remove(child)
-                        para.add_run(new_text)
+    for part in text_parts(doc):
+        replace_placeholders_in_element(part._element, replacements)
 
 def is_valid_email(email_address):
     """Validates an email address using a regular expression.
@@ -52,152 +45,617 @@ def is_valid_email(email_address):
     Returns:
         bool: True if the email address is valid, False otherwise.
     """
-    pattern = r"^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}$"
-    return re.match(pattern, email_address) is not None
+    return EMAIL_PATTERN.match(email_address) is not None
+
+RowJob = namedtuple("RowJob", "index row email replacements word_filename pdf_filename timings", defaults=(None,))
+RowJob.__doc__ = """A data row that has been rendered to a .docx file and awaits conversion.
+
+`word_filename` is None if the row was rendered straight to its PDF by the
+native renderer. `timings` maps the render stages ("fill", "save" or
+"native_pdf") to the seconds they took."""
+
+def make_log_record(row, email, status):
+    """Builds one entry of the run log.
+
+    Args:
+        row (dict): The data row the entry is about.
+        email (str): The recipient's email address.
+        status (str): A short description of the outcome.
+
+    Returns:
+        dict: The log record.
+    """
+    return {
+        "Name": str(row.get("Name", "N/A")).strip(),
+        "Email": email,
+        "Status": status,
+        "Timestamp": datetime.now()
+    }
+
+def plan_row(index, row, pdf_folder, formatter, filename=None):
+    """Works out the recipient, replacements and file names of a data row.
+
+    Args:
+        index (int): The row's index in the data file.
+        row (dict): The data row, mapping column names to values.
+        pdf_folder (str): Path to the folder to save generated PDFs.
+        formatter (RowFormatter): The run's compiled formats, including
+            `filename`.
+        filename (str, optional): The file name to use, without extension.
+            Defaults to the row's `filename` format.
+
+    Returns:
+        RowJob: The row, with nothing written to disk yet. Its replacements
+            only hold the placeholders the run uses.
+    """
+    email = str(row["Email"]).strip()
+    replacements = formatter.replacements(row)
+    if filename is None:
+        filename = formatter.filename(replacements)
+    word_filename = os.path.join(pdf_folder, f"{filename}.docx")
+    pdf_filename = os.path.join(pdf_folder, f"{filename}.pdf")
+    return RowJob(index, row, email, replacements, word_filename, pdf_filename)
+
+def render_row(template, index, row, pdf_folder, formatter, native=None, filename=None):
+    """Renders one data row to a .docx file next to its future PDF.
+
+    Args:
+        template (CompiledTemplate): The compiled document template.
+        index (int): The row's index in the data file.
+        row (dict): The data row, mapping column names to values.
+        pdf_folder (str): Path to the folder to save generated PDFs.
+        formatter (RowFormatter): The run's compiled formats.
+        native (NativePdfRenderer, optional): If given, writes the PDF
+            directly instead of a .docx, unless the row needs the office
+            converter.
+        filename (str, optional): The file name to use, without extension.
+            Defaults to the row's `filename` format.
+
+    Returns:
+        RowJob: The rendered row.
+    """
+    job = plan_row(index, row, pdf_folder, formatter, filename)
+    start = time.perf_counter()
+    doc = template.render(job.replacements)
+    filled = time.perf_counter()
+    if native is not None:
+        try:
+            native.render(doc, job.pdf_filename)
+        except UnsupportedDocument:
+            pass
+        else:
+            return job._replace(word_filename=None,
+                                timings={"fill": filled - start, "native_pdf": time.perf_counter() - filled})
+    doc.save(job.word_filename)
+    return job._replace(timings={"fill": filled - start, "save": time.perf_counter() - filled})
+
+# The template compiled in this render worker process, the run's formats
+# and its native PDF renderer if the run uses one; see _init_render_worker.
+_worker_template = None
+_worker_formatter = None
+_worker_native = None
+
+def _init_render_worker(template_file, formatter, native_pdf=False):
+    """Compiles the template once in a render worker process."""
+    global _worker_template, _worker_formatter, _worker_native
+    _worker_template = CompiledTemplate(template_file)
+    _worker_formatter = formatter
+    if native_pdf:
+        _worker_native = NativePdfRenderer(_worker_template)
+
+def _render_in_worker(index, row, filename, pdf_folder):
+    """Renders a row with the template compiled in this worker process."""
+    return render_row(_worker_template, index, row, pdf_folder, _worker_formatter, _worker_native, filename)
+
+def build_message(job, formatter, shared=()):
+    """Builds the email for a converted row.
+
+    Args:
+        job (RowJob): The rendered and converted row.
+        formatter (RowFormatter): The run's compiled formats, including
+            `subject` and the HTML `body`.
+        shared (tuple, optional): `SharedAttachment`s sent to every recipient.
+
+    Returns:
+        OutgoingMessage: The email, with the row's PDF attached.
+    """
+    return OutgoingMessage(job.email, formatter.format("subject", job.replacements),
+                           formatter.format("body", job.replacements), [job.pdf_filename], shared)
+
+def _untimed(stage):
+    return nullcontext()
+
+def send_row(transport, job, formatter, retries, rate_limiter, retry_backoff=1.0, metrics=None, shared=()):
+    """Emails a converted PDF to its recipient, retrying on failure.
+
+    Every attempt waits for the rate limiter; failed attempts are followed
+    by a jittered exponential backoff.
+
+    Args:
+        transport (Transport): Sends the email.
+        job (RowJob): The rendered and converted row.
+        formatter (RowFormatter): The run's compiled formats.
+        retries (int): The number of times to try sending the email. At least
+            one attempt is always made.
+        rate_limiter (RateLimiter): Paces the sends.
+        retry_backoff (float, optional): Backoff ceiling in seconds after the
+            first failed attempt; doubles with every further failure.
+        metrics (Metrics, optional): Records the time spent waiting for the
+            rate limiter and sending.
+        shared (tuple, optional): `SharedAttachment`s sent to every recipient.
+
+    Raises:
+        Exception: The error of the last attempt if every attempt failed.
+    """
+    message = build_message(job, formatter, shared)
+    timed = metrics.time if metrics is not None else _untimed
+    attempts = max(1, retries)
+    for attempt in range(attempts):
+        try:
+            with timed("rate_limit"):
+                rate_limiter.acquire(job.email)
+            with timed("send"):
+                transport.send(message)
+            return
+        except Exception:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(backoff_delay(attempt, retry_backoff))
 
 def process_emails(data_file, template_file, pdf_folder, logs_folder, log_callback, 
                    email_subject, email_body, pdf_filename_format, 
-                   retries, delay, dry_run=False, test_email=None):
+                   retries, delay, dry_run=False, test_email=None,
+                   converter="auto", converter_workers=1, batch_size=0,
+                   render_workers=0, send_workers=1, queue_size=16,
+                   rate_limiter=None, retry_backoff=1.0, transport=None,
+                   async_sends=0, send_timeout=60, validate=True, skip_duplicate_emails=False,
+                   resume=False, id_column=None, pdf_cache_mb=0, metrics=None, native_pdf=False,
+                   attachments=None, control=None, fresh=False):
     """Processes the admit card generation and email sending workflow.
 
+    By default each row is rendered, converted and sent before the next one
+    starts. With a `batch_size`, the run happens in two phases instead: all
+    rows are rendered to .docx first, then converted in bulk, `batch_size`
+    files per converter call, and finally sent. With `render_workers`, the
+    three stages run at the same time in a pipeline: rows are rendered in
+    worker processes, converted by `converter_workers` threads and sent by
+    `send_workers` threads. In any mode, `async_sends` hands sending to an
+    asyncio engine that keeps that many sends in flight on one thread.
+
+    Real runs record each row's progress in documint_journal.jsonl in the
+    logs folder. With `resume`, rows the journal shows as sent are skipped,
+    rows whose PDF was already converted are only sent, and everything
+    else, including failed rows, is processed again.
+
     Args:
-        data_file (str): Path to the Excel data file.
+        data_file (str): Path to the data file (.xlsx, .xls, .csv or .parquet).
+            Rows are streamed, never loaded all at once.
         template_file (str): Path to the .docx template file.
         pdf_folder (str): Path to the folder to save generated PDFs.
-        logs_folder (str): Path to the folder to save the log file.
+        logs_folder (str): Path to the folder of the run log. Each row's
+            outcome is appended to documint_log.jsonl as soon as it is known;
+            use `runlog.export_excel` for a workbook.
         log_callback (function): A function to call for logging messages.
-        email_subject (str): The subject of the email.
+        email_subject (str): The subject of the email. May use placeholders
+            like the body, e.g. "Admit card for {<Name>}"; other braces are
+            kept as they are.
         email_body (str): The HTML body of the email.
         pdf_filename_format (str): The format for the PDF filenames.
+            Characters that aren't allowed in file names become "_".
+            The subject, body and filename formats are compiled once and
+            each row only converts the columns they or the template use.
         retries (int): The number of times to retry sending an email.
-        delay (int): The delay in seconds between emails.
+        delay (int): The delay in seconds between emails. Only used to build
+            the default rate limiter; dry runs never wait.
         dry_run (bool, optional): If True, generates PDFs but doesn't send emails. Defaults to False.
         test_email (str, optional): If provided, sends a single test email. Defaults to None.
+        converter (str, optional): The PDF converter backend ("word", "libreoffice",
+            "stub" or "auto"). Defaults to "auto".
+        converter_workers (int, optional): Number of warm converter processes. Defaults to 1.
+        batch_size (int, optional): If greater than 0, converts documents in
+            batches of this size after all rows are rendered. Defaults to 0.
+        render_workers (int, optional): If greater than 0, runs the staged
+            pipeline with this many render processes. Defaults to 0.
+        send_workers (int, optional): Number of send threads in the staged
+            pipeline. Defaults to 1.
+        queue_size (int, optional): Capacity of the queues between pipeline
+            stages. Defaults to 16.
+        rate_limiter (RateLimiter, optional): Paces the sends, overall and
+            per domain. Defaults to one email every `delay` seconds.
+        retry_backoff (float, optional): Backoff ceiling in seconds after
+            the first failed send attempt. Defaults to 1.0.
+        transport (Transport, optional): Sends the emails. Defaults to
+            Microsoft Outlook. A transport passed in is left open.
+        async_sends (int, optional): If greater than 0, sends through the
+            asyncio send engine with at most this many sends in flight.
+            Defaults to 0.
+        send_timeout (float, optional): Seconds allowed for one send attempt
+            by the asyncio send engine. Defaults to 60.
+        validate (bool, optional): If True, checks the whole data file before
+            rendering and skips rows with invalid emails or colliding PDF
+            filenames. Defaults to True.
+        skip_duplicate_emails (bool, optional): If True, validation also skips
+            rows that repeat an earlier email address. Defaults to False.
+        resume (bool, optional): If True, continues the run recorded in the
+            journal instead of starting a new one. Defaults to False.
+        id_column (str, optional): A column that uniquely identifies rows
+            in the journal. Defaults to a hash of each row's values.
+        pdf_cache_mb (int, optional): If greater than 0, keeps converted
+            PDFs in a cache of up to this many megabytes in the logs folder,
+            so rows whose template and values are unchanged are not rendered
+            or converted again. Defaults to 0.
+        metrics (Metrics, optional): Collects the time each row spends in
+            each stage and the run's throughput; pass one in to watch the run
+            live. The figures are written to documint_metrics.json and
+            documint_metrics.prom in the logs folder at the end of the run.
+        native_pdf (bool, optional): If True, simple templates are laid out
+            and written as PDF in-process, with no .docx and no office
+            suite. Templates or rows the native renderer can't handle are
+            converted with `converter` as usual. Defaults to False.
+        attachments (list, optional): Paths of files attached to every
+            email besides the row's PDF. Each is read and encoded once per
+            run. Defaults to none.
+        control (RunControl, optional): Lets another thread pause or
+            cancel the run, see `jobqueue.RunControl`. Its `wait` is called
+            before each row is started and before each email is sent, so a
+            paused run sends nothing. Rows in the middle of a send are
+            finished. A cancelled real run can be continued with `resume`.
+        fresh (bool, optional): Start a new run even if the journal in the
+            logs folder belongs to a run that didn't finish. That journal is
+            archived. Without `fresh` or `resume` such a run is refused, so
+            a crashed run isn't sent again by accident.
     """
-    log_file_path = os.path.join(logs_folder, "documint_log.xlsx")
-    
     if not os.access(data_file, os.R_OK):
-        log_callback(f"❌ The Excel file '{data_file}' is not accessible. Please close it and try again.")
+        log_callback(f"❌ The data file '{data_file}' is not accessible. Please close it and try again.")
+        return
+
+    try:
+        columns = read_columns(data_file)
+    except Exception as e:
+        log_callback(f"❌ Error reading data file: {str(e)}")
+        return
+
+    try:
+        template = CompiledTemplate(template_file)
+    except Exception as e:
+        log_callback(f"❌ Error reading template file: {str(e)}")
+        return
+
+    shared = ()
+    if attachments and not dry_run:
+        try:
+            shared = tuple(SharedAttachment(path) for path in attachments)
+        except OSError as e:
+            log_callback(f"❌ Error reading attachment: {str(e)}")
+            return
+
+    native = None
+    if native_pdf:
+        try:
+            native = NativePdfRenderer(template)
+        except Exception as e:
+            log_callback(f"⚠ Native PDF rendering disabled: {str(e)}")
+        else:
+            if native.unsupported:
+                log_callback(f"⚠ The template uses {', '.join(native.unsupported)}, which the native PDF renderer "
+                             f"doesn't support; converting with the '{converter}' converter instead.")
+                native = None
+
+    report = None
+    if validate and not test_email:
+        try:
+            report = validate_dataset(data_file, columns, template.placeholders, pdf_filename_format,
+                                      email_body, skip_duplicate_emails=skip_duplicate_emails,
+                                      email_subject=email_subject)
+        except Exception as e:
+            log_callback(f"❌ Error validating data file: {str(e)}")
+            return
+        for line in report.summary_lines():
+            log_callback(line)
+        if not report.ok:
+            return
+
+    try:
+        formatter = RowFormatter(template.placeholders, subject=email_subject, body=email_body,
+                                 filename=pdf_filename_format)
+    except ValueError as e:
+        log_callback(f"❌ {str(e)}")
+        return
+
+    if metrics is None:
+        metrics = Metrics()
+    metrics.total_rows = 1 if test_email else report.total_rows if report is not None else None
+
+    if id_column and id_column not in columns:
+        log_callback(f"❌ The data file has no '{id_column}' column to identify rows by.")
         return
 
     try:
-        df = pd.read_excel(data_file)
-        df.columns = df.columns.str.strip()
+        run_log = open_run_log(logs_folder)
     except Exception as e:
-        log_callback(f"❌ Error reading Excel file: {str(e)}")
+        log_callback(f"❌ Error opening the log file: {str(e)}")
         return
 
-    outlook = win32com.client.Dispatch("Outlook.Application")
-    log_records = []
-    
-    if test_email:
-        # Create a dummy dataframe with all columns from the original df
-        dummy_data = {col: f"Test {col}" for col in df.columns}
-        dummy_data["Email"] = test_email
-        df = pd.DataFrame([dummy_data])
+    # Everything opened from here on is closed even if a stage raises.
+    with ExitStack() as resources:
+        resources.callback(run_log.close)
+
+        checkpoint = None
+        if not dry_run and not test_email:
+            run_info = {"data_file": os.path.abspath(data_file), "template_file": os.path.abspath(template_file)}
+            try:
+                checkpoint = Checkpoint(os.path.join(logs_folder, JOURNAL_FILENAME), id_column, resume, run_info, fresh)
+            except UnfinishedRunError as e:
+                log_callback(f"❌ {str(e)}")
+                return
+            except Exception as e:
+                log_callback(f"❌ Error opening the run journal: {str(e)}")
+                return
+            resources.callback(checkpoint.close)
+            if checkpoint.archived:
+                log_callback(f"⚠ The journal of the unfinished run was archived as '{checkpoint.archived}'.")
+            if resume:
+                if checkpoint.run_info.get("data_file") != run_info["data_file"]:
+                    log_callback(f"⚠ The journal was recorded for '{checkpoint.run_info.get('data_file')}', not this data file.")
+                counts = checkpoint.counts()
+                log_callback(f"Resuming: {counts.get(SENT, 0)} rows already sent, {counts.get(CONVERTED, 0)} converted, "
+                             f"{counts.get(FAILED, 0)} failed, {counts.get(SENDING, 0)} interrupted while sending.")
+        if rate_limiter is None:
+            rate_limiter = RateLimiter.from_delay(delay)
+        # The converters, the send engine and an own transport are closed as
+        # soon as the rows are done, before the figures are reported.
+        stages = resources.enter_context(ExitStack())
+        if transport is None:
+            transport = OutlookTransport()
+            stages.callback(transport.close)
+
+        if test_email:
+            # Create a dummy row with all columns from the data file
+            dummy_data = {col: f"Test {col}" for col in columns}
+            dummy_data["Email"] = test_email
+            rows = iter([(0, dummy_data)])
+        else:
+            rows = iter_rows(data_file)
 
-    for index, row in df.iterrows():
         try:
-            email = str(row["Email"]).strip()
+            converter_pool = ConverterPool(get_converter_factory(converter), size=converter_workers)
+        except Exception as e:
+            log_callback(f"❌ Error starting PDF converter: {str(e)}")
+            return
+        stages.callback(converter_pool.close)
+
+        pdf_cache = None
+        if pdf_cache_mb > 0 and not test_email:
+            try:
+                # The office converter is not started just to ask its version
+                # when most rows are expected to be rendered natively.
+                version = f"{RENDERER_VERSION}+{converter}" if native is not None else converter_pool.version()
+                pdf_cache = PdfCache(os.path.join(logs_folder, "pdf_cache"), pdf_cache_mb << 20,
+                                     file_digest(template_file), version)
+            except Exception as e:
+                log_callback(f"⚠ PDF cache disabled: {str(e)}")
+
+        send_engine = None
+        if async_sends > 0 and not dry_run:
+            send_engine = AsyncSendEngine(transport, rate_limiter, concurrency=async_sends, timeout=send_timeout,
+                                          retries=retries, retry_backoff=retry_backoff, metrics=metrics)
+            stages.callback(send_engine.close)
+
+        def accept(index, row, filename):
+            """Checks a row before rendering, logging why it is skipped if it is."""
+            if report is not None and not report.accepts(index):
+                email = str(row.get("Email", "N/A")).strip()
+                finish(row, email, f"Failed: {report.skipped[index]}")
+                log_callback(f"FAILED: {report.skipped[index]} for {email}")
+                return False
+            try:
+                email = str(row["Email"]).strip()
+            except Exception as e:
+                fail(index, row, e)
+                return False
             if not is_valid_email(email):
-                log_records.append({
-                    "Name": str(row.get("Name", "N/A")).strip(),
-                    "Email": email,
-                    "Status": f"Failed: Invalid Email Format",
-                    "Timestamp": datetime.now()
-                })
+                finish(row, email, "Failed: Invalid Email Format")
                 log_callback(f"FAILED: Invalid Email Format for {email}")
-                continue
+                return False
+            if checkpoint is not None:
+                state = checkpoint.state(row)
+                if state == SENT:
+                    metrics.row_done()
+                    log_callback(f"SKIPPED: Already sent to {email}")
+                    return False
+                if state == SENDING:
+                    # The email may or may not have gone out; never risk sending it twice.
+                    finish(row, email, "Skipped: Interrupted While Sending, Check Manually")
+                    log_callback(f"SKIPPED: An earlier run was interrupted while sending to {email}; check manually")
+                    return False
+                if state == CONVERTED:
+                    job = plan_row(index, row, pdf_folder, formatter, filename)
+                    if os.path.exists(job.pdf_filename):
+                        deliver(job, None)
+                        return False
+            if pdf_cache is not None:
+                job = plan_row(index, row, pdf_folder, formatter, filename)
+                if pdf_cache.fetch(cache_key(job), job.pdf_filename):
+                    deliver(job, None)
+                    return False
+            return True
+
+        def cache_key(job):
+            """Returns the PDF cache key of a row: the values its template uses."""
+            return pdf_cache.key({placeholder: job.replacements.get(placeholder, placeholder)
+                                  for placeholder in template.placeholders})
+
+        def render(index, row, filename):
+            """Renders an accepted row in this process."""
+            try:
+                job = render_row(template, index, row, pdf_folder, formatter, native, filename)
+            except Exception as e:
+                fail(index, row, e)
+                return None
+            rendered(job)
+            return job
+
+        def rendered(job):
+            """Records that a row was rendered and how long that took."""
+            for stage, seconds in (job.timings or {}).items():
+                metrics.record(stage, seconds)
+            track(job.row, RENDERED)
+
+        def convert(job):
+            """Converts a rendered row, unless it was rendered straight to PDF."""
+            if job.word_filename is None:
+                return
+            with metrics.time("convert"):
+                converter_pool.convert(job.word_filename, job.pdf_filename)
 
-            replacements = {f"<{col}>": str(val).strip() for col, val in row.items()}
-            doc = Document(template_file)
-            replace_placeholders_in_doc(doc, replacements)
+        def convert_rendered(job):
+            """Converts a row rendered by a pipeline worker process."""
+            rendered(job)
+            convert(job)
 
-            # Create filename from format string
-            filename = pdf_filename_format.format(**replacements)
-            word_filename = os.path.join(pdf_folder, f"{filename}.docx")
-            pdf_filename = os.path.join(pdf_folder, f"{filename}.pdf")
-            doc.save(word_filename)
+        def track(row, state, error=None):
+            """Records a row's progress in the journal, if this run keeps one."""
+            if checkpoint is not None:
+                checkpoint.mark(row, state, error)
 
+        def sent(job, send_error):
+            """Logs the outcome of sending a row."""
+            track(job.row, SENT if send_error is None else FAILED, send_error)
+            if send_error is not None:
+                finish(job.row, job.email, f"Failed to send email: {str(send_error)}")
+                log_callback(f"FAILED: Could not send email to {job.email}")
+            else:
+                finish(job.row, job.email, "Success")
+                log_callback(f"SUCCESS: Sent document to {job.email}")
+
+        def deliver(job, conv_error):
+            """Sends a converted row and logs the outcome."""
             try:
-                word_app = win32com.client.Dispatch("Word.Application")
-                word_app.Visible = False
-                word_doc = word_app.Documents.Open(os.path.abspath(word_filename))
-                word_doc.SaveAs(os.path.abspath(pdf_filename), FileFormat=constants.wdFormatPDF)
-                word_doc.Close(False)
-                word_app.Quit()
-            except Exception as conv_error:
-                log_records.append({
-                    "Name": str(row.get("Name", "N/A")).strip(),
-                    "Email": email,
-                    "Status": f"Failed: Word to PDF conversion error: {conv_error}",
-                    "Timestamp": datetime.now()
-                })
-                log_callback(f"FAILED: Word to PDF conversion error for {email}")
-                continue
-            
-            if not dry_run:
-                sent = False
-                for attempt in range(retries):
+                if conv_error is not None:
+                    track(job.row, FAILED, conv_error)
+                    finish(job.row, job.email, f"Failed: Word to PDF conversion error: {conv_error}")
+                    log_callback(f"FAILED: Word to PDF conversion error for {job.email}")
+                    return
+                track(job.row, CONVERTED)
+                if pdf_cache is not None:
+                    try:
+                        pdf_cache.store(cache_key(job), job.pdf_filename)
+                    except OSError as e:
+                        log_callback(f"⚠ Could not cache the PDF for {job.email}: {str(e)}")
+                if not dry_run and control is not None and not control.wait():
+                    # The PDF is journaled as converted, so resuming sends it.
+                    finish(job.row, job.email, "Skipped: Run Cancelled Before Sending")
+                    log_callback(f"SKIPPED: Run cancelled before sending to {job.email}")
+                    return
+                if not dry_run:
+                    track(job.row, SENDING)
+
+                if not dry_run and send_engine is not None:
+                    send_engine.submit(build_message(job, formatter, shared), partial(sent, job))
+                elif not dry_run:
                     try:
-                        mail = outlook.CreateItem(0)
-                        mail.To = email
-                        mail.Subject = email_subject
-                        mail.HTMLBody = email_body.format(**replacements)
-                        mail.Attachments.Add(os.path.abspath(pdf_filename))
-                        mail.Send()
-                        sent = True
-                        break
+                        send_row(transport, job, formatter, retries, rate_limiter, retry_backoff, metrics, shared)
                     except Exception as send_error:
-                        if attempt == retries - 1:
-                            log_records.append({
-                                "Name": str(row.get("Name", "N/A")).strip(),
-                                "Email": email,
-                                "Status": f"Failed to send email: {str(send_error)}",
-                                "Timestamp": datetime.now()
-                            })
-                            log_callback(f"FAILED: Could not send email to {email}")
-                        else:
-                            time.sleep(delay)
-
-                if sent:
-                    log_records.append({
-                        "Name": str(row.get("Name", "N/A")).strip(),
-                        "Email": email,
-                        "Status": "Success",
-                        "Timestamp": datetime.now()
-                    })
-                    log_callback(f"SUCCESS: Sent document to {email}")
-            else:
-                log_callback(f"DRY RUN: Generated PDF for {email}")
-                log_records.append({
-                    "Name": str(row.get("Name", "N/A")).strip(),
-                    "Email": email,
-                    "Status": "Dry Run - PDF Generated",
-                    "Timestamp": datetime.now()
-                })
+                        sent(job, send_error)
+                    else:
+                        sent(job, None)
+                else:
+                    log_callback(f"DRY RUN: Generated PDF for {job.email}")
+                    finish(job.row, job.email, "Dry Run - PDF Generated")
+            except Exception as e:
+                fail(job.index, job.row, e)
+            finally:
+                if job.word_filename is not None and os.path.exists(job.word_filename):
+                    os.remove(job.word_filename)
 
-            time.sleep(delay)
+        def finish(row, email, status):
+            """Logs the final outcome of a row."""
+            run_log.append(make_log_record(row, email, status))
+            metrics.row_done()
 
-        except Exception as e:
-            log_records.append({
-                "Name": str(row.get("Name", "N/A")).strip(),
-                "Email": str(row.get("Email", "N/A")).strip(),
-                "Status": f"Failed to process row: {str(e)}",
-                "Timestamp": datetime.now()
-            })
+        def fail(index, row, e):
+            """Logs a row that failed outside of conversion and sending."""
+            track(row, FAILED, e)
+            finish(row, str(row.get("Email", "N/A")).strip(), f"Failed to process row: {str(e)}")
             log_callback(f"FAILED: Could not process row {index + 2}: {str(e)}")
 
-        finally:
-            if os.path.exists(word_filename):
-                os.remove(word_filename)
+        used_filenames = set()
 
-    try:
-        if os.path.exists(log_file_path):
-            old_log_df = pd.read_excel(log_file_path)
-            new_log_df = pd.concat([old_log_df, pd.DataFrame(log_records)], ignore_index=True)
+        def name(row):
+            """Returns the row's file name, numbered if an earlier row of the run has it.
+
+            Every row is named in data file order, skipped or not, so a
+            resumed run gives each row the name it had before. Rows whose
+            name can't be formatted get None and fail when they are planned.
+            """
+            try:
+                filename = formatter.filename(formatter.replacements(row))
+            except Exception:
+                return None
+            return unique_filename(f"{filename}.pdf", used_filenames)[:-len(".pdf")]
+
+        def admitted():
+            """Yields the accepted rows and their file names, holding back while paused and stopping when cancelled."""
+            for index, row in rows:
+                if control is not None and not control.wait():
+                    log_callback("⚠ Run cancelled; rows not yet started were left unprocessed.")
+                    return
+                filename = name(row)
+                if accept(index, row, filename):
+                    yield index, row, filename
+
+        accepted = admitted()
+
+        if batch_size > 0:
+            log_callback("Rendering documents...")
+            jobs = [job for job in (render(*entry) for entry in accepted) if job is not None]
+            pending = [job for job in jobs if job.word_filename is not None]
+            log_callback(f"Converting {len(pending)} documents in batches of {batch_size}...")
+            start = time.perf_counter()
+            results = converter_pool.convert_many([(job.word_filename, job.pdf_filename) for job in pending], batch_size)
+            # Batches convert many files per call, so only the average per file is known.
+            per_file = (time.perf_counter() - start) / max(len(pending), 1)
+            for _ in pending:
+                metrics.record("convert", per_file)
+            errors = dict(zip(map(id, pending), results))
+            for job in jobs:
+                deliver(job, errors.get(id(job)))
+        elif render_workers > 0:
+            run_pipeline(
+                accepted,
+                partial(_render_in_worker, pdf_folder=pdf_folder),
+                convert_rendered,
+                deliver,
+                fail,
+                render_workers=render_workers,
+                convert_workers=converter_pool.size,
+                send_workers=send_workers,
+                queue_size=queue_size,
+                render_initializer=_init_render_worker,
+                render_initargs=(template_file, formatter, native is not None),
+            )
         else:
-            new_log_df = pd.DataFrame(log_records)
-        new_log_df.to_excel(log_file_path, index=False)
-    except Exception as log_error:
-        log_callback(f"❌ Could not save log file: {log_error}")
\ No newline at end of file
+            for index, row, filename in accepted:
+                job = render(index, row, filename)
+                if job is None:
+                    continue
+                try:
+                    convert(job)
+                    conv_error = None
+                except Exception as e:
+                    conv_error = e
+                deliver(job, conv_error)
+
+        stages.close()
+        if checkpoint is not None and not (control is not None and control.cancelled):
+            checkpoint.finish()
+
+        if pdf_cache is not None:
+            log_callback(pdf_cache.stats())
+        for line in metrics.summary_lines():
+            log_callback(line)
+        try:
+            metrics.export(os.path.join(logs_folder, "documint_metrics.json"),
+                           os.path.join(logs_folder, "documint_metrics.prom"))
+        except OSError as e:
+            log_callback(f"⚠ Could not save the run metrics: {str(e)}")
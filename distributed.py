@@ -0,0 +1,447 @@
+"""Spreads one campaign over several machines through a shared queue folder.
+
+The coordinator validates the data file once and splits the rows that
+pass into shards. Each shard is written as a small CSV file in the queue
+folder. Workers on any machine that can reach the folder, e.g. over a
+network share, claim shards one at a time. A worker renders, converts and
+sends its shard with the normal pipeline, then reports back. A worker that
+stops sending heartbeats has its shard put back in the queue. The next
+worker resumes that shard from its journal, so rows that were already
+sent are not sent again. Each claim carries an owner token; a worker that
+was only slow or cut off notices on its next heartbeat that it no longer
+owns its shard and stops before its next send. When every shard is done, the coordinator merges
+the shard logs into the campaign's run log.
+
+Usage:
+    python distributed.py coordinate --config config.json --queue QUEUE_FOLDER [--shard-size N] [--dry-run]
+    python distributed.py work --queue QUEUE_FOLDER [--worker-id NAME]
+
+Each worker applies the configured email delay and limits on its own, so the
+overall sending rate is that many times higher.
+"""
+import argparse
+import csv
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+
+JOB_FILENAME = "job.json"
+MERGED_FILENAME = "merged"
+
+def _write_json(path, value):
+    """Writes a JSON file atomically, so readers never see half of it."""
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(value, f, indent=4)
+    os.replace(temporary, path)
+
+def _read_json(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+class WorkQueue:
+    """A queue of shards kept as files in a shared folder.
+
+    A shard moves from `pending/` to `claimed/` to `done/`. Claiming is an
+    atomic rename, so two workers can never claim the same shard. The
+    claiming worker then writes an owner token into the claim file. While
+    it holds the claim it touches the file; a claim that has not been
+    touched for a while is renamed back to `pending/`. A worker whose
+    token is no longer in the claim file has lost the shard to another
+    worker and must stop.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.pending_folder = os.path.join(folder, "pending")
+        self.claimed_folder = os.path.join(folder, "claimed")
+        self.done_folder = os.path.join(folder, "done")
+        self.shards_folder = os.path.join(folder, "shards")
+        for path in (self.pending_folder, self.claimed_folder, self.done_folder, self.shards_folder):
+            os.makedirs(path, exist_ok=True)
+
+    @property
+    def job_path(self):
+        return os.path.join(self.folder, JOB_FILENAME)
+
+    def data_file(self, shard):
+        """Returns the path of a shard's rows."""
+        return os.path.join(self.shards_folder, f"{shard}.csv")
+
+    def logs_folder(self, shard):
+        """Returns the folder of a shard's run log and journal."""
+        path = os.path.join(self.shards_folder, shard)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def add(self, shard, rows):
+        _write_json(os.path.join(self.pending_folder, f"{shard}.json"), {"shard": shard, "rows": rows})
+
+    def _names(self, folder):
+        return sorted(name[:-5] for name in os.listdir(folder) if name.endswith(".json"))
+
+    def pending(self):
+        return self._names(self.pending_folder)
+
+    def claimed(self):
+        return self._names(self.claimed_folder)
+
+    def done(self):
+        return self._names(self.done_folder)
+
+    def claim(self, worker_id):
+        """Claims the first pending shard.
+
+        Returns:
+            tuple: `(shard, token)`, where `token` identifies this claim, or
+                None if no shard is pending.
+        """
+        done = set(self.done())
+        for shard in self.pending():
+            path = os.path.join(self.claimed_folder, f"{shard}.json")
+            try:
+                os.rename(os.path.join(self.pending_folder, f"{shard}.json"), path)
+            except OSError:
+                continue  # Another worker was faster.
+            if shard in done:
+                self.release(shard)
+                continue
+            token = f"{worker_id}-{uuid.uuid4().hex}"
+            try:
+                # Replacing the file also refreshes its mtime, the first heartbeat.
+                _write_json(path, {**_read_json(path), "owner": token})
+            except (OSError, ValueError):
+                continue  # Requeued as stale before the token was written.
+            return shard, token
+        return None
+
+    def owns(self, shard, token):
+        """Returns True if the claim with `token` still holds the shard."""
+        try:
+            return _read_json(os.path.join(self.claimed_folder, f"{shard}.json")).get("owner") == token
+        except (OSError, ValueError):
+            return False
+
+    def heartbeat(self, shard, token):
+        """Marks a claimed shard as still being worked on.
+
+        Returns:
+            bool: False if the claim was lost: the shard was requeued or
+                claimed by another worker, or the folder can't be reached.
+        """
+        if not self.owns(shard, token):
+            return False
+        try:
+            os.utime(os.path.join(self.claimed_folder, f"{shard}.json"))
+        except OSError:
+            return False
+        return True
+
+    def requeue(self, shard, token=None):
+        """Puts a claimed shard back in the queue, unless another claim holds it now."""
+        if token is not None and not self.owns(shard, token):
+            return
+        try:
+            os.rename(os.path.join(self.claimed_folder, f"{shard}.json"),
+                      os.path.join(self.pending_folder, f"{shard}.json"))
+        except OSError:
+            pass
+
+    def release(self, shard):
+        try:
+            os.remove(os.path.join(self.claimed_folder, f"{shard}.json"))
+        except OSError:
+            pass
+
+    def complete(self, shard, result, token=None):
+        """Records a shard's result and drops its claim.
+
+        Returns:
+            bool: False if the claim with `token` was lost and nothing was recorded.
+        """
+        if token is not None and not self.owns(shard, token):
+            return False
+        _write_json(os.path.join(self.done_folder, f"{shard}.json"), result)
+        self.release(shard)
+        return True
+
+    def requeue_stale(self, stale_after):
+        """Returns claims without a recent heartbeat to the queue.
+
+        Returns:
+            list: The shards that were put back.
+        """
+        requeued = []
+        done = set(self.done())
+        now = time.time()
+        for shard in self.claimed():
+            claim = os.path.join(self.claimed_folder, f"{shard}.json")
+            try:
+                if shard in done:
+                    os.remove(claim)
+                elif now - os.path.getmtime(claim) > stale_after:
+                    os.rename(claim, os.path.join(self.pending_folder, f"{shard}.json"))
+                    requeued.append(shard)
+            except OSError:
+                continue
+        for shard in done.intersection(self.pending()):
+            try:
+                os.remove(os.path.join(self.pending_folder, f"{shard}.json"))
+            except OSError:
+                pass
+        return requeued
+
+def split(config, queue, shard_size, log_callback, dry_run=False):
+    """Validates the data file and writes its accepted rows as shards.
+
+    Rows rejected by validation are logged straight to the campaign's run
+    log. The job file is written last, so workers only start once every
+    shard exists.
+
+    Returns:
+        bool: False if validation failed and nothing was queued.
+    """
+    from core import make_log_record
+    from runlog import open_run_log
+    from sources import iter_rows, read_columns
+    from template import CompiledTemplate
+    from validation import validate_dataset
+
+    data_file = config["data_file"]
+    columns = read_columns(data_file)
+    placeholders = CompiledTemplate(config["template_file"]).placeholders
+    # Workers number repeated PDF filenames only within their own shard, so
+    # rows that would collide across shards are skipped here.
+    report = validate_dataset(data_file, columns, placeholders, config["pdf_filename_format"], config["email_body"],
+                              email_subject=config["email_subject"], skip_filename_collisions=True)
+    for line in report.summary_lines():
+        log_callback(line)
+    if not report.ok:
+        return False
+
+    count = 0
+    shard_rows = 0
+    writer = None
+    shard_file = None
+    with open_run_log(config["logs_folder"]) as run_log:
+        for index, row in iter_rows(data_file):
+            if not report.accepts(index):
+                email = str(row.get("Email", "N/A")).strip()
+                run_log.append(make_log_record(row, email, f"Failed: {report.skipped[index]}"))
+                log_callback(f"FAILED: {report.skipped[index]} for {email}")
+                continue
+            if writer is None:
+                shard = f"shard-{count:05d}"
+                shard_file = open(queue.data_file(shard), "w", newline="", encoding="utf-8")
+                writer = csv.writer(shard_file)
+                writer.writerow(columns)
+            writer.writerow([row.get(column, "") for column in columns])
+            shard_rows += 1
+            if shard_rows == shard_size:
+                shard_file.close()
+                queue.add(shard, shard_rows)
+                count += 1
+                shard_rows = 0
+                writer = None
+        if writer is not None:
+            shard_file.close()
+            queue.add(shard, shard_rows)
+            count += 1
+
+    _write_json(queue.job_path, {"config": config, "shards": count, "dry_run": dry_run})
+    log_callback(f"Queued {count} shards of up to {shard_size} rows.")
+    return True
+
+def merge_logs(config, queue, shards):
+    """Appends every shard's run log to the campaign's run log, in order."""
+    from runlog import LOG_FILENAME, open_run_log, read_records
+
+    with open_run_log(config["logs_folder"]) as run_log:
+        for shard in shards:
+            path = os.path.join(queue.logs_folder(shard), LOG_FILENAME)
+            if os.path.exists(path):
+                for record in read_records(path):
+                    run_log.append(record)
+
+def coordinate(config, queue_folder, log_callback, shard_size=1000, stale_after=120, poll_interval=5, dry_run=False):
+    """Splits a campaign into shards and waits for workers to finish them.
+
+    Running it again on the same queue folder picks up where it stopped
+    instead of splitting the data file again.
+
+    Args:
+        config (dict): The campaign settings, see `cli.load_config`.
+        queue_folder (str): The shared folder workers read from.
+        log_callback (function): Receives progress messages.
+        shard_size (int, optional): Rows per shard.
+        stale_after (float, optional): Seconds without a heartbeat after
+            which a claimed shard is given to another worker.
+        poll_interval (float, optional): Seconds between progress checks.
+        dry_run (bool, optional): Workers generate the PDFs but send no email.
+
+    Returns:
+        dict: Totals over all shards: "succeeded", "failed" and "skipped".
+            None if validation failed.
+    """
+    queue = WorkQueue(queue_folder)
+    if not os.path.exists(queue.job_path):
+        if not split(config, queue, shard_size, log_callback, dry_run):
+            return None
+    job = _read_json(queue.job_path)
+    total = job["shards"]
+
+    reported = None
+    while True:
+        for shard in queue.requeue_stale(stale_after):
+            log_callback(f"⚠ Re-queued {shard}: its worker stopped responding.")
+        done = queue.done()
+        if (len(done), len(queue.claimed())) != reported:
+            reported = (len(done), len(queue.claimed()))
+            log_callback(f"Shards: {len(done)}/{total} done, {reported[1]} in progress, {len(queue.pending())} waiting.")
+        if len(done) >= total:
+            break
+        time.sleep(poll_interval)
+
+    totals = {"succeeded": 0, "failed": 0, "skipped": 0}
+    for shard in done:
+        result = _read_json(os.path.join(queue.done_folder, f"{shard}.json"))
+        for key in totals:
+            totals[key] += result.get(key, 0)
+    merged = os.path.join(queue.folder, MERGED_FILENAME)
+    if not os.path.exists(merged):
+        merge_logs(config, queue, done)
+        open(merged, "w").close()
+    log_callback(f"All shards done: {totals['succeeded']} succeeded, {totals['failed']} failed, {totals['skipped']} skipped.")
+    return totals
+
+def _heartbeat(queue, shard, token, interval, stop, control):
+    """Keeps a claim fresh; cancels the shard's run as soon as the claim is lost."""
+    while not stop.wait(interval):
+        if not queue.heartbeat(shard, token):
+            control.cancel()
+            return
+
+def work(queue_folder, log_callback, worker_id=None, heartbeat_interval=10, poll_interval=5):
+    """Claims and processes shards until every shard of the job is done.
+
+    Args:
+        queue_folder (str): The shared folder the coordinator writes to.
+        log_callback (function): Receives progress messages.
+        worker_id (str, optional): Names this worker in the results.
+            Defaults to the host name and process ID.
+        heartbeat_interval (float, optional): Seconds between heartbeats.
+        poll_interval (float, optional): Seconds between looks for work.
+
+    Returns:
+        int: The number of shards this worker processed.
+    """
+    from cli import classify, run_config
+    from jobqueue import RunControl
+
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    queue = WorkQueue(queue_folder)
+    while not os.path.exists(queue.job_path):
+        time.sleep(poll_interval)
+    job = _read_json(queue.job_path)
+    config = job["config"]
+
+    processed = 0
+    while len(queue.done()) < job["shards"]:
+        claimed = queue.claim(worker_id)
+        if claimed is None:
+            # Everything is claimed; wait in case a stale shard comes back.
+            time.sleep(poll_interval)
+            continue
+        shard, token = claimed
+        log_callback(f"{worker_id}: processing {shard}")
+        counts = {"success": 0, "failed": 0, "skipped": 0, "error": 0, "warning": 0, "info": 0}
+
+        def log(message, shard=shard):
+            counts[classify(message)] += 1
+            log_callback(f"[{shard}] {message}")
+
+        # Cancelled by the heartbeat when the claim is lost, so this worker
+        # stops before its next send instead of racing the new owner.
+        control = RunControl()
+        stop = threading.Event()
+        beat = threading.Thread(target=_heartbeat, args=(queue, shard, token, heartbeat_interval, stop, control),
+                                daemon=True)
+        beat.start()
+        try:
+            # Resuming makes a re-queued shard skip the rows a dead worker already sent.
+            run_config(config, log, data_file=queue.data_file(shard), logs_folder=queue.logs_folder(shard),
+                       dry_run=job["dry_run"], resume=True, validate=False, control=control)
+        except BaseException:
+            queue.requeue(shard, token)
+            raise
+        finally:
+            stop.set()
+            beat.join()
+        if control.cancelled:
+            log_callback(f"{worker_id}: lost the claim on {shard}; stopped before the next send")
+            continue
+        if counts["error"]:
+            # The shard could not even start, e.g. no converter on this host.
+            queue.requeue(shard, token)
+            raise RuntimeError(f"{worker_id} could not process {shard}; it was put back in the queue")
+        if not queue.complete(shard, {
+            "worker": worker_id,
+            "succeeded": counts["success"],
+            "failed": counts["failed"],
+            "skipped": counts["skipped"],
+        }, token):
+            log_callback(f"{worker_id}: lost the claim on {shard} as it finished; its new owner completes it")
+            continue
+        processed += 1
+    return processed
+
+def main(argv=None):
+    from cli import EXIT_ABORTED, EXIT_INTERRUPTED, EXIT_OK, EXIT_ROWS_FAILED, EXIT_USAGE, ProgressReporter, load_config
+
+    parser = argparse.ArgumentParser(prog="python distributed.py", description="Run one campaign on several machines.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    coordinator = commands.add_parser("coordinate", help="Split the campaign into shards and wait for the workers.")
+    coordinator.add_argument("--config", default="config.json", help="Config file saved by the GUI (default: config.json).")
+    coordinator.add_argument("--queue", required=True, help="Shared queue folder.")
+    coordinator.add_argument("--shard-size", type=int, default=1000, metavar="N", help="Rows per shard (default: 1000).")
+    coordinator.add_argument("--stale-after", type=float, default=120, metavar="SECONDS",
+                             help="Re-queue shards whose worker has been silent this long (default: 120).")
+    coordinator.add_argument("--dry-run", action="store_true", help="Generate the PDFs but send no email.")
+    worker = commands.add_parser("work", help="Process shards until the campaign is done.")
+    worker.add_argument("--queue", required=True, help="Shared queue folder.")
+    worker.add_argument("--worker-id", help="Name of this worker (default: host name and process ID).")
+    for command in (coordinator, worker):
+        command.add_argument("--json", action="store_true", help="Print progress as one JSON object per line.")
+    args = parser.parse_args(argv)
+
+    reporter = ProgressReporter(as_json=args.json)
+    try:
+        if args.command == "work":
+            work(args.queue, reporter, worker_id=args.worker_id)
+            return EXIT_OK
+        try:
+            config = load_config(args.config)
+        except (OSError, ValueError) as e:
+            print(f"documint: cannot read config '{args.config}': {e}", file=sys.stderr)
+            return EXIT_USAGE
+        totals = coordinate(config, args.queue, reporter, shard_size=max(1, args.shard_size),
+                            stale_after=args.stale_after, dry_run=args.dry_run)
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED
+    except Exception as e:
+        reporter(f"❌ {e}")
+        return EXIT_ABORTED
+    if totals is None:
+        return EXIT_ABORTED
+    return EXIT_ROWS_FAILED if totals["failed"] else EXIT_OK
+
+if __name__ == "__main__":
+    # Render workers are separate processes; needed for the frozen executable.
+    import multiprocessing
+
+    multiprocessing.freeze_support()
+    sys.exit(main())
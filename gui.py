@@ -1,9 +1,16 @@
 import sys
 import os
+# Imported first: it notes the time startup measurements are taken from.
+from startup import STARTED, ModuleLoader, report_lines, write_report
+import time
 import tkinter as tk
 from tkinter import ttk, filedialog, scrolledtext, messagebox, simpledialog
 import threading
 import json
+import queue
+import multiprocessing
+import subprocess
+import tempfile
 
 # Add the parent directory to the sys.path to allow for relative imports
 # when running as a bundled executable.
@@ -12,50 +19,209 @@ if getattr(sys, 'frozen', False):
 else:
     application_path = os.path.dirname(os.path.abspath(__file__))
 
-from core import process_emails
+# core, bundle and preview pull in pandas and python-docx, which take
+# seconds to import; they are loaded in the background, see startup.py.
+from ratelimit import RateLimiter
+from checkpoint import JOURNAL_FILENAME, is_unfinished
+from jobqueue import JobQueue, JobScheduler
+from metrics import Metrics
+from payload import split_paths
+from runlog import export_excel
+from transports import create_transport
 
 class SettingsWindow(tk.Toplevel):
     """A Toplevel window for configuring advanced settings."""
+
+    # (tab, label, setting name, widget, widget options). Each setting name
+    # refers to the `<name>_var` variable of the main window.
+    FIELDS = [
+        ("General", "PDF Filename Format:", "pdf_filename_format", "entry", {}),
+        ("General", "Email Retries:", "retries", "spinbox", {"from_": 0, "to": 10}),
+        ("General", "Email Delay (seconds):", "delay", "spinbox", {"from_": 0, "to": 60}),
+        ("General", "Send Burst:", "burst", "spinbox", {"from_": 1, "to": 100}),
+        ("General", "Per-Domain Limit (per minute):", "domain_limit", "spinbox", {"from_": 0, "to": 1000}),
+        ("General", "Row ID Column (optional):", "id_column", "entry", {}),
+        ("General", "Bundle Bookmark Format:", "bookmark_format", "entry", {}),
+        ("Performance", "Render Workers:", "render_workers", "spinbox", {"from_": 0, "to": 32}),
+        ("Performance", "Converter Workers:", "converter_workers", "spinbox", {"from_": 1, "to": 16}),
+        ("Performance", "Send Workers:", "send_workers", "spinbox", {"from_": 1, "to": 32}),
+        ("Performance", "Async Sends In Flight:", "async_sends", "spinbox", {"from_": 0, "to": 1000}),
+        ("Performance", "PDF Cache Size (MB):", "pdf_cache_mb", "spinbox", {"from_": 0, "to": 100000}),
+        ("Performance", "Native PDF Renderer:", "native_pdf", "check", {}),
+        ("Performance", "Concurrent Jobs:", "concurrent_jobs", "spinbox", {"from_": 1, "to": 8}),
+        ("Mail Server", "Send Email With:", "transport", "combobox", {"values": ("outlook", "smtp"), "state": "readonly"}),
+        ("Mail Server", "SMTP Host:", "smtp_host", "entry", {}),
+        ("Mail Server", "SMTP Port:", "smtp_port", "spinbox", {"from_": 1, "to": 65535}),
+        ("Mail Server", "Use STARTTLS:", "smtp_starttls", "check", {}),
+        ("Mail Server", "Username:", "smtp_username", "entry", {}),
+        ("Mail Server", "Password:", "smtp_password", "entry", {"show": "*"}),
+        ("Mail Server", "From Address:", "smtp_sender", "entry", {}),
+        ("Mail Server", "SMTP Connections:", "smtp_connections", "spinbox", {"from_": 1, "to": 32}),
+    ]
+
     def __init__(self, parent):
         super().__init__(parent)
         self.parent = parent
         self.title("Advanced Settings")
-        self.geometry("500x300")
+        self.geometry("560x560")
         self.configure(bg="#4B4B4B")
 
-        self.pdf_filename_format_var = tk.StringVar(value=self.parent.pdf_filename_format_var.get())
-        self.retries_var = tk.IntVar(value=self.parent.retries_var.get())
-        self.delay_var = tk.IntVar(value=self.parent.delay_var.get())
-
         main_frame = ttk.Frame(self, padding="20", style='Card.TFrame')
         main_frame.pack(expand=True, fill="both")
 
-        ttk.Label(main_frame, text="PDF Filename Format:", style='Card.TLabel').grid(row=0, column=0, sticky="w", padx=10, pady=10)
-        ttk.Entry(main_frame, textvariable=self.pdf_filename_format_var, style='Dark.TEntry').grid(row=0, column=1, sticky="ew", padx=10, pady=10)
-
-        ttk.Label(main_frame, text="Email Retries:", style='Card.TLabel').grid(row=1, column=0, sticky="w", padx=10, pady=10)
-        ttk.Spinbox(main_frame, from_=0, to=10, textvariable=self.retries_var).grid(row=1, column=1, sticky="ew", padx=10, pady=10)
-
-        ttk.Label(main_frame, text="Email Delay (seconds):", style='Card.TLabel').grid(row=2, column=0, sticky="w", padx=10, pady=10)
-        ttk.Spinbox(main_frame, from_=0, to=60, textvariable=self.delay_var).grid(row=2, column=1, sticky="ew", padx=10, pady=10)
+        notebook = ttk.Notebook(main_frame)
+        notebook.pack(expand=True, fill="both")
+
+        self.vars = {}
+        tabs = {}
+        for tab, label, name, widget, options in self.FIELDS:
+            if tab not in tabs:
+                tabs[tab] = ttk.Frame(notebook, padding="10", style='Card.TFrame')
+                tabs[tab].grid_columnconfigure(1, weight=1)
+                notebook.add(tabs[tab], text=tab)
+            frame = tabs[tab]
+            row = frame.grid_size()[1]
+
+            parent_var = getattr(self.parent, f"{name}_var")
+            var = self.vars[name] = type(parent_var)(value=parent_var.get())
+
+            ttk.Label(frame, text=label, style='Card.TLabel').grid(row=row, column=0, sticky="w", padx=10, pady=10)
+            if widget == "entry":
+                field = ttk.Entry(frame, textvariable=var, **options)
+            elif widget == "spinbox":
+                field = ttk.Spinbox(frame, textvariable=var, **options)
+            elif widget == "combobox":
+                field = ttk.Combobox(frame, textvariable=var, **options)
+            else:
+                field = ttk.Checkbutton(frame, variable=var, **options)
+            field.grid(row=row, column=1, sticky="ew", padx=10, pady=10)
 
         button_frame = ttk.Frame(main_frame, style='Card.TFrame')
-        button_frame.grid(row=3, column=0, columnspan=2, pady=20)
+        button_frame.pack(pady=20)
 
         ttk.Button(button_frame, text="Save", command=self.save_and_close, style='Primary.TButton').pack(side="left", padx=10)
         ttk.Button(button_frame, text="Cancel", command=self.destroy, style='Secondary.TButton').pack(side="left", padx=10)
 
     def save_and_close(self):
         """Saves the settings and closes the window."""
-        self.parent.pdf_filename_format_var.set(self.pdf_filename_format_var.get())
-        self.parent.retries_var.set(self.retries_var.get())
-        self.parent.delay_var.set(self.delay_var.get())
+        for name, var in self.vars.items():
+            getattr(self.parent, f"{name}_var").set(var.get())
         self.destroy()
 
+class PreviewWindow(tk.Toplevel):
+    """A Toplevel window showing one data row rendered with the current settings."""
+
+    POLL_MS = 50
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.parent = parent
+        self.title("Preview")
+        self.geometry("760x640")
+        self.configure(bg="#4B4B4B")
+        self.pdf = None
+        self.results = queue.Queue()
+
+        main_frame = ttk.Frame(self, padding="20", style='Card.TFrame')
+        main_frame.pack(expand=True, fill="both")
+
+        controls = ttk.Frame(main_frame, style='Card.TFrame')
+        controls.pack(fill="x")
+        ttk.Label(controls, text="Data Row:", style='Card.TLabel').pack(side="left", padx=(0, 10))
+        self.row_var = tk.IntVar(value=1)
+        ttk.Spinbox(controls, textvariable=self.row_var, from_=1, to=10**7, width=8, command=self.refresh).pack(side="left")
+        self.native_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(controls, text="Fast layout (native renderer)", variable=self.native_var).pack(side="left", padx=10)
+        self.show_button = ttk.Button(controls, text="⟳ Show", style='Secondary.TButton', command=self.refresh)
+        self.show_button.pack(side="left", padx=10)
+        self.open_button = ttk.Button(controls, text="Open PDF", style='Secondary.TButton', command=self.open_pdf, state="disabled")
+        self.open_button.pack(side="left")
+
+        self.summary_text = tk.Text(main_frame, height=7, wrap=tk.WORD, relief="flat", bg="#4B4B4B", fg="#D3D3D3", font=("Segoe UI", 10))
+        self.summary_text.pack(fill="x", pady=10)
+        self.summary_text.tag_config("warning", foreground="#e67e22")
+        ttk.Label(main_frame, text="Document Text", style='Review.TLabel').pack(anchor="w")
+        self.document_text = scrolledtext.ScrolledText(main_frame, wrap=tk.WORD, height=12, relief="flat")
+        self.document_text.pack(expand=True, fill="both", pady=(5, 10))
+        ttk.Label(main_frame, text="Email Body (HTML)", style='Review.TLabel').pack(anchor="w")
+        self.body_text = scrolledtext.ScrolledText(main_frame, wrap=tk.WORD, height=8, relief="flat")
+        self.body_text.pack(fill="both", pady=(5, 0))
+        for widget in (self.summary_text, self.document_text, self.body_text):
+            widget.config(state="disabled")
+
+        self.bind("<Return>", lambda event: self.refresh())
+        self.refresh()
+
+    def refresh(self):
+        """Renders the chosen row in a background thread."""
+        if str(self.show_button["state"]) == "disabled":
+            return
+        c = self.parent
+        email_page = c.frames["EmailPage"]
+        try:
+            number = self.row_var.get() - 1
+        except tk.TclError:
+            return
+        args = (c.data_file_var.get(), c.template_file_var.get(), max(number, 0),
+                email_page.email_subject_entry.get(), email_page.email_body_text.get("1.0", tk.END),
+                c.pdf_filename_format_var.get())
+        self.show_button.config(state="disabled")
+        threading.Thread(target=self.render, args=(args, self.native_var.get()), daemon=True).start()
+        self.after(self.POLL_MS, self.poll)
+
+    def render(self, args, native_pdf):
+        try:
+            self.results.put(self.parent.get_previewer().preview(*args, native_pdf=native_pdf))
+        except Exception as e:
+            self.results.put(e)
+
+    def poll(self):
+        """Shows the preview once the background thread has finished it."""
+        try:
+            result = self.results.get_nowait()
+        except queue.Empty:
+            self.after(self.POLL_MS, self.poll)
+            return
+        self.show_button.config(state="normal")
+        if isinstance(result, Exception):
+            self.pdf = None
+            self.show(f"❌ {str(result)}", "", "", ["warning"])
+        else:
+            self.pdf = result.pdf
+            made = f" by the {result.renderer} renderer" if result.renderer else ""
+            summary = (f"Recipient: {result.email}\nPDF Filename: {result.filename}.pdf\nSubject: {result.subject}\n"
+                       f"Rendered in {result.seconds * 1000:.0f} ms{made}\n")
+            self.show(summary + "".join(f"⚠ {warning}\n" for warning in result.warnings), result.text, result.body,
+                      ["warning"] if result.warnings else [])
+        self.open_button.config(state="normal" if self.pdf else "disabled")
+
+    def show(self, summary, document, body, summary_tags):
+        for widget, text, tags in ((self.summary_text, summary, summary_tags), (self.document_text, document, []),
+                                   (self.body_text, body, [])):
+            widget.config(state="normal")
+            widget.delete("1.0", tk.END)
+            widget.insert(tk.END, text, tuple(tags))
+            widget.config(state="disabled")
+
+    def open_pdf(self):
+        """Opens the previewed PDF in the default viewer."""
+        path = os.path.join(tempfile.gettempdir(), "documint_preview.pdf")
+        try:
+            with open(path, "wb") as f:
+                f.write(self.pdf)
+            if hasattr(os, "startfile"):
+                os.startfile(path)
+            else:
+                subprocess.Popen(["open" if sys.platform == "darwin" else "xdg-open", path])
+        except OSError as e:
+            messagebox.showerror("Preview", f"Could not open the PDF: {e}", parent=self)
+
 class DocuMint(tk.Tk):
     """The main application window for DocuMint."""
-    def __init__(self):
+    def __init__(self, import_times=False):
         super().__init__()
+        self.modules = ModuleLoader()
+        self.import_times = import_times
 
         self.title("DocuMint")
         self.geometry("1024x768")
@@ -63,6 +229,9 @@ class DocuMint(tk.Tk):
         self.configure(bg="#4B4B4B")
 
         self.config_file = "config.json"
+        # Keeps the compiled template and data rows between previews.
+        self.previewer = None
+        self.preview_window = None
 
         # Configuration variables
         self.data_file_var = tk.StringVar()
@@ -70,8 +239,37 @@ class DocuMint(tk.Tk):
         self.pdf_folder_var = tk.StringVar()
         self.logs_folder_var = tk.StringVar()
         self.pdf_filename_format_var = tk.StringVar(value="Admit_{<ID>}")
+        self.attachments_var = tk.StringVar()  # Paths separated by ";".
         self.retries_var = tk.IntVar(value=2)
         self.delay_var = tk.IntVar(value=2)
+        self.burst_var = tk.IntVar(value=1)
+        self.domain_limit_var = tk.IntVar(value=0)
+        self.id_column_var = tk.StringVar()
+        self.bookmark_format_var = tk.StringVar()
+        self.render_workers_var = tk.IntVar(value=2)
+        self.converter_workers_var = tk.IntVar(value=1)
+        self.send_workers_var = tk.IntVar(value=1)
+        self.async_sends_var = tk.IntVar(value=0)
+        self.pdf_cache_mb_var = tk.IntVar(value=1024)
+        self.native_pdf_var = tk.BooleanVar(value=False)
+        self.concurrent_jobs_var = tk.IntVar(value=1)
+        self.transport_var = tk.StringVar(value="outlook")
+        self.smtp_host_var = tk.StringVar()
+        self.smtp_port_var = tk.IntVar(value=587)
+        self.smtp_starttls_var = tk.BooleanVar(value=True)
+        self.smtp_username_var = tk.StringVar()
+        self.smtp_password_var = tk.StringVar()  # Never written to the config file.
+        self.smtp_sender_var = tk.StringVar()
+        self.smtp_connections_var = tk.IntVar(value=4)
+
+        # Settings written to the config file, by `<name>_var`.
+        self.persisted_settings = [
+            "data_file", "template_file", "pdf_folder", "logs_folder", "attachments",
+            "pdf_filename_format", "retries", "delay", "burst", "domain_limit", "id_column", "bookmark_format",
+            "render_workers", "converter_workers", "send_workers", "async_sends", "pdf_cache_mb",
+            "native_pdf", "concurrent_jobs", "transport", "smtp_host", "smtp_port", "smtp_starttls",
+            "smtp_username", "smtp_sender", "smtp_connections",
+        ]
 
         # Style configuration
         self.setup_styles()
@@ -102,7 +300,37 @@ class DocuMint(tk.Tk):
         self.load_config()
         self.protocol("WM_DELETE_WINDOW", self.on_closing)
 
+        # Queued campaigns run in the background; see jobqueue.py.
+        run_page = self.frames["RunPage"]
+        self.jobs = JobQueue()
+        self.scheduler = JobScheduler(self.jobs, run_page.append_log, slots=self.concurrent_jobs_var.get(),
+                                      transport_factory=self.create_transport, on_change=run_page.jobs_changed)
+
         self.show_frame("WelcomePage")
+        # Heavy modules load once the window is up, while the welcome page shows.
+        self.after_idle(self.window_shown)
+
+    def window_shown(self):
+        """Starts loading the heavy modules in the background."""
+        window_seconds = time.perf_counter() - STARTED
+        self.modules.start()
+        self.scheduler.start()
+        if self.import_times:
+            self.report_import_times(window_seconds)
+
+    def report_import_times(self, window_seconds):
+        """Reports the startup measurements once every module is loaded, then quits."""
+        if not self.modules.done.is_set():
+            self.after(50, self.report_import_times, window_seconds)
+            return
+        write_report(report_lines(self.modules, window_seconds))
+        self.destroy()
+
+    def get_previewer(self):
+        """Returns the previewer, creating it on first use."""
+        if self.previewer is None:
+            self.previewer = self.modules.load("preview").Previewer()
+        return self.previewer
 
     def setup_styles(self):
         """Sets up the styling for the application's widgets."""
@@ -126,6 +354,14 @@ class DocuMint(tk.Tk):
         """Opens the advanced settings window."""
         SettingsWindow(self)
 
+    def open_preview(self):
+        """Opens the preview window, or brings it to the front."""
+        if self.preview_window is not None and self.preview_window.winfo_exists():
+            self.preview_window.lift()
+            self.preview_window.refresh()
+            return
+        self.preview_window = PreviewWindow(self)
+
     def show_instructions(self):
         """Shows the instructions window."""
         instruction_window = tk.Toplevel(self)
@@ -187,6 +423,10 @@ DocuMint is a powerful tool designed to automate the entire process of generatin
 
 DocuMint now supports dynamic placeholders! This means you can use any column from your Excel file as a placeholder in your Word template. For example, if you have a column named `CourseName` in your Excel file, you can use `<CourseName>` in your Word template, and DocuMint will automatically replace it with the correct data.
 
+The email subject, the email body and the PDF Filename Format can use the same columns in curly braces, e.g. `Admit Card for {<Name>}`. Characters that are not allowed in file names, such as `/` or `:`, are replaced with `_` in PDF filenames, and rows that would share a PDF filename get numbered names such as `Card (2).pdf`. Braces in the subject that aren't part of a placeholder are kept as they are.
+
+To check your template and email without a dry run, click **👁 Preview** on the file or email page. Pick a data row to see its PDF filename, subject, email body and document text, together with any placeholders that have no matching column. The preview shows text only; **Open PDF** opens the rendered document in your PDF viewer. With **Fast layout** ticked, simple templates are laid out in milliseconds by the native renderer; other templates, or any template with it unticked, are converted by Word or LibreOffice, which takes as long as converting one document in a run. Edits to the template or data file are picked up automatically on the next preview.
+
 ----------------
 3. Required Libraries
 ----------------
@@ -207,8 +447,35 @@ You can install them using pip:
 Click the ⚙️ icon to configure:
 
 *   **PDF Filename Format**: Define a custom format for the generated PDF files. You can use any column from your Excel file as a placeholder, e.g., `Admit_{<ID>}_{<Name>}`.
-*   **Email Retries**: Set the number of times the application should attempt to resend a failed email.
-*   **Email Delay**: Specify a delay (in seconds) between sending each email to avoid potential issues with email servers.
+*   **Email Retries**: Set the number of times the application should attempt to send an email. Failed attempts are retried after a short, growing, randomised pause.
+*   **Email Delay**: Specify the average delay (in seconds) between emails to avoid potential issues with email servers. Dry runs never wait.
+*   **Send Burst**: How many emails may go out back to back before the delay applies.
+*   **Per-Domain Limit**: The most emails per minute sent to any one domain (e.g. gmail.com). 0 means no limit.
+*   **Bundle Bookmark Format**: The title of each row's bookmark in a merged PDF made with **Export Bundle**, using placeholders like the filename format, e.g. `{<Name>} ({<ID>})`. Leave empty for no bookmarks.
+*   **Row ID Column**: A column that uniquely identifies each row, e.g. `ID`. Used to recognise rows when a run is resumed. If left empty, rows are recognised by their values.
+*   **Mail Server**: Send through Outlook (default) or directly through an SMTP server. SMTP keeps several logged-in connections open and reuses them for every email. The password is not saved.
+*   **Render / Converter / Send Workers**: How many documents are filled in, converted to PDF and emailed at the same time. Set Render Workers to 0 to process one row at a time.
+*   **Async Sends In Flight**: When above 0, emails are sent by a single background engine that keeps up to this many sends going at once, so one slow recipient does not hold up the others.
+*   **PDF Cache Size**: Converted PDFs are kept in a `pdf_cache` folder inside your logs folder, up to this many megabytes. When a row's template and values have not changed since an earlier run, its PDF is reused instead of being made again. 0 turns the cache off.
+*   **Native PDF Renderer**: Lays out simple templates (text, lists, tables, headers and footers) and writes the PDF directly, without Word or LibreOffice, which is many times faster. Templates with images, text boxes, fields or merged cells, and rows with characters outside Western European alphabets, are still converted by Word or LibreOffice; the log says when that happens.
+
+----------------
+5. Run Log
+----------------
+
+The outcome of every row is added to `documint_log.jsonl` in your logs folder as soon as it is known, so nothing is lost if the application is closed mid-run. Click **Export Log** on the run page to save the whole history as `documint_log.xlsx`.
+
+The log box on the run page shows the latest 2,000 messages. Every message is also added to `documint_console.log` in your logs folder.
+
+While a run is going, the Throughput box shows how many rows are done, rows per minute, the estimated time left and how long each stage (filling the template, saving, converting, waiting for the rate limit, sending) takes. At the end the figures are saved as `documint_metrics.json` and `documint_metrics.prom` (Prometheus text format) in the logs folder.
+
+If a run stops part way, click **Resume** to continue it. Rows that were already sent are skipped, PDFs that were already made are reused, and failed rows are tried again. A row whose email was being sent when the run stopped is never sent twice; it is logged so you can check it yourself. If you click **Start Process** while the last run in the logs folder is unfinished, DocuMint offers to resume it instead. Starting fresh keeps the old journal, renamed with the date and time, in the logs folder.
+
+**Start Process**, **Dry Run** and **Resume** add a job to the **Job Queue** instead of running straight away, so you can set up the next campaign while one is sending. Each job keeps a copy of the settings it was queued with; changing the settings afterwards doesn't change it. Jobs with a higher **Priority** run first; use ▲ and ▼ to change the order. **Concurrent Jobs** in the settings sets how many jobs run at once. Running jobs share the computer's processors: together they use at most one render worker per processor, and two jobs that use the same PDF or logs folder never run at the same time. **Pause** stops a job before its next email, **Resume** continues it, and **Cancel** stops it for good; a cancelled or failed job can be resumed later, and rows that were already sent are skipped. The queue is kept in `documint_jobs.json`. A job that was running when DocuMint was closed comes back paused; resume it to continue. **Send Test Email** and **Export Bundle** still run at once.
+
+Files chosen under **Attach to Every Email** on the email page (for example a set of instructions) are sent to every recipient along with their own PDF. Each file is read and prepared once per run, not once per email.
+
+To print or hand over all documents at once, click **Export Bundle** and save either a `.pdf` or a `.zip` file. A `.pdf` holds every row's document, each starting on a new page, with a bookmark per row if **Bundle Bookmark Format** is set. A `.zip` holds the individual PDFs, named by the PDF Filename Format. No email is sent.
 
 ================================================='''
 
@@ -225,38 +492,52 @@ Click the ⚙️ icon to configure:
 
     def on_closing(self):
         """Called when the application window is closed."""
+        if self.scheduler.running and not messagebox.askyesno(
+                "Jobs Running", "Jobs are still running. They finish in the background; queued jobs wait for the next start. Close anyway?"):
+            return
         self.save_config()
+        # Running jobs carry on to the end; queued ones stay in the queue file.
+        self.scheduler.stop()
+        if self.previewer is not None:
+            self.previewer.close()
         self.destroy()
 
+    def config_snapshot(self):
+        """Returns the current settings as saved in the config file, e.g. for a job."""
+        email_page = self.frames["EmailPage"]
+        config = {name: getattr(self, f"{name}_var").get() for name in self.persisted_settings}
+        config["email_subject"] = email_page.email_subject_entry.get()
+        config["email_body"] = email_page.email_body_text.get("1.0", tk.END)
+        return config
+
     def save_config(self):
         """Saves the current configuration to a file."""
-        email_page = self.frames["EmailPage"]
-        config = {
-            "data_file": self.data_file_var.get(),
-            "template_file": self.template_file_var.get(),
-            "pdf_folder": self.pdf_folder_var.get(),
-            "logs_folder": self.logs_folder_var.get(),
-            "email_subject": email_page.email_subject_entry.get(),
-            "email_body": email_page.email_body_text.get("1.0", tk.END),
-            "pdf_filename_format": self.pdf_filename_format_var.get(),
-            "retries": self.retries_var.get(),
-            "delay": self.delay_var.get()
-        }
         with open(self.config_file, 'w') as f:
-            json.dump(config, f, indent=4)
+            json.dump(self.config_snapshot(), f, indent=4)
+
+    def create_transport(self, config):
+        """Creates the mail transport a config snapshot chooses, with the password entered in the settings."""
+        if config["transport"] == "smtp":
+            return create_transport(
+                "smtp",
+                host=config["smtp_host"],
+                port=int(config["smtp_port"]),
+                username=config["smtp_username"] or None,
+                password=self.smtp_password_var.get() or None,
+                sender=config["smtp_sender"] or None,
+                starttls=bool(config["smtp_starttls"]),
+                pool_size=int(config["smtp_connections"])
+            )
+        return create_transport(config["transport"])
 
     def load_config(self):
         """Loads the configuration from a file."""
         try:
             with open(self.config_file, 'r') as f:
                 config = json.load(f)
-                self.data_file_var.set(config.get("data_file", ""))
-                self.template_file_var.set(config.get("template_file", ""))
-                self.pdf_folder_var.set(config.get("pdf_folder", ""))
-                self.logs_folder_var.set(config.get("logs_folder", ""))
-                self.pdf_filename_format_var.set(config.get("pdf_filename_format", "Admit_{<ID>}"))
-                self.retries_var.set(config.get("retries", 2))
-                self.delay_var.set(config.get("delay", 2))
+                for name in self.persisted_settings:
+                    if name in config:
+                        getattr(self, f"{name}_var").set(config[name])
 
                 email_page = self.frames["EmailPage"]
                 email_page.email_subject_entry.delete(0, tk.END)
@@ -299,7 +580,7 @@ class FileSetupPage(ttk.Frame):
         card = ttk.Frame(main_content, style='Card.TFrame', padding=40)
         card.pack()
 
-        self.create_browse_row(card, "Data File (Excel):", self.controller.data_file_var, self.browse_data_file, 0)
+        self.create_browse_row(card, "Data File (Excel/CSV):", self.controller.data_file_var, self.browse_data_file, 0)
         self.create_browse_row(card, "Template File (DOCX):", self.controller.template_file_var, self.browse_template_file, 1)
         self.create_browse_row(card, "PDF Output Folder:", self.controller.pdf_folder_var, self.browse_pdf_folder, 2)
         self.create_browse_row(card, "Logs Folder:", self.controller.logs_folder_var, self.browse_logs_folder, 3)
@@ -307,6 +588,7 @@ class FileSetupPage(ttk.Frame):
         nav_frame = ttk.Frame(main_content, style='Page.TFrame')
         nav_frame.pack(pady=40)
         ttk.Button(nav_frame, text="Back", style='Secondary.TButton', command=lambda: controller.show_frame("WelcomePage")).pack(side="left", padx=10)
+        ttk.Button(nav_frame, text="👁 Preview", style='Secondary.TButton', command=controller.open_preview).pack(side="left", padx=10)
         ttk.Button(nav_frame, text="Next", style='Primary.TButton', command=lambda: controller.show_frame("EmailPage")).pack(side="left", padx=10)
 
     def create_browse_row(self, parent, label_text, var, command, row):
@@ -315,7 +597,7 @@ class FileSetupPage(ttk.Frame):
         ttk.Button(parent, text="Browse...", style='Secondary.TButton', command=command).grid(row=row, column=2, padx=10, pady=10)
 
     def browse_data_file(self):
-        file = filedialog.askopenfilename(title="Select Excel Data File", filetypes=[("Excel Files", "*.xlsx *.xls")])
+        file = filedialog.askopenfilename(title="Select Data File", filetypes=[("Data Files", "*.xlsx *.xls *.csv *.parquet"), ("Excel Files", "*.xlsx *.xls"), ("CSV Files", "*.csv"), ("Parquet Files", "*.parquet")])
         if file:
             self.controller.data_file_var.set(file)
 
@@ -359,11 +641,23 @@ class EmailPage(ttk.Frame):
         self.email_body_text = scrolledtext.ScrolledText(card, wrap=tk.WORD, width=80, height=15, relief="flat")
         self.email_body_text.grid(row=1, column=1, padx=10, pady=10)
 
+        ttk.Label(card, text="Attach to Every Email:", style='Card.TLabel').grid(row=2, column=0, sticky="w", padx=10, pady=10)
+        attachments_row = ttk.Frame(card, style='Card.TFrame')
+        attachments_row.grid(row=2, column=1, sticky="ew", padx=10, pady=10)
+        ttk.Entry(attachments_row, textvariable=self.controller.attachments_var, width=68).pack(side="left", fill="x", expand=True)
+        ttk.Button(attachments_row, text="Browse...", style='Secondary.TButton', command=self.browse_attachments).pack(side="left", padx=(10, 0))
+
         nav_frame = ttk.Frame(main_content, style='Page.TFrame')
         nav_frame.pack(pady=40)
         ttk.Button(nav_frame, text="Back", style='Secondary.TButton', command=lambda: controller.show_frame("FileSetupPage")).pack(side="left", padx=10)
+        ttk.Button(nav_frame, text="👁 Preview", style='Secondary.TButton', command=controller.open_preview).pack(side="left", padx=10)
         ttk.Button(nav_frame, text="Next", style='Primary.TButton', command=lambda: controller.show_frame("RunPage")).pack(side="left", padx=10)
 
+    def browse_attachments(self):
+        files = filedialog.askopenfilenames(title="Select Files to Attach to Every Email")
+        if files:
+            self.controller.attachments_var.set(";".join(files))
+
     def get_default_email_body(self):
         """Returns the default email body."""
         return '''<html xmlns="http://www.w3.org/1999/xhtml">
@@ -380,6 +674,15 @@ class EmailPage(ttk.Frame):
 
 class RunPage(ttk.Frame):
     """The page for running the process and viewing logs."""
+
+    # Lines kept in the log widget; older ones are only in the history file.
+    MAX_LOG_LINES = 2000
+    # Most messages shown per refresh, and milliseconds between refreshes.
+    LOG_BATCH = 1000
+    LOG_INTERVAL_MS = 100
+    # Milliseconds between checks for changes to the job list.
+    JOBS_INTERVAL_MS = 500
+
     def __init__(self, parent, controller):
         super().__init__(parent, style='Page.TFrame')
         self.controller = controller
@@ -397,6 +700,31 @@ class RunPage(ttk.Frame):
         self.review_text = tk.Text(review_card, wrap=tk.WORD, relief="flat", bg="#5c5c5c", fg="#D3D3D3", font=("Segoe UI", 10))
         self.review_text.pack(expand=True, fill="both", padx=10, pady=10)
 
+        ttk.Label(review_card, text="Job Queue", style='Review.TLabel').pack(pady=(10, 0))
+        columns = ("mode", "priority", "status", "rows")
+        self.jobs_tree = ttk.Treeview(review_card, columns=columns, height=5, selectmode="browse")
+        self.jobs_tree.heading("#0", text="Job")
+        self.jobs_tree.column("#0", width=160)
+        for column, heading, width in zip(columns, ("Mode", "Priority", "Status", "Sent / Failed / Skipped"), (60, 60, 150, 140)):
+            self.jobs_tree.heading(column, text=heading)
+            self.jobs_tree.column(column, width=width, anchor="w" if column == "status" else "center")
+        self.jobs_tree.pack(fill="x", padx=10, pady=(10, 5))
+        job_buttons = ttk.Frame(review_card, style='Card.TFrame')
+        job_buttons.pack(pady=(0, 5))
+        for text, command in (("⏸ Pause", self.pause_job), ("▶ Resume", self.resume_job), ("✖ Cancel", self.cancel_job),
+                              ("▲", lambda: self.move_job(-1)), ("▼", lambda: self.move_job(1)), ("🗑 Remove", self.remove_job)):
+            ttk.Button(job_buttons, text=text, style='Secondary.TButton', command=command).pack(side="left", padx=3)
+        # Set from the scheduler's threads; the job list is redrawn on the Tk thread.
+        self.jobs_dirty = True
+        self.after(self.JOBS_INTERVAL_MS, self.refresh_jobs)
+
+        ttk.Label(review_card, text="Throughput", style='Review.TLabel').pack(pady=(10, 0))
+        self.metrics_text = tk.Text(review_card, height=7, wrap=tk.NONE, relief="flat", bg="#5c5c5c", fg="#D3D3D3", font=("Courier New", 9))
+        self.metrics_text.pack(fill="x", padx=10, pady=10)
+        self.metrics_text.config(state="disabled")
+        self.metrics = None
+        self.after(1000, self.refresh_metrics)
+
         # Log Frame
         log_card = ttk.Frame(self, style='Card.TFrame', padding=20)
         log_card.grid(row=1, column=1, sticky="nsew", padx=(10, 20), pady=10)
@@ -404,11 +732,24 @@ class RunPage(ttk.Frame):
         self.log_text = scrolledtext.ScrolledText(log_card, wrap=tk.WORD, relief="flat")
         self.log_text.pack(expand=True, fill="both", padx=10, pady=10)
         self.log_text.configure(bg="#1c2833", fg="#D3D3D3")
+        self.log_text.tag_config("success", foreground="#2ecc71", font=("Courier New", 11, "bold"))
+        self.log_text.tag_config("error", foreground="#e74c3c", font=("Courier New", 11, "bold"))
+        self.log_text.config(state="disabled")
+
+        # Worker threads never touch Tk; they queue messages (and callables
+        # to run on the Tk thread) and drain_log picks them up in batches.
+        self.log_queue = queue.Queue()
+        self.history_file = None
+        self.after(self.LOG_INTERVAL_MS, self.drain_log)
 
         # Control Frame
         control_frame = ttk.Frame(self, style='Page.TFrame')
         control_frame.grid(row=2, column=0, columnspan=2, pady=20)
 
+        ttk.Label(control_frame, text="Priority:", style='H2.TLabel').pack(side="left", padx=(10, 0))
+        self.priority_var = tk.IntVar(value=0)
+        ttk.Spinbox(control_frame, textvariable=self.priority_var, from_=-10, to=10, width=4).pack(side="left", padx=(5, 10))
+
         self.start_button = ttk.Button(control_frame, text="▶ Start Process", style='Primary.TButton', command=self.start_process)
         self.start_button.pack(side="left", padx=10)
 
@@ -418,6 +759,15 @@ class RunPage(ttk.Frame):
         self.test_email_button = ttk.Button(control_frame, text="✉ Send Test Email", style='Secondary.TButton', command=self.send_test_email)
         self.test_email_button.pack(side="left", padx=10)
 
+        self.resume_button = ttk.Button(control_frame, text="⟳ Resume", style='Secondary.TButton', command=self.resume)
+        self.resume_button.pack(side="left", padx=10)
+
+        self.export_log_button = ttk.Button(control_frame, text="⤓ Export Log", style='Secondary.TButton', command=self.export_log)
+        self.export_log_button.pack(side="left", padx=10)
+
+        self.bundle_button = ttk.Button(control_frame, text="⧉ Export Bundle", style='Secondary.TButton', command=self.export_bundle)
+        self.bundle_button.pack(side="left", padx=10)
+
         # Navigation Frame
         nav_frame = ttk.Frame(self, style='Page.TFrame')
         nav_frame.grid(row=3, column=0, columnspan=2, pady=10)
@@ -434,25 +784,62 @@ class RunPage(ttk.Frame):
         review_content += f"Email Subject: {self.controller.frames['EmailPage'].email_subject_entry.get()}\n\n"
         review_content += f"PDF Filename Format: {self.controller.pdf_filename_format_var.get()}\n"
         review_content += f"Email Retries: {self.controller.retries_var.get()}\n"
-        review_content += f"Email Delay: {self.controller.delay_var.get()}s"
+        review_content += f"Email Delay: {self.controller.delay_var.get()}s (burst {self.controller.burst_var.get()})\n"
+        review_content += f"Per-Domain Limit: {self.controller.domain_limit_var.get() or 'none'}/min\n"
+        review_content += f"Send Email With: {self.controller.transport_var.get()}\n"
+        review_content += f"Workers (render/convert/send): {self.controller.render_workers_var.get()}/{self.controller.converter_workers_var.get()}/{self.controller.send_workers_var.get()}\n"
+        review_content += f"Concurrent Jobs: {self.controller.concurrent_jobs_var.get()}"
         self.review_text.insert(tk.END, review_content)
         self.review_text.config(state="disabled")
 
-    def start_process(self, dry_run=False, test_email=None):
-        """Starts the admit card generation and email sending process."""
+    def start_process(self, dry_run=False, test_email=None, resume=False):
+        """Queues a run with the current settings, or sends a test email at once."""
         if not self.validate_inputs():
             return
 
-        if not dry_run and not test_email:
-            if not messagebox.askyesno("Confirmation", "Are you sure you want to start the email sending process?"):
+        if resume:
+            if not messagebox.askyesno("Confirmation", "Resume the last run? Rows that were already sent are skipped."):
+                return
+        fresh = False
+        if not resume and not dry_run and not test_email:
+            journal = os.path.join(self.controller.logs_folder_var.get(), JOURNAL_FILENAME)
+            if is_unfinished(journal):
+                answer = messagebox.askyesnocancel(
+                    "Unfinished Run",
+                    "The last run in this logs folder did not finish. Resume it instead, skipping the rows that were already sent?\n\n"
+                    "Yes: resume the last run.\nNo: start a fresh run. The old journal is archived and rows it already sent are sent again."
+                )
+                if answer is None:
+                    return
+                resume, fresh = answer, not answer
+            if not resume and not messagebox.askyesno("Confirmation", "Are you sure you want to start the email sending process?"):
                 return
 
+        self.history_file = os.path.join(self.controller.logs_folder_var.get(), "documint_console.log")
+        if not test_email:
+            self.queue_job(dry_run, resume, fresh)
+            return
+
         self.log_text.config(state="normal")
         self.log_text.delete("1.0", tk.END)
+        self.log_text.config(state="disabled")
         self.set_buttons_state("disabled")
         self.append_log("🚀 Process started...")
 
-        threading.Thread(target=self.run_processing, args=(dry_run, test_email)).start()
+        self.metrics = Metrics()
+        threading.Thread(target=self.run_processing, args=(dry_run, test_email, resume)).start()
+
+    def queue_job(self, dry_run, resume, fresh=False):
+        """Adds a job with a snapshot of the current settings to the queue."""
+        c = self.controller
+        try:
+            priority = self.priority_var.get()
+        except tk.TclError:
+            priority = 0
+        job = c.jobs.add(c.config_snapshot(), priority=priority, dry_run=dry_run, resume=resume, fresh=fresh)
+        self.append_log(f"📋 Queued job {job['id']}: {job['name']}" + (" (dry run)" if dry_run else ""))
+        c.scheduler.slots = max(1, c.concurrent_jobs_var.get())
+        c.scheduler.notify()
 
     def validate_inputs(self):
         """Validates the user's inputs."""
@@ -475,53 +862,272 @@ class RunPage(ttk.Frame):
         """Starts the process in dry run mode."""
         self.start_process(dry_run=True)
 
+    def resume(self):
+        """Continues the last run, skipping the rows that were already sent."""
+        self.start_process(resume=True)
+
     def send_test_email(self):
         """Sends a single test email."""
         email = simpledialog.askstring("Test Email", "Enter the email address to send a test email to:")
         if email:
             self.start_process(test_email=email)
 
-    def run_processing(self, dry_run, test_email):
-        """Runs the core processing logic in a separate thread."""
-        email_page = self.controller.frames["EmailPage"]
-        process_emails(
-            self.controller.data_file_var.get(),
-            self.controller.template_file_var.get(),
-            self.controller.pdf_folder_var.get(),
-            self.controller.logs_folder_var.get(),
+    def export_log(self):
+        """Writes the run log of the logs folder to an Excel workbook."""
+        logs_folder = self.controller.logs_folder_var.get()
+        if not logs_folder or not os.path.isdir(logs_folder):
+            messagebox.showerror("Input Error", "Logs Folder is not set.")
+            return
+        try:
+            excel_path = export_excel(logs_folder)
+        except Exception as e:
+            messagebox.showerror("Export Error", f"Could not export the log: {e}")
+            return
+        messagebox.showinfo("Log Exported", f"The log was saved to:\n{excel_path}")
+
+    def export_bundle(self):
+        """Writes every row into one merged PDF or zip archive, sending no email."""
+        if not self.validate_inputs():
+            return
+        bundle_path = filedialog.asksaveasfilename(
+            title="Save Bundle As",
+            defaultextension=".pdf",
+            filetypes=[("Merged PDF", "*.pdf"), ("Zip of PDFs", "*.zip")],
+        )
+        if not bundle_path:
+            return
+
+        self.log_text.config(state="normal")
+        self.log_text.delete("1.0", tk.END)
+        self.log_text.config(state="disabled")
+        self.history_file = os.path.join(self.controller.logs_folder_var.get(), "documint_console.log")
+        self.set_buttons_state("disabled")
+        self.append_log("🚀 Bundle export started...")
+        threading.Thread(target=self.run_bundle, args=(bundle_path,)).start()
+
+    def run_bundle(self, bundle_path):
+        """Runs the bundle export in a separate thread."""
+        c = self.controller
+        try:
+            bundle = c.modules.load("bundle")
+        except Exception as e:
+            self.append_log(f"❌ Error loading DocuMint: {e}")
+            self.log_queue.put(lambda: self.set_buttons_state("normal"))
+            return
+        bundle.export_bundle(
+            c.data_file_var.get(),
+            c.template_file_var.get(),
+            bundle_path,
             self.append_log,
-            email_page.email_subject_entry.get(),
-            email_page.email_body_text.get("1.0", tk.END),
-            self.controller.pdf_filename_format_var.get(),
-            self.controller.retries_var.get(),
-            self.controller.delay_var.get(),
-            dry_run=dry_run,
-            test_email=test_email
+            c.pdf_filename_format_var.get(),
+            c.bookmark_format_var.get().strip() or None,
+            native_pdf=c.native_pdf_var.get(),
         )
-        self.append_log("🏁 Process completed.")
-        self.set_buttons_state("normal")
+        self.append_log("🏁 Bundle export completed.")
+        self.log_queue.put(lambda: self.set_buttons_state("normal"))
+
+    def create_transport(self):
+        """Creates the mail transport chosen in the settings."""
+        return self.controller.create_transport(self.controller.config_snapshot())
+
+    def run_processing(self, dry_run, test_email, resume=False):
+        """Runs the core processing logic in a separate thread."""
+        email_page = self.controller.frames["EmailPage"]
+        try:
+            core = self.controller.modules.load("core")
+        except Exception as e:
+            self.append_log(f"❌ Error loading DocuMint: {e}")
+            self.log_queue.put(lambda: self.set_buttons_state("normal"))
+            return
+        try:
+            transport = self.create_transport()
+        except Exception as e:
+            self.append_log(f"❌ Error setting up the mail transport: {e}")
+            self.log_queue.put(lambda: self.set_buttons_state("normal"))
+            return
+        try:
+            core.process_emails(
+                self.controller.data_file_var.get(),
+                self.controller.template_file_var.get(),
+                self.controller.pdf_folder_var.get(),
+                self.controller.logs_folder_var.get(),
+                self.append_log,
+                email_page.email_subject_entry.get(),
+                email_page.email_body_text.get("1.0", tk.END),
+                self.controller.pdf_filename_format_var.get(),
+                self.controller.retries_var.get(),
+                self.controller.delay_var.get(),
+                dry_run=dry_run,
+                test_email=test_email,
+                resume=resume,
+                id_column=self.controller.id_column_var.get().strip() or None,
+                pdf_cache_mb=self.controller.pdf_cache_mb_var.get(),
+                native_pdf=self.controller.native_pdf_var.get(),
+                attachments=split_paths(self.controller.attachments_var.get()),
+                metrics=self.metrics,
+                converter_workers=self.controller.converter_workers_var.get(),
+                render_workers=self.controller.render_workers_var.get(),
+                send_workers=self.controller.send_workers_var.get(),
+                async_sends=self.controller.async_sends_var.get(),
+                rate_limiter=RateLimiter.from_delay(
+                    self.controller.delay_var.get(),
+                    burst=self.controller.burst_var.get(),
+                    domain_per_minute=self.controller.domain_limit_var.get()
+                ),
+                transport=transport
+            )
+        except Exception as e:
+            self.append_log(f"❌ Error running the process: {e}")
+        finally:
+            transport.close()
+            self.append_log("🏁 Process completed.")
+            self.log_queue.put(lambda: self.set_buttons_state("normal"))
+
+    def refresh_metrics(self):
+        """Shows the running figures of the selected job, or else of the latest run, once a second."""
+        scheduler = self.controller.scheduler
+        selected = self.selected_job()
+        running = scheduler.running
+        if selected in scheduler.metrics:
+            metrics = scheduler.metrics[selected]
+        elif running:
+            metrics = scheduler.metrics.get(running[-1])
+        else:
+            metrics = self.metrics
+        if metrics is not None:
+            self.metrics_text.config(state="normal")
+            self.metrics_text.delete("1.0", tk.END)
+            self.metrics_text.insert(tk.END, "\n".join(metrics.summary_lines()))
+            self.metrics_text.config(state="disabled")
+        self.after(1000, self.refresh_metrics)
+
+    def jobs_changed(self):
+        """Marks the job list for redrawing. Safe to call from any thread."""
+        self.jobs_dirty = True
+
+    def refresh_jobs(self):
+        """Redraws the job list if a job changed, then reschedules itself."""
+        if self.jobs_dirty:
+            self.jobs_dirty = False
+            selected = self.selected_job()
+            self.jobs_tree.delete(*self.jobs_tree.get_children())
+            for job in self.controller.jobs.jobs():
+                status = job["state"].capitalize() + (f": {job['message']}" if job["message"] else "")
+                rows = f"{job['succeeded']} / {job['failed']} / {job['skipped']}"
+                mode = "Dry run" if job["dry_run"] else "Send"
+                self.jobs_tree.insert("", tk.END, iid=job["id"], text=job["name"],
+                                      values=(mode, job["priority"], status, rows))
+            if selected is not None and self.jobs_tree.exists(selected):
+                self.jobs_tree.selection_set(selected)
+        self.after(self.JOBS_INTERVAL_MS, self.refresh_jobs)
+
+    def selected_job(self):
+        """Returns the ID of the job selected in the job list, or None."""
+        selection = self.jobs_tree.selection()
+        return selection[0] if selection else None
+
+    def pause_job(self):
+        """Pauses the selected job; a running job stops before its next email."""
+        job_id = self.selected_job()
+        if job_id is not None:
+            self.controller.scheduler.pause(job_id)
+
+    def resume_job(self):
+        """Resumes the selected job, or queues a failed or cancelled one to continue."""
+        job_id = self.selected_job()
+        if job_id is not None:
+            self.controller.scheduler.slots = max(1, self.controller.concurrent_jobs_var.get())
+            self.controller.scheduler.resume(job_id)
+
+    def cancel_job(self):
+        """Cancels the selected job after confirmation."""
+        job_id = self.selected_job()
+        if job_id is None:
+            return
+        if messagebox.askyesno("Cancel Job", "Cancel this job? Emails that are being sent are finished; the rest can be sent later with Resume."):
+            self.controller.scheduler.cancel(job_id)
+
+    def move_job(self, offset):
+        """Moves the selected job up (-1) or down (+1) in the queue."""
+        job_id = self.selected_job()
+        if job_id is not None and self.controller.jobs.move(job_id, offset):
+            self.controller.scheduler.notify()
+
+    def remove_job(self):
+        """Removes the selected job from the list."""
+        job_id = self.selected_job()
+        if job_id is None:
+            return
+        if not self.controller.scheduler.remove(job_id):
+            messagebox.showerror("Job Running", "A running job can't be removed. Cancel it first.")
 
     def set_buttons_state(self, state):
         """Sets the state of the control buttons."""
         self.start_button.config(state=state)
         self.dry_run_button.config(state=state)
         self.test_email_button.config(state=state)
+        self.resume_button.config(state=state)
+        self.export_log_button.config(state=state)
+        self.bundle_button.config(state=state)
 
     def append_log(self, message):
-        """Appends a message to the log text widget."""
-        self.log_text.config(state="normal")
-        tag = "normal"
+        """Queues a message for the log. Safe to call from any thread."""
+        self.log_queue.put(message)
+
+    def log_tag(self, message):
+        """Returns the text tag a log message is shown with."""
         if "SUCCESS" in message:
-            tag = "success"
-        elif "FAILED" in message or "Error" in message:
-            tag = "error"
-        
-        self.log_text.insert(tk.END, message + "\n", tag)
-        self.log_text.tag_config("success", foreground="#2ecc71", font=("Courier New", 11, "bold"))
-        self.log_text.tag_config("error", foreground="#e74c3c", font=("Courier New", 11, "bold"))
+            return "success"
+        if "FAILED" in message or "Error" in message:
+            return "error"
+        return "normal"
+
+    def drain_log(self):
+        """Shows the queued log messages in one widget update, then reschedules itself."""
+        lines = []
+        try:
+            for _ in range(self.LOG_BATCH):
+                item = self.log_queue.get_nowait()
+                if callable(item):
+                    self.show_log_lines(lines)
+                    lines = []
+                    item()
+                else:
+                    lines.append(item)
+        except queue.Empty:
+            pass
+        self.show_log_lines(lines)
+        self.after(self.LOG_INTERVAL_MS, self.drain_log)
+
+    def show_log_lines(self, lines):
+        """Appends lines to the history file and the widget, trimming the widget."""
+        if not lines:
+            return
+        if self.history_file:
+            try:
+                with open(self.history_file, "a", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+            except OSError:
+                self.history_file = None
+        lines = lines[-self.MAX_LOG_LINES:]
+        self.log_text.config(state="normal")
+        # Consecutive lines with the same tag go in with one insert call.
+        args = []
+        for line in lines:
+            tag = self.log_tag(line)
+            if args and args[-1] == tag:
+                args[-2] += line + "\n"
+            else:
+                args += [line + "\n", tag]
+        self.log_text.insert(tk.END, *args)
+        excess = int(self.log_text.index("end-1c").split(".")[0]) - 1 - self.MAX_LOG_LINES
+        if excess > 0:
+            self.log_text.delete("1.0", f"{excess + 1}.0")
         self.log_text.see(tk.END)
         self.log_text.config(state="disabled")
 
 if __name__ == "__main__":
-    app = DocuMint()
+    # Render workers are separate processes; needed for the frozen executable.
+    multiprocessing.freeze_support()
+    app = DocuMint(import_times="--import-times" in sys.argv[1:])
     app.mainloop()
@@ -0,0 +1,557 @@
+"""Queues campaigns and runs them one after another, or a few at a time.
+
+Every job holds a snapshot of the settings it was queued with, so changing
+the settings afterwards doesn't change a waiting campaign. The queue is kept
+in a JSON file and survives restarts. A job that was running when the
+application stopped comes back paused, and resuming it continues from its
+journal, so nobody gets an email twice.
+
+The `JobScheduler` starts queued jobs in order of priority, then queue
+order. It runs at most `slots` jobs at once. The render processes of all
+running jobs share one budget, normally one per CPU, and each job's
+`render_workers` is capped to that budget. Two jobs that write to the same
+PDF or logs folder never run at the same time, because they would share a
+journal.
+
+Usage:
+    python jobqueue.py add --config config.json [--name NAME] [--priority N] [--dry-run] [--render-workers N] ...
+    python jobqueue.py list
+    python jobqueue.py resume|cancel|remove JOB_ID
+    python jobqueue.py run [--slots N]
+
+The headless runner reads the SMTP password from the DOCUMINT_SMTP_PASSWORD
+environment variable, like cli.py.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from datetime import datetime
+
+JOBS_FILENAME = "documint_jobs.json"
+
+QUEUED = "queued"
+RUNNING = "running"
+PAUSED = "paused"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# States a job can still run from.
+WAITING = (QUEUED, PAUSED)
+
+# Resources a job may be limited to below the values in its snapshot.
+LIMIT_SETTINGS = ("render_workers", "converter_workers", "send_workers", "async_sends", "smtp_connections")
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+class RunControl:
+    """Lets another thread pause, resume or cancel a running campaign.
+
+    `core.process_emails` calls `wait` before starting each row.
+    """
+
+    def __init__(self):
+        self._running = threading.Event()
+        self._running.set()
+        self.cancelled = False
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def cancel(self):
+        self.cancelled = True
+        self._running.set()
+
+    def wait(self):
+        """Blocks while paused.
+
+        Returns:
+            bool: False if the run was cancelled and should stop.
+        """
+        self._running.wait()
+        return not self.cancelled
+
+class JobQueue:
+    """The campaigns waiting, running and finished, kept in a JSON file.
+
+    Jobs are dicts with these keys: `id`, `name`, `config` (the settings
+    snapshot), `limits`, `priority` (higher runs first), `dry_run`,
+    `resume`, `fresh`, `state`, `created`, `started`, `finished`, `succeeded`,
+    `failed`, `skipped` and `message`. The list order is the queue order
+    among jobs of equal priority. All methods are thread-safe.
+    """
+
+    def __init__(self, path=JOBS_FILENAME):
+        """Loads the queue file, if there is one.
+
+        Jobs that were running when the file was last written are paused
+        and marked to resume from their journal.
+        """
+        self.path = path
+        self._lock = threading.RLock()
+        self._jobs = []
+        self._next_id = 1
+        try:
+            with open(path, encoding="utf-8") as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            return
+        self._jobs = stored["jobs"]
+        self._next_id = stored["next_id"]
+        for job in self._jobs:
+            if job["state"] == RUNNING:
+                job.update(state=PAUSED, message="Interrupted; resume to continue")
+
+    def _save(self):
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({"next_id": self._next_id, "jobs": self._jobs}, f, indent=4)
+        os.replace(temporary, self.path)
+
+    def add(self, config, name=None, priority=0, dry_run=False, resume=False, limits=None, fresh=False):
+        """Queues a campaign.
+
+        Args:
+            config (dict): The settings, as saved by the GUI or read by
+                `cli.load_config`. Missing settings get the CLI defaults.
+            name (str, optional): Shown in the job list. Defaults to the data
+                file's name.
+            priority (int, optional): Jobs with a higher priority run first.
+            dry_run (bool, optional): Generate the PDFs but send no email.
+            resume (bool, optional): Continue the run recorded in the journal.
+            limits (dict, optional): Upper bounds for the settings in
+                `LIMIT_SETTINGS`, e.g. `{"render_workers": 1}`.
+            fresh (bool, optional): Start over even if the last run in the
+                logs folder didn't finish, archiving its journal.
+
+        Returns:
+            dict: A copy of the job.
+
+        Raises:
+            ValueError: If `limits` names another setting or a negative value.
+        """
+        from cli import DEFAULTS
+
+        limits = {name: int(limit) for name, limit in (limits or {}).items()}
+        unknown = sorted(set(limits) - set(LIMIT_SETTINGS))
+        if unknown:
+            raise ValueError(f"Jobs can't limit {', '.join(unknown)}")
+        if any(limit < 0 for limit in limits.values()):
+            raise ValueError("Job limits can't be negative")
+        with self._lock:
+            job = {
+                "id": str(self._next_id),
+                "name": name or os.path.basename(config.get("data_file", "")) or f"Job {self._next_id}",
+                "config": {**DEFAULTS, **config},
+                "limits": limits,
+                "priority": int(priority),
+                "dry_run": bool(dry_run),
+                "resume": bool(resume),
+                "fresh": bool(fresh),
+                "state": QUEUED,
+                "created": _now(),
+                "started": None,
+                "finished": None,
+                "succeeded": 0,
+                "failed": 0,
+                "skipped": 0,
+                "message": "",
+            }
+            self._next_id += 1
+            self._jobs.append(job)
+            self._save()
+            return dict(job)
+
+    def jobs(self):
+        """Returns copies of every job, in the order they would run."""
+        with self._lock:
+            return [dict(job) for job in sorted(self._jobs, key=lambda job: -job["priority"])]
+
+    def get(self, job_id):
+        """Returns a copy of a job, or None."""
+        with self._lock:
+            job = self._find(job_id)
+            return dict(job) if job is not None else None
+
+    def _find(self, job_id):
+        return next((job for job in self._jobs if job["id"] == job_id), None)
+
+    def update(self, job_id, save=True, **fields):
+        """Changes fields of a job.
+
+        Args:
+            job_id (str): The job.
+            save (bool, optional): Also write the queue file. Row counts
+                are only saved with the next state change, so a run doesn't
+                rewrite the file for every row.
+            **fields: The new values.
+        """
+        with self._lock:
+            job = self._find(job_id)
+            if job is not None:
+                job.update(fields)
+                if save:
+                    self._save()
+
+    def move(self, job_id, offset):
+        """Moves a job up (-1) or down (+1) past its neighbour in run order.
+
+        A job moved past a neighbour of another priority takes that
+        priority, so it really changes places.
+
+        Returns:
+            bool: False if the job is already first or last.
+        """
+        with self._lock:
+            job = self._find(job_id)
+            if job is None:
+                return False
+            ordered = sorted(self._jobs, key=lambda job: -job["priority"])
+            position = ordered.index(job) + offset
+            if not 0 <= position < len(ordered):
+                return False
+            neighbour = ordered[position]
+            job["priority"] = neighbour["priority"]
+            a, b = self._jobs.index(job), self._jobs.index(neighbour)
+            self._jobs[a], self._jobs[b] = self._jobs[b], self._jobs[a]
+            self._save()
+            return True
+
+    def remove(self, job_id):
+        """Deletes a job that isn't running.
+
+        Returns:
+            bool: False if the job is running or doesn't exist.
+        """
+        with self._lock:
+            job = self._find(job_id)
+            if job is None or job["state"] == RUNNING:
+                return False
+            self._jobs.remove(job)
+            self._save()
+            return True
+
+def job_settings(job, render_budget=None):
+    """Returns the settings a job runs with: its snapshot with its limits applied."""
+    config = dict(job["config"])
+    for name, limit in job["limits"].items():
+        config[name] = min(int(config[name]), int(limit))
+    if render_budget is not None:
+        config["render_workers"] = min(int(config["render_workers"]), render_budget)
+    return config
+
+def _render_cost(config):
+    """Render processes a job uses; a serial run renders on its own thread."""
+    return max(1, int(config["render_workers"]))
+
+def _folders(config):
+    return {os.path.normcase(os.path.abspath(config[name])) for name in ("pdf_folder", "logs_folder") if config.get(name)}
+
+class JobScheduler:
+    """Runs the jobs of a queue on a shared pool of job threads.
+
+    Attributes:
+        slots (int): The most jobs that run at once. May be changed while
+            the scheduler runs.
+        render_budget (int): Render processes shared by all running jobs.
+    """
+
+    def __init__(self, queue, log_callback, slots=1, render_budget=None, transport_factory=None, on_change=None):
+        """Configures the scheduler; call `start` to begin running jobs.
+
+        Args:
+            queue (JobQueue): The jobs.
+            log_callback (function): Receives every job's log messages,
+                prefixed with the job's name.
+            slots (int, optional): The most jobs that run at once.
+            render_budget (int, optional): Render processes shared by the
+                running jobs. Defaults to the number of CPUs.
+            transport_factory (callable, optional): `transport_factory(config)`
+                returning the transport of a job. Defaults to the transport
+                the job's settings describe, see `cli.create_transport_from_config`.
+                The scheduler closes it when the job ends.
+            on_change (callable, optional): Called from any thread whenever
+                a job's state or counts change.
+        """
+        self.queue = queue
+        self.log_callback = log_callback
+        self.slots = slots
+        self.render_budget = render_budget or os.cpu_count() or 2
+        self.transport_factory = transport_factory
+        self.on_change = on_change or (lambda: None)
+        self.metrics = {}
+        self._controls = {}
+        self._costs = {}
+        self._folders = {}
+        self._threads = []
+        self._wake = threading.Condition()
+        self._stopping = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._schedule, name="documint-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops starting jobs; running jobs carry on to the end."""
+        with self._wake:
+            self._stopping = True
+            self._wake.notify_all()
+
+    def join(self):
+        """Waits for the running jobs."""
+        for thread in list(self._threads):
+            thread.join()
+
+    def notify(self):
+        """Looks for a job to start, e.g. after one was added."""
+        with self._wake:
+            self._wake.notify_all()
+        self.on_change()
+
+    @property
+    def running(self):
+        """The IDs of the jobs running now."""
+        with self._wake:
+            return list(self._controls)
+
+    def idle(self):
+        """True if no job is running and none is queued."""
+        return not self.running and not any(job["state"] == QUEUED for job in self.queue.jobs())
+
+    def pause(self, job_id):
+        """Pauses a job.
+
+        A queued job is passed over until it is resumed. A running job
+        finishes the rows it has started, then waits, keeping its slot.
+        """
+        with self._wake:
+            control = self._controls.get(job_id)
+            if control is not None:
+                control.pause()
+        job = self.queue.get(job_id)
+        if job is not None and job["state"] in (QUEUED, RUNNING):
+            self.queue.update(job_id, state=PAUSED)
+        self.notify()
+
+    def resume(self, job_id):
+        """Resumes a paused job, or queues a finished one again to continue it."""
+        job = self.queue.get(job_id)
+        if job is None or job["state"] == RUNNING:
+            return
+        with self._wake:
+            control = self._controls.get(job_id)
+            if control is not None:
+                control.resume()
+                self.queue.update(job_id, state=RUNNING)
+            elif job["state"] in (PAUSED, FAILED, CANCELLED):
+                # A real run journaled the rows it got through; only the rest is done again.
+                resume = job["resume"] or (bool(job["started"]) and not job["dry_run"])
+                self.queue.update(job_id, state=QUEUED, resume=resume, message="")
+            self._wake.notify_all()
+        self.on_change()
+
+    def cancel(self, job_id):
+        """Cancels a job; a running one finishes the rows it has started."""
+        with self._wake:
+            control = self._controls.get(job_id)
+            if control is not None:
+                control.cancel()
+                return
+        job = self.queue.get(job_id)
+        if job is not None and job["state"] in WAITING:
+            self.queue.update(job_id, state=CANCELLED, finished=_now())
+        self.notify()
+
+    def remove(self, job_id):
+        """Deletes a job that isn't running, even paused part way.
+
+        Returns:
+            bool: False if the job is running or doesn't exist.
+        """
+        with self._wake:
+            if job_id in self._controls:
+                return False
+            removed = self.queue.remove(job_id)
+        self.on_change()
+        return removed
+
+    def _next_job(self):
+        """Returns the next job that may start now and its settings, or None.
+
+        Called with `_wake` held. Jobs run in priority order; if the first
+        waiting job needs more render processes than are free, later jobs
+        wait too, so a big job isn't overtaken forever.
+        """
+        if len(self._controls) >= self.slots:
+            return None
+        free = self.render_budget - sum(self._costs.values())
+        busy = set().union(*self._folders.values())
+        for job in self.queue.jobs():
+            if job["state"] != QUEUED:
+                continue
+            config = job_settings(job, self.render_budget)
+            if _folders(config) & busy:
+                continue
+            if _render_cost(config) > free:
+                return None
+            return job, config
+        return None
+
+    def _schedule(self):
+        with self._wake:
+            while not self._stopping:
+                found = self._next_job()
+                if found is None:
+                    self._wake.wait()
+                    continue
+                job, config = found
+                control = self._controls[job["id"]] = RunControl()
+                self._costs[job["id"]] = _render_cost(config)
+                self._folders[job["id"]] = _folders(config)
+                self.queue.update(job["id"], state=RUNNING, started=job["started"] or _now(), message="")
+                thread = threading.Thread(target=self._run, args=(job, config, control), name=f"documint-job-{job['id']}")
+                self._threads.append(thread)
+                thread.start()
+                self.on_change()
+
+    def _run(self, job, config, control):
+        from cli import TransportError, classify, run_config
+        from metrics import Metrics
+
+        job_id = job["id"]
+        counts = {"success": 0, "failed": 0, "skipped": 0, "error": 0, "warning": 0, "info": 0}
+        errors = []
+
+        def log(message):
+            kind = classify(message)
+            counts[kind] += 1
+            if kind == "error":
+                errors.append(message)
+            self.log_callback(f"[{job['name']}] {message}")
+            if kind in ("success", "failed", "skipped"):
+                self.queue.update(job_id, save=False, succeeded=counts["success"], failed=counts["failed"],
+                                  skipped=counts["skipped"])
+                self.on_change()
+
+        metrics = self.metrics[job_id] = Metrics()
+        log("🚀 Job started" + (" (dry run)" if job["dry_run"] else ""))
+        transport = None
+        try:
+            if self.transport_factory is not None and not job["dry_run"]:
+                try:
+                    transport = self.transport_factory(config)
+                except Exception as e:
+                    raise TransportError(str(e)) from e
+            run_config(config, log, dry_run=job["dry_run"], resume=job["resume"], transport=transport,
+                       metrics=metrics, control=control, fresh=job.get("fresh", False))
+        except TransportError as e:
+            log(f"❌ Error setting up the mail transport: {e}")
+        except Exception as e:
+            log(f"❌ Error running the job: {e}")
+        finally:
+            if transport is not None:
+                transport.close()
+            if control.cancelled:
+                state, message = CANCELLED, "Cancelled"
+            elif errors:
+                state, message = FAILED, errors[-1].lstrip("❌ ")
+            else:
+                state, message = DONE, ""
+            self.queue.update(job_id, state=state, message=message, finished=_now(),
+                              succeeded=counts["success"], failed=counts["failed"], skipped=counts["skipped"])
+            log(f"🏁 Job {state}")
+            with self._wake:
+                del self._controls[job_id]
+                del self._costs[job_id]
+                del self._folders[job_id]
+                self._threads.remove(threading.current_thread())
+                self._wake.notify_all()
+            self.on_change()
+
+def main(argv=None):
+    from cli import EXIT_ABORTED, EXIT_OK, EXIT_USAGE, ProgressReporter, load_config
+
+    parser = argparse.ArgumentParser(prog="python jobqueue.py", description="Queue campaigns and run them in order.")
+    parser.add_argument("--jobs", default=JOBS_FILENAME, help=f"Queue file (default: {JOBS_FILENAME}).")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="Queue a campaign with the settings of a config file.")
+    add.add_argument("--config", default="config.json", help="Config file saved by the GUI (default: config.json).")
+    add.add_argument("--name", help="Name shown in the job list.")
+    add.add_argument("--priority", type=int, default=0, help="Higher priorities run first (default: 0).")
+    add.add_argument("--dry-run", action="store_true", help="Generate the PDFs but send no email.")
+    add.add_argument("--fresh", action="store_true",
+                     help="Start over even if the last run didn't finish; its journal is archived.")
+    for name in LIMIT_SETTINGS:
+        add.add_argument(f"--{name.replace('_', '-')}", dest=name, type=int, metavar="N",
+                         help=f"Limit '{name}' for this job.")
+    commands.add_parser("list", help="Show the queued, running and finished jobs.")
+    for command, description in (("resume", "Queue a paused, failed or cancelled job again."),
+                                 ("cancel", "Cancel a job that hasn't started."),
+                                 ("remove", "Delete a job that isn't running.")):
+        commands.add_parser(command, help=description).add_argument("job_id", help="The job's ID, see 'list'.")
+    runner = commands.add_parser("run", help="Run the queued jobs, then exit.")
+    runner.add_argument("--slots", type=int, default=1, help="Jobs run at the same time (default: 1).")
+    runner.add_argument("--json", action="store_true", help="Print progress as one JSON object per line.")
+    args = parser.parse_args(argv)
+
+    # Log messages contain emoji, which a redirected stdout on Windows can't encode.
+    if hasattr(sys.stdout, "reconfigure"):
+        sys.stdout.reconfigure(errors="backslashreplace")
+    queue = JobQueue(args.jobs)
+    if args.command == "add":
+        try:
+            config = load_config(args.config)
+        except (OSError, ValueError) as e:
+            print(f"documint: cannot read config '{args.config}': {e}", file=sys.stderr)
+            return EXIT_USAGE
+        limits = {name: getattr(args, name) for name in LIMIT_SETTINGS if getattr(args, name) is not None}
+        job = queue.add(config, args.name, args.priority, args.dry_run, limits=limits, fresh=args.fresh)
+        print(f"Queued job {job['id']}: {job['name']}")
+        return EXIT_OK
+    if args.command == "list":
+        for job in queue.jobs():
+            print(f"{job['id']:>4}  {job['state']:<9}  priority {job['priority']:<3}  {job['name']}  "
+                  f"({job['succeeded']} sent, {job['failed']} failed, {job['skipped']} skipped) {job['message']}")
+        return EXIT_OK
+    if args.command in ("resume", "cancel", "remove"):
+        if queue.get(args.job_id) is None:
+            print(f"documint: no job {args.job_id}", file=sys.stderr)
+            return EXIT_USAGE
+        # Nothing runs here, so these only change the queue file.
+        if getattr(JobScheduler(queue, print), args.command)(args.job_id) is False:
+            print(f"documint: job {args.job_id} is running", file=sys.stderr)
+            return EXIT_USAGE
+        return EXIT_OK
+
+    reporter = ProgressReporter(as_json=args.json)
+    done = threading.Event()
+
+    def changed():
+        if scheduler.idle():
+            done.set()
+
+    scheduler = JobScheduler(queue, reporter, slots=args.slots, on_change=changed)
+    scheduler.start()
+    changed()
+    done.wait()
+    scheduler.stop()
+    scheduler.join()
+    return EXIT_ABORTED if any(job["state"] == FAILED for job in queue.jobs()) else EXIT_OK
+
+if __name__ == "__main__":
+    # Render workers are separate processes; needed for the frozen executable.
+    import multiprocessing
+
+    multiprocessing.freeze_support()
+    sys.exit(main())
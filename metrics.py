@@ -0,0 +1,169 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds of the histogram buckets in seconds: 1 ms to about 15
+# minutes, four buckets per doubling.
+BUCKETS = tuple(0.001 * 2 ** (i / 4) for i in range(80))
+
+# The stages of a row, in the order they happen.
+STAGES = ("fill", "save", "native_pdf", "convert", "rate_limit", "send")
+
+class Histogram:
+    """A latency histogram with fixed buckets, so memory stays constant."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """Estimates a quantile by interpolating within its bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = BUCKETS[i - 1] if i else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+class Metrics:
+    """Collects per-stage timings and row throughput for one run.
+
+    All methods are thread-safe, so the pipeline's stages can record into
+    one instance while the GUI reads `snapshot` from another thread.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self.started = clock()
+        self.rows_done = 0
+        self.total_rows = None
+
+    def record(self, stage, seconds):
+        """Adds one timing of a stage."""
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def time(self, stage):
+        """Times the body of a `with` statement as one run of `stage`."""
+        start = self._clock()
+        try:
+            yield
+        finally:
+            self.record(stage, self._clock() - start)
+
+    def row_done(self):
+        """Counts one row that reached its final outcome."""
+        with self._lock:
+            self.rows_done += 1
+
+    def snapshot(self):
+        """Returns the current figures as a JSON-friendly dict."""
+        with self._lock:
+            elapsed = max(self._clock() - self.started, 1e-9)
+            rate = self.rows_done / elapsed
+            eta = None
+            if self.total_rows is not None and rate > 0:
+                eta = max(self.total_rows - self.rows_done, 0) / rate
+            stages = {}
+            for stage in sorted(self._histograms, key=lambda s: (STAGES + (s,)).index(s)):
+                histogram = self._histograms[stage]
+                stages[stage] = {
+                    "count": histogram.count,
+                    "mean": histogram.total / histogram.count,
+                    "p50": histogram.quantile(0.50),
+                    "p95": histogram.quantile(0.95),
+                    "p99": histogram.quantile(0.99),
+                    "max": histogram.max,
+                }
+            return {
+                "elapsed_seconds": elapsed,
+                "rows_done": self.rows_done,
+                "total_rows": self.total_rows,
+                "rows_per_minute": rate * 60,
+                "eta_seconds": eta,
+                "stages": stages,
+            }
+
+    def summary_lines(self):
+        """Returns the snapshot as human-readable lines."""
+        snapshot = self.snapshot()
+        progress = f"{snapshot['rows_done']}"
+        if snapshot["total_rows"] is not None:
+            progress += f"/{snapshot['total_rows']}"
+        line = f"Rows: {progress} at {snapshot['rows_per_minute']:.1f}/min"
+        if snapshot["eta_seconds"] is not None:
+            line += f", ETA {format_duration(snapshot['eta_seconds'])}"
+        lines = [line]
+        for stage, figures in snapshot["stages"].items():
+            lines.append(f"{stage}: p50 {figures['p50'] * 1000:.1f} ms, p95 {figures['p95'] * 1000:.1f} ms, "
+                         f"p99 {figures['p99'] * 1000:.1f} ms ({figures['count']} runs)")
+        return lines
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=4)
+
+    def to_prometheus(self):
+        """Returns the figures in the Prometheus text exposition format."""
+        with self._lock:
+            histograms = {stage: (list(h.counts), h.count, h.total) for stage, h in self._histograms.items()}
+        snapshot = self.snapshot()
+        lines = [
+            "# HELP documint_stage_seconds Time one row spent in each stage.",
+            "# TYPE documint_stage_seconds histogram",
+        ]
+        for stage, (counts, count, total) in histograms.items():
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, counts):
+                cumulative += bucket_count
+                lines.append(f'documint_stage_seconds_bucket{{stage="{stage}",le="{bound:.6g}"}} {cumulative}')
+            lines.append(f'documint_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'documint_stage_seconds_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'documint_stage_seconds_count{{stage="{stage}"}} {count}')
+        lines += [
+            "# HELP documint_rows_done_total Rows that reached their final outcome.",
+            "# TYPE documint_rows_done_total counter",
+            f"documint_rows_done_total {snapshot['rows_done']}",
+            "# HELP documint_rows_per_minute Average throughput of the run.",
+            "# TYPE documint_rows_per_minute gauge",
+            f"documint_rows_per_minute {snapshot['rows_per_minute']:.3f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def export(self, json_path=None, prometheus_path=None):
+        """Writes the figures to a JSON file and/or a Prometheus text file."""
+        if json_path:
+            with open(json_path, "w", encoding="utf-8") as f:
+                f.write(self.to_json())
+        if prometheus_path:
+            with open(prometheus_path, "w", encoding="utf-8") as f:
+                f.write(self.to_prometheus())
+
+def format_duration(seconds):
+    """Formats seconds as e.g. "1h 02m" or "3m 15s"."""
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
@@ -0,0 +1,162 @@
+"""Builds raw MIME messages from parts that are encoded once per run.
+
+A campaign sends the same extra attachments (instructions, a logo, ...)
+and often the same HTML body to every recipient. `SharedAttachment` reads
+and base64-encodes such a file a single time and keeps the encoded MIME
+part in memory; `PayloadBuilder` then assembles every message from those
+ready-made bytes plus only its own PDF. Nothing is re-read or re-encoded
+per message except the row's own body and attachment.
+"""
+import base64
+import re
+import mimetypes
+import os
+import secrets
+from email.header import Header
+from email.utils import formataddr, formatdate, make_msgid, parseaddr
+from urllib.parse import quote
+
+# Base64 line length required by RFC 2045, in encoded characters.
+_LINE = 76
+
+# Line breaks in a header value would start new headers.
+_LINE_BREAKS = re.compile(r"[\r\n]+")
+
+_HTML_HEADERS = (b'Content-Type: text/html; charset="utf-8"\r\n'
+                 b"Content-Transfer-Encoding: base64\r\n\r\n")
+
+def split_paths(value):
+    """Returns a list of file paths from a list or a ";"-separated string."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(";")
+    return [path.strip() for path in value if path and path.strip()]
+
+def _base64_lines(data):
+    """Base64-encodes data in CRLF-terminated lines of 76 characters."""
+    encoded = base64.b64encode(data)
+    return b"".join(encoded[i:i + _LINE] + b"\r\n" for i in range(0, len(encoded), _LINE))
+
+def _filename_parameter(name, filename):
+    """Returns a MIME header parameter for a filename, RFC 2231-encoded if needed."""
+    if filename.isascii() and '"' not in filename and "\\" not in filename:
+        return f'{name}="{filename}"'
+    return f"{name}*=utf-8''{quote(filename, safe='')}"
+
+def attachment_part(data, filename, content_type=None):
+    """Encodes one attachment as a complete MIME part.
+
+    Args:
+        data (bytes): The file's content.
+        filename (str): The name shown to the recipient.
+        content_type (str, optional): Defaults to a guess from the filename.
+
+    Returns:
+        bytes: The part's headers and base64 body.
+    """
+    content_type = content_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    headers = (
+        f"Content-Type: {content_type}; {_filename_parameter('name', filename)}\r\n"
+        "Content-Transfer-Encoding: base64\r\n"
+        f"Content-Disposition: attachment; {_filename_parameter('filename', filename)}\r\n\r\n"
+    )
+    return headers.encode("ascii") + _base64_lines(data)
+
+def html_part(html_body):
+    """Encodes an HTML body as a MIME part."""
+    return _HTML_HEADERS + _base64_lines(html_body.encode("utf-8"))
+
+class SharedAttachment:
+    """A file attached to every message, read and encoded once per run."""
+
+    def __init__(self, path):
+        """Reads and encodes the file.
+
+        Args:
+            path (str): Path to the file.
+
+        Raises:
+            OSError: If the file can't be read.
+        """
+        self.path = os.path.abspath(path)
+        self.filename = os.path.basename(path)
+        with open(self.path, "rb") as f:
+            data = f.read()
+        self.size = len(data)
+        self.part = attachment_part(data, self.filename)
+
+class PayloadBuilder:
+    """Assembles the raw bytes of messages from pre-encoded parts.
+
+    The multipart boundary is chosen once per builder. It contains "-",
+    which never occurs in base64, so no encoded part can contain it.
+    Builders hold no per-message state and may be used from several
+    threads at once.
+    """
+
+    def __init__(self, sender):
+        """Configures the builder.
+
+        Args:
+            sender (str): The From address.
+
+        Raises:
+            ValueError: If the address contains a line break.
+        """
+        self.sender = sender
+        self._from = self._header("From", sender or "")
+        self.boundary = f"documint-{secrets.token_hex(16)}".encode("ascii")
+        address = parseaddr(sender)[1] if sender else ""
+        self._msgid_domain = address.rpartition("@")[2] or None
+
+    def _header(self, name, value):
+        """Encodes one header line.
+
+        Line breaks in the subject, e.g. from a multi-line data cell, become
+        a space; in an address they are an error.
+
+        Raises:
+            ValueError: If a From or To address contains a line break.
+        """
+        if name in ("From", "To"):
+            if _LINE_BREAKS.search(value):
+                raise ValueError(f"The {name} address {value!r} contains a line break.")
+            # Only the display name may be encoded, never the address.
+            value = formataddr(parseaddr(value), charset="utf-8") if value else ""
+        else:
+            value = _LINE_BREAKS.sub(" ", value)
+        if value.isascii():
+            return f"{name}: {value}\r\n".encode("ascii")
+        encoded = Header(value, "utf-8", header_name=name).encode(linesep="\r\n")
+        return f"{name}: {encoded}\r\n".encode("ascii")
+
+    def build(self, message):
+        """Returns the raw MIME bytes of an `OutgoingMessage`.
+
+        The body and per-row attachments are encoded here; the message's
+        `shared` attachments come from their cached encodings.
+
+        Raises:
+            ValueError: If the recipient address contains a line break.
+        """
+        boundary = self.boundary
+        delimiter = b"--" + boundary + b"\r\n"
+        chunks = [
+            self._from,
+            self._header("To", message.to),
+            self._header("Subject", message.subject),
+            b"Date: %s\r\n" % formatdate(localtime=True).encode("ascii"),
+            b"Message-ID: %s\r\n" % make_msgid(domain=self._msgid_domain).encode("ascii"),
+            b"MIME-Version: 1.0\r\n",
+            b'Content-Type: multipart/mixed; boundary="%s"\r\n\r\n' % boundary,
+            delimiter,
+            html_part(message.html_body),
+        ]
+        for path in message.attachments:
+            with open(path, "rb") as f:
+                chunks += [delimiter, attachment_part(f.read(), os.path.basename(path))]
+        for shared in message.shared:
+            chunks += [delimiter, shared.part]
+        chunks.append(b"--" + boundary + b"--\r\n")
+        return b"".join(chunks)
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+def file_digest(path):
+    """Returns the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _place(source, target):
+    """Makes `target` a copy of `source`, hard-linking when possible."""
+    if os.path.exists(target) and os.path.samefile(source, target):
+        return
+    temporary = f"{target}.{threading.get_ident()}.tmp"
+    try:
+        os.link(source, temporary)
+    except OSError:
+        shutil.copyfile(source, temporary)
+    os.replace(temporary, target)
+
+class PdfCache:
+    """A content-addressed store of converted PDFs.
+
+    A PDF is filed under a hash of everything that determines its contents:
+    the template file, the values substituted into it and the converter
+    version. A rerun whose rows hash the same reuses the stored PDFs instead
+    of rendering and converting them again. Entries are hard links where the
+    file system allows, so they take no extra space while the PDF in the
+    output folder exists. When the cache grows past `max_bytes`, the least
+    recently used entries are removed. Safe to use from several threads.
+    """
+
+    def __init__(self, folder, max_bytes, template_digest, converter_version):
+        """Opens the cache, creating its folder if needed.
+
+        Args:
+            folder (str): Where the cached PDFs are kept.
+            max_bytes (int): Size above which old entries are evicted.
+            template_digest (str): See `file_digest`.
+            converter_version (str): The converter's `version`.
+        """
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._prefix = f"{template_digest}\0{converter_version}\0"
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(folder, exist_ok=True)
+        # Entry name -> size, least recently used first. Last use is kept in
+        # the file's modification time between runs.
+        entries = []
+        for entry in os.scandir(folder):
+            if entry.name.endswith(".pdf"):
+                info = entry.stat()
+                entries.append((info.st_mtime, entry.name, info.st_size))
+        self._sizes = OrderedDict((name, size) for _, name, size in sorted(entries))
+        self.size = sum(self._sizes.values())
+
+    def key(self, values):
+        """Returns the cache key for a row's substituted values.
+
+        Args:
+            values (dict): Maps each placeholder the template uses to its
+                value for this row.
+        """
+        payload = self._prefix + json.dumps(sorted(values.items()), ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.folder, f"{key}.pdf")
+
+    def fetch(self, key, pdf_path):
+        """Places the cached PDF for `key` at `pdf_path`.
+
+        Returns:
+            bool: True on a hit, False if the PDF has to be made.
+        """
+        path = self._path(key)
+        try:
+            os.utime(path)
+            _place(path, pdf_path)
+        except OSError:
+            # A PDF left from an earlier run may be a hard link to another
+            # entry; remove it so the converter can't overwrite that entry.
+            try:
+                if os.stat(pdf_path).st_nlink > 1:
+                    os.remove(pdf_path)
+            except OSError:
+                pass
+            with self._lock:
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+            if key + ".pdf" in self._sizes:
+                self._sizes.move_to_end(key + ".pdf")
+        return True
+
+    def store(self, key, pdf_path):
+        """Adds a freshly converted PDF to the cache, evicting if needed."""
+        name = f"{key}.pdf"
+        _place(pdf_path, self._path(key))
+        size = os.path.getsize(pdf_path)
+        with self._lock:
+            self.size += size - self._sizes.pop(name, 0)
+            self._sizes[name] = size
+            while self.size > self.max_bytes and len(self._sizes) > 1:
+                evicted, evicted_size = self._sizes.popitem(last=False)
+                try:
+                    os.remove(os.path.join(self.folder, evicted))
+                except OSError:
+                    pass
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def stats(self):
+        """Returns a one-line summary of this run's cache use."""
+        total = self.hits + self.misses
+        rate = f"{100 * self.hits / total:.0f}%" if total else "n/a"
+        return (f"PDF cache: {self.hits} hits, {self.misses} misses (hit rate {rate}), "
+                f"{self.evictions} evicted, {self.size / (1 << 20):.1f} MB in {len(self._sizes)} files.")
@@ -0,0 +1,1001 @@
+"""Renders filled templates straight to PDF, without an office suite.
+
+The renderer lays out the paragraphs, tables, headers and footers of a
+rendered `CompiledTemplate` document in-process and writes the PDF with the
+standard Helvetica fonts, so no .docx is saved and Word or LibreOffice is
+never started. It understands the formatting simple templates use: bold,
+italic, underline, strikethrough, font sizes and colors, paragraph
+alignment, spacing and indents, bulleted and numbered lists, page breaks,
+and tables with borders and shading.
+
+Anything else (images, text boxes, fields, merged cells, ...) makes the
+template unsupported; `NativePdfRenderer.unsupported` names what was
+found so the caller can convert with the office suite instead. A row
+whose values contain characters the built-in fonts can't show raises
+`UnsupportedDocument` and should be converted the same way.
+"""
+import io
+import re
+import unicodedata
+import zlib
+from collections import namedtuple
+from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_UNDERLINE
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.ns import qn
+from docx.shared import Length
+from docx.text.paragraph import Paragraph
+from docx.text.run import Run
+from template import text_parts
+
+# Part of the PDF cache key, so cached PDFs are redone when the layout changes.
+RENDERER_VERSION = "native-1"
+
+class UnsupportedDocument(Exception):
+    """Raised when a document needs features the native renderer lacks."""
+
+# Advance widths of ASCII 32-126 in 1/1000 em, from the Adobe font metrics.
+_HELVETICA = (
+    "278 278 355 556 556 889 667 191 333 333 389 584 278 333 278 278 "
+    "556 556 556 556 556 556 556 556 556 556 278 278 584 584 584 556 "
+    "1015 667 667 722 722 667 611 778 722 278 500 667 556 833 722 778 "
+    "667 778 722 667 611 722 667 944 667 667 611 278 278 278 469 556 "
+    "333 556 556 500 556 556 278 556 556 222 222 500 222 833 556 556 "
+    "556 556 333 500 278 556 500 722 500 500 500 334 260 334 584"
+)
+_HELVETICA_BOLD = (
+    "278 333 474 556 556 889 722 238 333 333 389 584 278 333 278 278 "
+    "556 556 556 556 556 556 556 556 556 556 333 333 584 584 584 611 "
+    "975 722 722 722 722 667 611 778 722 278 556 722 611 833 722 778 "
+    "667 778 722 667 611 722 667 944 667 667 611 333 278 333 584 556 "
+    "333 556 611 556 611 556 333 611 611 278 278 556 278 889 611 611 "
+    "611 611 389 556 333 611 556 778 556 556 500 389 280 389 584"
+)
+# Widths of the Windows-1252 punctuation that has no ASCII base letter.
+_EXTRA_WIDTHS = {
+    "\u2022": (350, 350), "\u2013": (556, 556), "\u2014": (1000, 1000),
+    "\u2018": (222, 278), "\u2019": (222, 278), "\u201a": (222, 278),
+    "\u201c": (333, 500), "\u201d": (333, 500), "\u201e": (333, 500),
+    "\u2026": (1000, 1000), "\u20ac": (556, 556), "\xa0": (278, 278),
+    "\xb0": (400, 400), "\xa9": (737, 737), "\xae": (737, 737),
+}
+
+def _width_table(widths, bold):
+    table = {chr(32 + i): int(width) for i, width in enumerate(widths.split())}
+    table.update((char, pair[bold]) for char, pair in _EXTRA_WIDTHS.items())
+    return table
+
+_WIDTHS = (_width_table(_HELVETICA, 0), _width_table(_HELVETICA_BOLD, 1))
+
+# PDF resource name and base font of each (bold, italic) combination.
+_FONTS = {
+    (False, False): (b"F1", b"Helvetica"),
+    (True, False): (b"F2", b"Helvetica-Bold"),
+    (False, True): (b"F3", b"Helvetica-Oblique"),
+    (True, True): (b"F4", b"Helvetica-BoldOblique"),
+}
+
+def _char_width(char, bold):
+    """Returns the width of a character, approximating accented letters."""
+    table = _WIDTHS[bold]
+    base = unicodedata.normalize("NFKD", char)[:1]
+    width = table[char] = table.get(base, 556)
+    return width
+
+def text_width(text, bold, size):
+    """Returns the width of `text` in points, set in Helvetica at `size`."""
+    table = _WIDTHS[bold]
+    return sum(table.get(char) or _char_width(char, bold) for char in text) * size / 1000
+
+# Elements whose presence makes a template unsupported, with the reason shown.
+_UNSUPPORTED_TAGS = {
+    qn("w:drawing"): "images or shapes",
+    qn("w:pict"): "images or shapes",
+    qn("w:object"): "embedded objects",
+    qn("w:txbxContent"): "text boxes",
+    qn("w:fldChar"): "fields",
+    qn("w:fldSimple"): "fields",
+    qn("w:footnoteReference"): "footnotes",
+    qn("w:endnoteReference"): "endnotes",
+    qn("w:gridSpan"): "merged table cells",
+    qn("w:vMerge"): "merged table cells",
+    qn("w:hMerge"): "merged table cells",
+    qn("w:tcBorders"): "cell borders",
+    qn("w:pBdr"): "paragraph borders",
+    qn("w:highlight"): "highlighted text",
+    qn("w:vertAlign"): "superscript or subscript",
+    qn("w:caps"): "capitals formatting",
+    qn("w:smallCaps"): "capitals formatting",
+    qn("w:vanish"): "hidden text",
+    qn("w:dstrike"): "double strikethrough",
+    qn("w:sym"): "symbol characters",
+    qn("w:ruby"): "phonetic guides",
+    qn("w:rtl"): "right-to-left text",
+    qn("w:bidi"): "right-to-left text",
+    qn("w:textDirection"): "vertical text",
+    qn("w:framePr"): "frames",
+    qn("w:titlePg"): "a different first-page header",
+    "{http://schemas.openxmlformats.org/markup-compatibility/2006}AlternateContent": "compatibility content",
+}
+
+_W_P = qn("w:p")
+_W_TBL = qn("w:tbl")
+_W_TC = qn("w:tc")
+_W_R = qn("w:r")
+_W_T = qn("w:t")
+_W_TAB = qn("w:tab")
+_W_BR = qn("w:br")
+_W_CR = qn("w:cr")
+_W_SDT = qn("w:sdt")
+_W_SDT_CONTENT = qn("w:sdtContent")
+_W_SHD = qn("w:shd")
+_W_TCPR = qn("w:tcPr")
+_W_VAL = qn("w:val")
+_W_TYPE = qn("w:type")
+_W_NO_BREAK_HYPHEN = qn("w:noBreakHyphen")
+# Wrappers whose runs are laid out like the paragraph's own.
+_RUN_CONTAINERS = {qn("w:hyperlink"), qn("w:ins"), qn("w:smartTag"), qn("w:customXml"), qn("w:moveTo")}
+
+def find_unsupported(document):
+    """Lists the features of a document the native renderer can't lay out.
+
+    Args:
+        document (docx.Document): The document to check.
+
+    Returns:
+        list: Short descriptions of the unsupported features; empty if the
+            document can be rendered natively.
+    """
+    reasons = set()
+    for part in text_parts(document):
+        for element in part.element.iter():
+            tag = element.tag
+            if tag in _UNSUPPORTED_TAGS:
+                reasons.add(_UNSUPPORTED_TAGS[tag])
+            elif tag == _W_TBL and any(ancestor.tag == _W_TC for ancestor in element.iterancestors()):
+                reasons.add("nested tables")
+            elif tag == _W_SHD and element.getparent().tag != _W_TCPR:
+                reasons.add("shaded text")
+            elif tag == qn("w:cols") and int(element.get(qn("w:num")) or 1) > 1:
+                reasons.add("multiple columns")
+    if len(document.sections) > 1:
+        reasons.add("several sections")
+    if document.settings.element.find(qn("w:evenAndOddHeaders")) is not None:
+        reasons.add("different odd and even headers")
+    return sorted(reasons)
+
+def _pt(length, default=None):
+    return default if length is None else length.pt
+
+def _twips(element, attribute):
+    """Reads a twentieths-of-a-point attribute as points, or None."""
+    value = None if element is None else element.get(qn(attribute))
+    return None if value is None else int(value) / 20
+
+def _inherited(style, getter):
+    """Returns the first value `getter` finds along a style's base styles."""
+    while style is not None:
+        value = getter(style)
+        if value is not None:
+            return value
+        style = style.base_style
+    return None
+
+# The character formatting of a piece of text.
+Font = namedtuple("Font", "bold italic underline strike size color")
+
+# A paragraph's resolved formatting. `font` is its default run formatting;
+# `numbering` is the style's `(numId, ilvl)`, if any.
+ParagraphFormat = namedtuple(
+    "ParagraphFormat",
+    "align before after line left right first page_break_before font numbering",
+)
+
+_FONT_GETTERS = {
+    "bold": lambda style: style.font.bold,
+    "italic": lambda style: style.font.italic,
+    "underline": lambda style: style.font.underline,
+    "strike": lambda style: style.font.strike,
+    "size": lambda style: style.font.size,
+    "color": lambda style: style.font.color.rgb,
+}
+_FORMAT_FIELDS = ("alignment", "space_before", "space_after", "line_spacing",
+                  "left_indent", "right_indent", "first_line_indent", "page_break_before")
+
+def _underlined(value):
+    return value not in (None, False, WD_UNDERLINE.NONE)
+
+def _rgb(color):
+    return (0.0, 0.0, 0.0) if color is None else (color[0] / 255, color[1] / 255, color[2] / 255)
+
+def _numbering_of(p_pr):
+    """Returns the `(numId, ilvl)` of a paragraph or style `w:pPr`, or None."""
+    num_pr = None if p_pr is None else p_pr.find(qn("w:numPr"))
+    if num_pr is None:
+        return None
+    num_id = num_pr.find(qn("w:numId"))
+    ilvl = num_pr.find(qn("w:ilvl"))
+    return (None if num_id is None else num_id.get(_W_VAL),
+            0 if ilvl is None else int(ilvl.get(_W_VAL)))
+
+class _Styles:
+    """Resolves the effective formatting of paragraphs and runs.
+
+    Style lookups are cached by style id, since every row of a run uses the
+    template's styles part unchanged.
+    """
+
+    def __init__(self, document):
+        self.document = document
+        styles = document.styles.element
+        defaults = styles.find(qn("w:docDefaults"))
+        r_pr = defaults.find(f"{qn('w:rPrDefault')}/{qn('w:rPr')}") if defaults is not None else None
+        size = r_pr.find(qn("w:sz")) if r_pr is not None else None
+        self.default_size = int(size.get(_W_VAL)) / 2 if size is not None else 10.0
+        spacing = defaults.find(f"{qn('w:pPrDefault')}/{qn('w:pPr')}/{qn('w:spacing')}") if defaults is not None else None
+        self.default_after = _twips(spacing, "w:after") or 0.0
+        line = None if spacing is None else spacing.get(qn("w:line"))
+        self.default_line = int(line) / 240 if line and spacing.get(qn("w:lineRule"), "auto") == "auto" else 1.0
+        self._paragraphs = {}
+        self._characters = {}
+        self._levels = {}
+        try:
+            self._numbering = document.part.part_related_by(RT.NUMBERING).element
+        except KeyError:
+            self._numbering = None
+
+    def _style(self, style_id, kind):
+        try:
+            return self.document.styles.get_by_id(style_id, kind)
+        except Exception:
+            return None
+
+    def paragraph(self, paragraph):
+        """Returns the `ParagraphFormat` of a paragraph."""
+        p = paragraph._p
+        style_id = p.style
+        base = self._paragraphs.get(style_id)
+        if base is None:
+            base = self._paragraphs[style_id] = self._paragraph_style(style_id)
+        if p.pPr is None:
+            return base
+        direct = paragraph.paragraph_format
+        values = [getattr(direct, name) for name in _FORMAT_FIELDS]
+        return base._replace(
+            align=values[0] if values[0] is not None else base.align,
+            before=_pt(values[1], base.before),
+            after=_pt(values[2], base.after),
+            line=values[3] if values[3] is not None else base.line,
+            left=_pt(values[4], base.left),
+            right=_pt(values[5], base.right),
+            first=_pt(values[6], base.first),
+            page_break_before=values[7] if values[7] is not None else base.page_break_before,
+            numbering=_numbering_of(p.pPr) or base.numbering,
+        )
+
+    def _paragraph_style(self, style_id):
+        from docx.enum.style import WD_STYLE_TYPE
+
+        style = self._style(style_id, WD_STYLE_TYPE.PARAGRAPH)
+        values = {name: _inherited(style, lambda s, name=name: getattr(s.paragraph_format, name))
+                  for name in _FORMAT_FIELDS}
+        font = {name: _inherited(style, getter) for name, getter in _FONT_GETTERS.items()}
+        return ParagraphFormat(
+            align=values["alignment"],
+            before=_pt(values["space_before"], 0.0),
+            after=_pt(values["space_after"], self.default_after),
+            line=values["line_spacing"] if values["line_spacing"] is not None else self.default_line,
+            left=_pt(values["left_indent"], 0.0),
+            right=_pt(values["right_indent"], 0.0),
+            first=_pt(values["first_line_indent"], 0.0),
+            page_break_before=bool(values["page_break_before"]),
+            font=Font(
+                bold=bool(font["bold"]),
+                italic=bool(font["italic"]),
+                underline=_underlined(font["underline"]),
+                strike=bool(font["strike"]),
+                size=_pt(font["size"], self.default_size),
+                color=_rgb(font["color"]),
+            ),
+            numbering=_inherited(style, lambda s: _numbering_of(s.element.pPr)),
+        )
+
+    def run(self, run, paragraph_font):
+        """Returns the `Font` of a run inside a paragraph with `paragraph_font`."""
+        r = run._r
+        r_pr = r.rPr
+        if r_pr is None:
+            return paragraph_font
+        font = paragraph_font
+        style_id = r.style
+        if style_id is not None:
+            character = self._characters.get(style_id)
+            if character is None:
+                character = self._characters[style_id] = self._character_style(style_id)
+            font = font._replace(**{name: value for name, value in character.items() if value is not None})
+        direct = run.font
+        bold, italic, underline, strike, size = direct.bold, direct.italic, direct.underline, direct.strike, direct.size
+        color = direct.color.rgb if r_pr.color is not None else None
+        return font._replace(
+            bold=font.bold if bold is None else bold,
+            italic=font.italic if italic is None else italic,
+            underline=font.underline if underline is None else _underlined(underline),
+            strike=font.strike if strike is None else strike,
+            size=_pt(size, font.size),
+            color=font.color if color is None else _rgb(color),
+        )
+
+    def _character_style(self, style_id):
+        from docx.enum.style import WD_STYLE_TYPE
+
+        style = self._style(style_id, WD_STYLE_TYPE.CHARACTER)
+        values = {name: _inherited(style, getter) for name, getter in _FONT_GETTERS.items()}
+        return {
+            "bold": values["bold"],
+            "italic": values["italic"],
+            "underline": None if values["underline"] is None else _underlined(values["underline"]),
+            "strike": values["strike"],
+            "size": _pt(values["size"]),
+            "color": None if values["color"] is None else _rgb(values["color"]),
+        }
+
+    def level(self, num_id, ilvl):
+        """Returns `(format, text, left, hanging)` of a list level.
+
+        Raises:
+            UnsupportedDocument: If the list isn't bulleted or numbered 1, 2, 3.
+        """
+        key = (num_id, ilvl)
+        if key not in self._levels:
+            self._levels[key] = self._find_level(num_id, ilvl)
+        return self._levels[key]
+
+    def _find_level(self, num_id, ilvl):
+        numbering = self._numbering
+        lvl = None
+        if numbering is not None:
+            for num in numbering.findall(qn("w:num")):
+                if num.get(qn("w:numId")) != num_id:
+                    continue
+                abstract_id = num.find(qn("w:abstractNumId")).get(_W_VAL)
+                for abstract in numbering.findall(qn("w:abstractNum")):
+                    if abstract.get(qn("w:abstractNumId")) == abstract_id:
+                        lvl = next((l for l in abstract.findall(qn("w:lvl")) if l.get(qn("w:ilvl")) == str(ilvl)), None)
+        if lvl is None:
+            raise UnsupportedDocument("list numbering without a definition")
+        num_fmt = lvl.find(qn("w:numFmt"))
+        kind = "decimal" if num_fmt is None else num_fmt.get(_W_VAL)
+        if kind not in ("bullet", "decimal"):
+            raise UnsupportedDocument(f"'{kind}' list numbering")
+        text = lvl.find(qn("w:lvlText"))
+        ind = lvl.find(f"{qn('w:pPr')}/{qn('w:ind')}")
+        left = _twips(ind, "w:left") if ind is not None else None
+        if left is None and ind is not None:
+            left = _twips(ind, "w:start")
+        return (kind, "" if text is None else text.get(_W_VAL, ""),
+                36.0 * (ilvl + 1) if left is None else left,
+                (_twips(ind, "w:hanging") if ind is not None else None) or 18.0)
+
+# Markers between the text fragments of a paragraph.
+_LINE_BREAK = "line break"
+_PAGE_BREAK = "page break"
+_TOKEN = re.compile(r" +|[^ ]+")
+# Descent of Helvetica below the baseline, as a fraction of the font size.
+_DESCENT = 0.212
+# Padding inside table cells, in points.
+_CELL_PADDING = 5.4
+_CELL_VERTICAL_PADDING = 1.0
+
+class _Line:
+    """One laid-out line: `(x, text, font, word_spacing)` pieces."""
+
+    __slots__ = ("height", "descent", "pieces")
+
+    def __init__(self, height, descent, pieces):
+        self.height = height
+        self.descent = descent
+        self.pieces = pieces
+
+    def draw(self, ops, x, top):
+        baseline = top - self.height + self.descent
+        for offset, text, font, spacing in self.pieces:
+            _draw_text(ops, x + offset, baseline, text, font, spacing)
+
+class _Gap:
+    """Vertical space between paragraphs, dropped at the top of a page."""
+
+    __slots__ = ("height",)
+
+    def __init__(self, height):
+        self.height = height
+
+    def draw(self, ops, x, top):
+        pass
+
+class _Row:
+    """One table row: `(x, width, items, fill)` cells and their borders."""
+
+    __slots__ = ("height", "cells", "borders")
+
+    def __init__(self, height, cells, borders):
+        self.height = height
+        self.cells = cells
+        self.borders = borders
+
+    def draw(self, ops, x, top):
+        for offset, width, items, fill in self.cells:
+            if fill is not None:
+                ops.append(b"%.3f %.3f %.3f rg %.2f %.2f %.2f %.2f re f"
+                           % (*fill, x + offset, top - self.height, width, self.height))
+            y = top - _CELL_VERTICAL_PADDING
+            for item in items:
+                item.draw(ops, x + offset + _CELL_PADDING, y)
+                y -= item.height
+            if self.borders:
+                ops.append(b"0 0 0 RG 0.5 w %.2f %.2f %.2f %.2f re S"
+                           % (x + offset, top - self.height, width, self.height))
+
+def _escape(text):
+    """Encodes text for a PDF string in the fonts' WinAnsi encoding."""
+    try:
+        data = text.encode("cp1252")
+    except UnicodeEncodeError:
+        raise UnsupportedDocument("text the built-in PDF fonts can't show") from None
+    return data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)").replace(b"\r", b"\\r")
+
+def _draw_text(ops, x, y, text, font, spacing):
+    name = _FONTS[font.bold, font.italic][0]
+    color = b"%.3f %.3f %.3f" % font.color
+    ops.append(b"BT /%s %.2f Tf %s rg %.2f %.2f Td %.3f Tw (%s) Tj ET"
+               % (name, font.size, color, x, y, spacing, _escape(text)))
+    if font.underline or font.strike:
+        width = text_width(text, font.bold, font.size) + spacing * text.count(" ")
+        thickness = max(font.size / 20, 0.5)
+        for enabled, rise in ((font.underline, -font.size * 0.1), (font.strike, font.size * 0.3)):
+            if enabled:
+                ops.append(b"%s RG %.2f w %.2f %.2f m %.2f %.2f l S"
+                           % (color, thickness, x, y + rise, x + width, y + rise))
+
+class _Layout:
+    """Lays out one rendered document and collects the content of its pages."""
+
+    def __init__(self, styles, document):
+        self.styles = styles
+        self.document = document
+        section = document.sections[0]
+        self.page_width = _pt(section.page_width, 612.0)
+        self.page_height = _pt(section.page_height, 792.0)
+        self.left = _pt(section.left_margin, 72.0)
+        self.right = _pt(section.right_margin, 72.0)
+        self.top = _pt(section.top_margin, 72.0)
+        self.bottom = _pt(section.bottom_margin, 72.0)
+        self.content_width = self.page_width - self.left - self.right
+        self.counters = {}
+        self.chrome = []
+        if not section.header.is_linked_to_previous:
+            items = self.blocks(section.header._element, self.content_width, in_body=False)
+            self._draw_fixed(items, self.page_height - _pt(section.header_distance, 36.0))
+        if not section.footer.is_linked_to_previous:
+            items = self.blocks(section.footer._element, self.content_width, in_body=False)
+            height = sum(item.height for item in items)
+            self._draw_fixed(items, _pt(section.footer_distance, 36.0) + height)
+
+    def _draw_fixed(self, items, top):
+        for item in items:
+            item.draw(self.chrome, self.left, top)
+            top -= item.height
+
+    def render(self):
+        """Returns the content stream of every page."""
+        items = self.blocks(self.document.element.body, self.content_width, in_body=True)
+        usable = self.page_height - self.top - self.bottom
+        pages = []
+        ops = None
+        y = at_top = None
+
+        def new_page():
+            nonlocal ops, y, at_top
+            ops = list(self.chrome)
+            pages.append(ops)
+            y = self.page_height - self.top
+            at_top = True
+
+        new_page()
+        for item in items:
+            if item is _PAGE_BREAK:
+                new_page()
+                continue
+            if isinstance(item, _Gap):
+                if not at_top:
+                    y -= item.height
+                continue
+            if item.height > usable:
+                raise UnsupportedDocument("a table row taller than a page")
+            if y - item.height < self.bottom and not at_top:
+                new_page()
+            item.draw(ops, self.left, y)
+            y -= item.height
+            at_top = False
+        return [b"\n".join(page) for page in pages]
+
+    def blocks(self, container, width, in_body):
+        """Lays out the paragraphs and tables of a body, cell, header or footer."""
+        items = []
+        for child in container:
+            if child.tag == _W_P:
+                items.extend(self.paragraph(child, width, in_body))
+            elif child.tag == _W_TBL:
+                items.extend(self.table(child, width))
+            elif child.tag == _W_SDT:
+                content = child.find(_W_SDT_CONTENT)
+                if content is not None:
+                    items.extend(self.blocks(content, width, in_body))
+        return items
+
+    def _runs(self, element):
+        for child in element:
+            if child.tag == _W_R:
+                yield child
+            elif child.tag in _RUN_CONTAINERS:
+                yield from self._runs(child)
+            elif child.tag == _W_SDT:
+                content = child.find(_W_SDT_CONTENT)
+                if content is not None:
+                    yield from self._runs(content)
+
+    def _fragments(self, paragraph, fmt):
+        """Returns the paragraph's text as `(text, font)` pairs and break markers."""
+        fragments = []
+        for r in self._runs(paragraph._p):
+            font = self.styles.run(Run(r, paragraph), fmt.font)
+            for child in r:
+                tag = child.tag
+                if tag == _W_T:
+                    if child.text:
+                        fragments.append((child.text, font))
+                elif tag == _W_TAB:
+                    fragments.append(("    ", font))
+                elif tag == _W_BR:
+                    fragments.append(_PAGE_BREAK if child.get(_W_TYPE) == "page" else _LINE_BREAK)
+                elif tag == _W_CR:
+                    fragments.append(_LINE_BREAK)
+                elif tag == _W_NO_BREAK_HYPHEN:
+                    fragments.append(("-", font))
+        return fragments
+
+    def _list_prefix(self, fmt):
+        """Returns the bullet or number of a list paragraph and its indents."""
+        num_id, ilvl = fmt.numbering
+        if num_id in (None, "0"):
+            return None, fmt.left, fmt.first
+        kind, text, left, hanging = self.styles.level(num_id, ilvl)
+        levels = self.counters.setdefault(num_id, [0] * 9)
+        levels[ilvl] += 1
+        levels[ilvl + 1:] = [0] * (len(levels) - ilvl - 1)
+        if kind == "bullet":
+            prefix = "\u2022"
+        else:
+            prefix = re.sub(r"%(\d)", lambda m: str(max(levels[int(m.group(1)) - 1], 1)), text)
+        return prefix, fmt.left or left, fmt.first or -hanging
+
+    def paragraph(self, p, width, in_body):
+        """Lays out one paragraph as gaps, lines and page breaks."""
+        paragraph = Paragraph(p, self.document)
+        fmt = self.styles.paragraph(paragraph)
+        fragments = self._fragments(paragraph, fmt)
+        prefix = None
+        left, first = fmt.left, fmt.first
+        if fmt.numbering is not None:
+            prefix, left, first = self._list_prefix(fmt)
+
+        items = []
+        if in_body and fmt.page_break_before:
+            items.append(_PAGE_BREAK)
+        if fmt.before:
+            items.append(_Gap(fmt.before))
+        available = width - left - fmt.right
+        first_indent = first
+        hanging_prefix = None
+        if prefix is not None:
+            font = next((f for f in fragments if isinstance(f, tuple)), ("", fmt.font))[1]
+            if first < 0 and text_width(prefix + " ", font.bold, font.size) <= -first:
+                hanging_prefix = (first, prefix, font, 0.0)
+                first_indent = 0.0
+            else:
+                fragments.insert(0, (prefix + " ", font))
+
+        first_line = True
+        for pieces, forced in self._wrap(fragments, available, first_indent):
+            if pieces is _PAGE_BREAK:
+                if in_body:
+                    items.append(_PAGE_BREAK)
+                continue
+            indent = left + (first_indent if first_line else 0.0)
+            if first_line and hanging_prefix is not None:
+                pieces = [hanging_prefix] + pieces
+            items.append(self._line(pieces, indent, available - (indent - left), fmt, forced))
+            first_line = False
+        if fmt.after:
+            items.append(_Gap(fmt.after))
+        return items
+
+    def _wrap(self, fragments, available, first_indent):
+        """Breaks fragments into lines.
+
+        Returns:
+            list: `(pieces, forced)` per line, where pieces are
+                `(x, text, font, width)` with x relative to the line start and
+                `forced` tells if the line ended at a break or the paragraph
+                end; page breaks appear as `(_PAGE_BREAK, True)`.
+        """
+        # Words are lists of (text, font, width) pieces, so a word whose
+        # formatting changes mid-way is never broken at the change.
+        words = []
+        for fragment in fragments:
+            if not isinstance(fragment, tuple):
+                words.append(fragment)
+                continue
+            text, font = fragment
+            for token in _TOKEN.findall(text):
+                piece = (token, font, text_width(token, font.bold, font.size))
+                space = token[0] == " "
+                last = words[-1] if words and isinstance(words[-1], list) else None
+                if last is not None and last[0] == space:
+                    last[1].append(piece)
+                    last[2] += piece[2]
+                else:
+                    words.append([space, [piece], piece[2]])
+
+        lines = []
+        current = []
+        used = 0.0
+        limit = available - first_indent
+
+        def finish(forced):
+            nonlocal current, used, limit
+            while current and current[-1][0]:
+                used -= current.pop()[2]
+            pieces = []
+            x = 0.0
+            for _, word_pieces, _ in current:
+                for text, font, piece_width in word_pieces:
+                    pieces.append((x, text, font, piece_width))
+                    x += piece_width
+            lines.append((pieces, forced))
+            current = []
+            used = 0.0
+            limit = available
+
+        for word in words:
+            if word is _LINE_BREAK or word is _PAGE_BREAK:
+                finish(True)
+                if word is _PAGE_BREAK:
+                    lines.append((_PAGE_BREAK, True))
+                continue
+            space, pieces, word_width = word
+            if space:
+                if current or not lines or lines[-1][1]:
+                    current.append(word)
+                    used += word_width
+                continue
+            if current and used + word_width > limit:
+                finish(False)
+            # A word wider than a whole line is broken between characters.
+            while word_width > limit and pieces:
+                head, pieces = _split_word(pieces, limit)
+                current.append([False, head, sum(piece[2] for piece in head)])
+                finish(False)
+                word_width = sum(piece[2] for piece in pieces)
+            if pieces:
+                current.append([False, pieces, word_width])
+                used += word_width
+        finish(True)
+        return lines
+
+    def _line(self, pieces, indent, available, fmt, forced):
+        """Aligns the pieces of a line and works out its height."""
+        sizes = [piece[2].size for piece in pieces] or [fmt.font.size]
+        size = max(sizes)
+        natural = size * 1.2
+        if isinstance(fmt.line, Length):
+            height = max(fmt.line.pt, natural)
+        else:
+            height = natural * (fmt.line or 1.0)
+        content = pieces[-1][0] + pieces[-1][3] if pieces else 0.0
+        # A hanging list prefix sits left of the text and doesn't count.
+        if pieces and pieces[0][0] < 0:
+            content = pieces[-1][0] + pieces[-1][3] if len(pieces) > 1 else 0.0
+        extra = max(available - content, 0.0)
+        shift, spacing = 0.0, 0.0
+        if fmt.align == WD_ALIGN_PARAGRAPH.CENTER:
+            shift = extra / 2
+        elif fmt.align == WD_ALIGN_PARAGRAPH.RIGHT:
+            shift = extra
+        elif fmt.align in (WD_ALIGN_PARAGRAPH.JUSTIFY, WD_ALIGN_PARAGRAPH.DISTRIBUTE) and not forced:
+            spaces = sum(text.count(" ") for x, text, font, width in pieces if x >= 0)
+            if spaces:
+                spacing = extra / spaces
+
+        # Neighbouring pieces in the same font are drawn with one operator.
+        placed = []
+        for x, text, font, width in pieces:
+            if x < 0:
+                placed.append((indent + x, text, font, 0.0))
+            elif placed and placed[-1][2] == font and placed[-1][0] >= indent:
+                start, previous, _, _ = placed[-1]
+                placed[-1] = (start, previous + text, font, spacing)
+            else:
+                placed.append((indent + shift + x, text, font, spacing))
+        if spacing:
+            gained = 0.0
+            for i, (x, text, font, _) in enumerate(placed):
+                placed[i] = (x + gained, text, font, spacing)
+                gained += spacing * text.count(" ")
+        return _Line(height, size * _DESCENT, placed)
+
+    def table(self, tbl, width):
+        """Lays out a table as one item per row."""
+        grid = [_twips(col, "w:w") or 0.0 for col in tbl.findall(f"{qn('w:tblGrid')}/{qn('w:gridCol')}")]
+        rows = tbl.findall(qn("w:tr"))
+        columns = max([len(grid)] + [len(row.findall(_W_TC)) for row in rows])
+        if len(grid) < columns or not sum(grid):
+            grid = [width / max(columns, 1)] * columns
+        total = sum(grid)
+        if total > width:
+            grid = [column * width / total for column in grid]
+        borders = self._table_borders(tbl)
+
+        items = []
+        for tr in rows:
+            cells = []
+            x = 0.0
+            height = 0.0
+            for column, tc in enumerate(tr.findall(_W_TC)):
+                cell_width = grid[column]
+                content = [item for item in self.blocks(tc, cell_width - 2 * _CELL_PADDING, in_body=False)
+                           if item is not _PAGE_BREAK]
+                height = max(height, sum(item.height for item in content))
+                fill = tc.find(f"{qn('w:tcPr')}/{qn('w:shd')}")
+                fill = None if fill is None else fill.get(qn("w:fill"))
+                color = _hex_color(fill)
+                cells.append((x, cell_width, content, color))
+                x += cell_width
+            height += 2 * _CELL_VERTICAL_PADDING
+            tr_height = tr.find(f"{qn('w:trPr')}/{qn('w:trHeight')}")
+            if tr_height is not None:
+                height = max(height, _twips(tr_height, "w:val") or 0.0)
+            items.append(_Row(height, cells, borders))
+        return items
+
+    def _table_borders(self, tbl):
+        """Tells if a table's own properties or style draw borders."""
+        def has_borders(tbl_pr):
+            borders = None if tbl_pr is None else tbl_pr.find(qn("w:tblBorders"))
+            if borders is None:
+                return None
+            return any(border.get(_W_VAL) not in ("nil", "none") for border in borders)
+
+        direct = has_borders(tbl.find(qn("w:tblPr")))
+        if direct is not None:
+            return direct
+        style = tbl.find(f"{qn('w:tblPr')}/{qn('w:tblStyle')}")
+        if style is None:
+            return False
+        from docx.enum.style import WD_STYLE_TYPE
+
+        found = _inherited(self.styles._style(style.get(_W_VAL), WD_STYLE_TYPE.TABLE),
+                           lambda s: has_borders(s.element.find(qn("w:tblPr"))))
+        return bool(found)
+
+def _hex_color(value):
+    if not value or value == "auto" or len(value) != 6:
+        return None
+    try:
+        return tuple(int(value[i:i + 2], 16) / 255 for i in (0, 2, 4))
+    except ValueError:
+        return None
+
+def _split_word(pieces, room):
+    """Splits a word's pieces so the head fits in `room` points.
+
+    The head always holds at least one character, so very narrow cells
+    still make progress.
+
+    Returns:
+        tuple: `(head, tail)` piece lists.
+    """
+    head = []
+    for index, (text, font, width) in enumerate(pieces):
+        if width <= room:
+            head.append((text, font, width))
+            room -= width
+            continue
+        taken = 0
+        used = 0.0
+        for char in text:
+            char_width = text_width(char, font.bold, font.size)
+            if used + char_width > room and (taken or head):
+                break
+            used += char_width
+            taken += 1
+        if taken:
+            head.append((text[:taken], font, used))
+        rest = text[taken:]
+        tail = list(pieces[index + 1:])
+        if rest:
+            tail.insert(0, (rest, font, text_width(rest, font.bold, font.size)))
+        return head, tail
+    return head, []
+
+def _text_string(text):
+    """Encodes text as a PDF text string, in UTF-16 so any script works."""
+    return b"<FEFF%s>" % text.encode("utf-16-be").hex().upper().encode("ascii")
+
+class PdfWriter:
+    """Writes a PDF to a binary stream one page at a time.
+
+    Pages are written as soon as they are added and only their object
+    offsets are kept, so a bundle of thousands of documents needs little
+    memory. Every page shares the four Helvetica fonts of the renderer.
+    """
+
+    def __init__(self, stream):
+        """Starts the PDF.
+
+        Args:
+            stream (file): A binary file object opened for writing.
+        """
+        self.stream = stream
+        self._offsets = []
+        self._pages = []
+        self._bookmarks = []
+        # Offsets count from the start of the PDF, wherever the stream is.
+        self._base = stream.tell()
+        stream.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._catalog = self._reserve()
+        self._page_tree = self._reserve()
+        fonts = sorted(_FONTS.values())
+        numbers = [self._object(b"<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>" % base_font)
+                   for _, base_font in fonts]
+        self._resources = b"<< /Font << %s >> >>" % b" ".join(
+            b"/%s %d 0 R" % (name, number) for (name, _), number in zip(fonts, numbers))
+
+    def _reserve(self):
+        self._offsets.append(None)
+        return len(self._offsets)
+
+    def _object(self, body, number=None):
+        if number is None:
+            number = self._reserve()
+        self._offsets[number - 1] = self.stream.tell() - self._base
+        self.stream.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        return number
+
+    @property
+    def page_count(self):
+        return len(self._pages)
+
+    def add_page(self, content, width, height):
+        """Adds one page.
+
+        Args:
+            content (bytes): The page's content stream.
+            width (float): Page width in points.
+            height (float): Page height in points.
+
+        Returns:
+            int: The page's object number, e.g. for `add_bookmark`.
+        """
+        data = zlib.compress(content, 6)
+        contents = self._object(b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream" % (len(data), data))
+        page = self._object(b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.2f %.2f] /Resources %s /Contents %d 0 R >>"
+                            % (self._page_tree, width, height, self._resources, contents))
+        self._pages.append(page)
+        return page
+
+    def add_bookmark(self, title, page):
+        """Adds an entry to the document outline that opens `page`."""
+        self._bookmarks.append((title, page))
+
+    def close(self):
+        """Writes the page tree, the outline and the cross-reference table.
+
+        The stream itself is left open.
+        """
+        self._object(b"<< /Type /Pages /Kids [%s] /Count %d >>"
+                     % (b" ".join(b"%d 0 R" % page for page in self._pages), len(self._pages)), self._page_tree)
+        outline = b""
+        if self._bookmarks:
+            root = self._reserve()
+            items = [self._reserve() for _ in self._bookmarks]
+            for i, ((title, page), number) in enumerate(zip(self._bookmarks, items)):
+                links = b"".join([b" /Prev %d 0 R" % items[i - 1] if i else b"",
+                                  b" /Next %d 0 R" % items[i + 1] if i + 1 < len(items) else b""])
+                self._object(b"<< /Title %s /Parent %d 0 R%s /Dest [%d 0 R /Fit] >>"
+                             % (_text_string(title), root, links, page), number)
+            self._object(b"<< /Type /Outlines /First %d 0 R /Last %d 0 R /Count %d >>"
+                         % (items[0], items[-1], len(items)), root)
+            outline = b" /Outlines %d 0 R /PageMode /UseOutlines" % root
+        self._object(b"<< /Type /Catalog /Pages %d 0 R%s >>" % (self._page_tree, outline), self._catalog)
+        xref = self.stream.tell() - self._base
+        lines = [b"xref\n0 %d\n0000000000 65535 f \n" % (len(self._offsets) + 1)]
+        lines += [b"%010d 00000 n \n" % offset for offset in self._offsets]
+        lines.append(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                     % (len(self._offsets) + 1, self._catalog, xref))
+        self.stream.write(b"".join(lines))
+
+def write_pdf(pages, width, height):
+    """Builds a PDF file from page content streams.
+
+    Args:
+        pages (list): The content stream of each page, as bytes.
+        width (float): Page width in points.
+        height (float): Page height in points.
+
+    Returns:
+        bytes: The PDF file.
+    """
+    out = io.BytesIO()
+    writer = PdfWriter(out)
+    for content in pages:
+        writer.add_page(content, width, height)
+    writer.close()
+    return out.getvalue()
+
+class NativePdfRenderer:
+    """Renders the documents of one compiled template straight to PDF.
+
+    The template is checked once; if it uses anything the renderer can't lay
+    out, `unsupported` lists it and `render` always raises. Like the
+    compiled template, a renderer is not thread-safe.
+    """
+
+    version = RENDERER_VERSION
+
+    def __init__(self, template):
+        """Checks a template and prepares its styles.
+
+        Args:
+            template (CompiledTemplate): The compiled document template.
+        """
+        document = template.render({})
+        self.unsupported = find_unsupported(document)
+        self._styles = None if self.unsupported else _Styles(document)
+
+    def pages(self, document):
+        """Lays out one rendered document.
+
+        Args:
+            document (docx.Document): A document returned by the template's
+                `render`.
+
+        Returns:
+            tuple: `(pages, width, height)`: the content stream of every
+                page and the page size in points, see `PdfWriter.add_page`.
+
+        Raises:
+            UnsupportedDocument: If the document can't be rendered natively.
+        """
+        if self.unsupported:
+            raise UnsupportedDocument(", ".join(self.unsupported))
+        layout = _Layout(self._styles, document)
+        return layout.render(), layout.page_width, layout.page_height
+
+    def to_pdf(self, document):
+        """Returns one rendered document as the bytes of a PDF file."""
+        return write_pdf(*self.pages(document))
+
+    def render(self, document, pdf_path):
+        """Writes one rendered document as a PDF.
+
+        Args:
+            document (docx.Document): A document returned by the template's
+                `render`.
+            pdf_path (str): Path of the PDF file to write.
+
+        Raises:
+            UnsupportedDocument: If the document can't be rendered natively;
+                nothing is written then.
+        """
+        data = self.to_pdf(document)
+        with open(pdf_path, "wb") as f:
+            f.write(data)
@@ -0,0 +1,98 @@
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Placed on a stage queue once per worker to tell it to stop.
+_STOP = object()
+
+def _stage_worker(inbox, handle):
+    """Runs `handle` on every item of `inbox` until the stop marker arrives."""
+    while True:
+        item = inbox.get()
+        if item is _STOP:
+            break
+        handle(*item)
+
+def _start_stage(count, name, inbox, handle):
+    threads = [
+        threading.Thread(target=_stage_worker, args=(inbox, handle), name=f"{name}-{i}", daemon=True)
+        for i in range(max(1, count))
+    ]
+    for thread in threads:
+        thread.start()
+    return threads
+
+def _stop_stage(threads, inbox):
+    for _ in threads:
+        inbox.put(_STOP)
+    for thread in threads:
+        thread.join()
+
+def run_pipeline(rows, render, convert, deliver, on_render_error,
+                 render_workers=2, convert_workers=1, send_workers=1, queue_size=16,
+                 render_initializer=None, render_initargs=()):
+    """Runs rows through overlapping render, convert and send stages.
+
+    Rendering is CPU-bound and runs in a process pool; conversion and
+    sending wait on other programs or the network and run in thread pools.
+    The stages are joined by bounded queues, and at most `queue_size` rows
+    are rendering at any time, so a slow stage holds back the ones before it
+    instead of letting finished work pile up in memory.
+
+    Args:
+        rows (iterable): `(index, row, *args)` tuples to process.
+        render (callable): `render(index, row, *args)` returning a job. Runs
+            in a worker process, so it must be picklable, as must rows and
+            jobs.
+        convert (callable): `convert(job)` converting the job's document;
+            raises on failure. Runs in a converter thread.
+        deliver (callable): `deliver(job, conv_error)` sending the job, where
+            `conv_error` is None or the exception raised by `convert`. Runs
+            in a send thread.
+        on_render_error (callable): `on_render_error(index, row, error)`,
+            called from the calling thread when `render` raises.
+        render_workers (int, optional): Number of render processes.
+        convert_workers (int, optional): Number of converter threads.
+        send_workers (int, optional): Number of send threads.
+        queue_size (int, optional): Capacity of each queue between stages.
+        render_initializer (callable, optional): Run once in every render
+            process, e.g. to compile the template there.
+        render_initargs (tuple, optional): Arguments for `render_initializer`.
+    """
+    convert_queue = queue.Queue(maxsize=queue_size)
+    send_queue = queue.Queue(maxsize=queue_size)
+
+    def convert_one(job):
+        try:
+            convert(job)
+            conv_error = None
+        except Exception as e:
+            conv_error = e
+        send_queue.put((job, conv_error))
+
+    senders = _start_stage(send_workers, "send", send_queue, deliver)
+    converters = _start_stage(convert_workers, "convert", convert_queue, convert_one)
+
+    def hand_off(index, row, future):
+        try:
+            job = future.result()
+        except Exception as e:
+            on_render_error(index, row, e)
+            return
+        # Blocks while the converters are behind.
+        convert_queue.put((job,))
+
+    try:
+        with ProcessPoolExecutor(max_workers=max(1, render_workers), initializer=render_initializer,
+                                 initargs=render_initargs) as render_pool:
+            in_flight = deque()
+            for index, row, *args in rows:
+                in_flight.append((index, row, render_pool.submit(render, index, row, *args)))
+                if len(in_flight) >= queue_size:
+                    hand_off(*in_flight.popleft())
+            while in_flight:
+                hand_off(*in_flight.popleft())
+    finally:
+        _stop_stage(converters, convert_queue)
+        _stop_stage(senders, send_queue)
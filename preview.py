@@ -0,0 +1,195 @@
+"""Renders a single data row on demand, to check a layout without a run.
+
+A `Previewer` keeps the compiled template and the rows read so far from the
+data file between previews, and reloads either only when its file's
+modification time or size changes. Previewing another row, or the same row
+after editing the email text, therefore costs one template fill and, for
+templates the native renderer supports, one in-process PDF layout:
+typically a few milliseconds. Other templates are converted with the
+office converter, which is started once and kept warm for later previews.
+"""
+import itertools
+import os
+import tempfile
+import time
+from collections import namedtuple
+from docx.oxml.ns import qn
+from converters import ConverterPool, get_converter_factory
+from pdfrender import NativePdfRenderer, UnsupportedDocument
+from sources import iter_rows, read_columns
+from template import CompiledTemplate
+from texttemplate import RowFormatter, sanitize_filename
+
+Preview = namedtuple("Preview", "index email filename subject body text pdf renderer seconds warnings")
+Preview.__doc__ = """One rendered row.
+
+`text` holds the document's paragraphs, one per line. `pdf` is the PDF's
+bytes, or None if no PDF was asked for or it could not be made; `renderer`
+says what made it ("native" or the converter's name). `warnings` lists
+problems worth showing, such as placeholders with no matching column."""
+
+def _stamp(path):
+    """Returns what identifies a version of a file: its mtime and size."""
+    status = os.stat(path)
+    return status.st_mtime_ns, status.st_size
+
+def document_text(document):
+    """Returns the text of a document's body, one paragraph per line."""
+    w_t = qn("w:t")
+    return "\n".join("".join(t.text or "" for t in p.iter(w_t)) for p in document.element.body.iter(qn("w:p")))
+
+class _TemplateEntry:
+    """A compiled template and its native renderer, for one file version."""
+
+    def __init__(self, template_file):
+        self.stamp = _stamp(template_file)
+        self.template = CompiledTemplate(template_file)
+        self.native = NativePdfRenderer(self.template)
+
+class _DataEntry:
+    """The columns and the rows read so far of one data file version.
+
+    Rows are read lazily, only as far as the furthest row previewed plus
+    `READ_AHEAD`, so previewing the first rows of a huge file stays
+    instant. The file is closed after every read, so the preview never
+    keeps the user from saving it in Excel.
+    """
+
+    READ_AHEAD = 100
+
+    def __init__(self, data_file):
+        self.data_file = data_file
+        self.stamp = _stamp(data_file)
+        self.columns = read_columns(data_file)
+        self.rows = []
+        self._complete = False
+
+    def row(self, number):
+        """Returns `(index, row)` of the data row `number`, counted from 0.
+
+        Raises:
+            IndexError: If the file has fewer rows.
+        """
+        if len(self.rows) <= number and not self._complete:
+            wanted = number + 1 + self.READ_AHEAD
+            rows = iter_rows(self.data_file)
+            try:
+                # Rows read by an earlier preview are skipped, not kept open.
+                self.rows.extend(itertools.islice(rows, len(self.rows), wanted))
+            finally:
+                rows.close()
+            self._complete = len(self.rows) < wanted
+        if number >= len(self.rows):
+            raise IndexError(f"The data file has only {len(self.rows)} rows.")
+        return self.rows[number]
+
+class Previewer:
+    """Renders rows of a data file with a template, caching both.
+
+    A previewer is not thread-safe; use it from one thread at a time.
+    """
+
+    def __init__(self, converter="auto"):
+        """Configures the previewer.
+
+        Args:
+            converter (str, optional): The PDF converter backend for
+                templates or rows the native renderer can't handle.
+                Defaults to "auto".
+        """
+        self.converter = converter
+        self._templates = {}
+        self._data = {}
+        self._pool = None
+
+    def _template(self, template_file):
+        entry = self._templates.get(template_file)
+        if entry is None or entry.stamp != _stamp(template_file):
+            entry = self._templates[template_file] = _TemplateEntry(template_file)
+        return entry
+
+    def _rows(self, data_file):
+        entry = self._data.get(data_file)
+        if entry is None or entry.stamp != _stamp(data_file):
+            entry = self._data[data_file] = _DataEntry(data_file)
+        return entry
+
+    def preview(self, data_file, template_file, number, email_subject="", email_body="",
+                pdf_filename_format="Admit_{<ID>}", pdf=True, native_pdf=True):
+        """Renders one data row.
+
+        Args:
+            data_file (str): Path to the data file.
+            template_file (str): Path to the .docx template file.
+            number (int): The data row, counted from 0 (spreadsheet row
+                `number + 2` without empty rows).
+            email_subject (str, optional): The subject format.
+            email_body (str, optional): The HTML body format.
+            pdf_filename_format (str, optional): The format for the PDF filename.
+            pdf (bool, optional): Also make the PDF. Defaults to True.
+            native_pdf (bool, optional): Lay the PDF out in-process where the
+                template allows. Defaults to True.
+
+        Returns:
+            Preview: The rendered row.
+
+        Raises:
+            IndexError: If the data file has no such row.
+            ValueError: If a format string is malformed.
+            Exception: If a file can't be read.
+        """
+        start = time.perf_counter()
+        entry = self._template(template_file)
+        index, row = self._rows(data_file).row(number)
+        formatter = RowFormatter(entry.template.placeholders, subject=email_subject, body=email_body,
+                                 filename=pdf_filename_format)
+        replacements = formatter.replacements(row)
+
+        warnings = []
+        missing = sorted(placeholder for placeholder in formatter.placeholders if placeholder not in replacements)
+        if missing:
+            warnings.append(f"No column for {', '.join(missing)}")
+        texts = {}
+        for name in ("filename", "subject", "body"):
+            try:
+                texts[name] = formatter.format(name, replacements)
+            except (KeyError, ValueError, IndexError, AttributeError) as e:
+                texts[name] = ""
+                warnings.append(f"Could not fill the {name}: {str(e)}")
+        texts["filename"] = sanitize_filename(texts["filename"]) if texts["filename"] else ""
+
+        document = entry.template.render(replacements)
+        text = document_text(document)
+        data = renderer = None
+        if pdf:
+            try:
+                data, renderer = self._pdf(entry, document, native_pdf)
+            except Exception as e:
+                warnings.append(f"Could not make the PDF: {str(e)}")
+        return Preview(index, str(row.get("Email", "")).strip(), texts["filename"], texts["subject"], texts["body"],
+                       text, data, renderer, time.perf_counter() - start, warnings)
+
+    def _pdf(self, entry, document, native_pdf):
+        """Returns the PDF of a rendered document and what made it."""
+        if native_pdf and not entry.native.unsupported:
+            try:
+                return entry.native.to_pdf(document), "native"
+            except UnsupportedDocument:
+                pass
+        if self._pool is None:
+            self._pool = ConverterPool(get_converter_factory(self.converter))
+        with tempfile.TemporaryDirectory(prefix="documint-preview-") as folder:
+            docx_path = os.path.join(folder, "preview.docx")
+            pdf_path = os.path.join(folder, "preview.pdf")
+            document.save(docx_path)
+            self._pool.convert(docx_path, pdf_path)
+            with open(pdf_path, "rb") as f:
+                return f.read(), self.converter
+
+    def close(self):
+        """Forgets the cached files and stops the office converter, if a preview started it."""
+        self._templates.clear()
+        self._data.clear()
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
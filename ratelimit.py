@@ -0,0 +1,162 @@
+import asyncio
+import random
+import threading
+import time
+
+class TokenBucket:
+    """A thread-safe token bucket.
+
+    Tokens refill continuously at `rate` per second up to `burst`. Each
+    `acquire` takes one token, waiting if none is left. Waiting callers queue
+    up fairly: every caller reserves its token before it starts sleeping.
+    """
+
+    def __init__(self, rate, burst=1, clock=time.monotonic, sleep=time.sleep):
+        """Creates a full bucket.
+
+        Args:
+            rate (float): Tokens added per second.
+            burst (int, optional): Maximum number of tokens held at once,
+                i.e. how many calls may go through back to back.
+            clock (callable, optional): Monotonic time source.
+            sleep (callable, optional): Function used to wait.
+        """
+        self.rate = float(rate)
+        self.burst = max(1, burst)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """Takes a token and returns how long the caller must wait for it."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        """Takes one token, blocking until it is available.
+
+        Returns:
+            float: The number of seconds spent waiting.
+        """
+        wait = self._reserve()
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+    async def acquire_async(self):
+        """Like `acquire`, but waits without blocking the event loop."""
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+class RateLimiter:
+    """Limits how fast emails are sent, overall and per recipient domain.
+
+    Every send takes a token from the domain's bucket (if the domain is
+    limited) and then from the global bucket. Only real sends should call
+    `acquire`; dry runs never wait.
+    """
+
+    def __init__(self, rate=None, period=1.0, burst=1, domain_rate=None, domain_limits=None):
+        """Creates the limiter.
+
+        Args:
+            rate (float, optional): Messages allowed per `period` overall.
+                None means no overall limit.
+            period (float, optional): Length of the rate window in seconds,
+                e.g. 60 to express rates per minute.
+            burst (int, optional): Messages that may be sent back to back
+                before the rate applies.
+            domain_rate (float, optional): Messages allowed per `period` to
+                any single recipient domain. None means no per-domain limit.
+            domain_limits (dict, optional): Per-domain rates per `period`
+                that override `domain_rate`, e.g. {"gmail.com": 20}.
+        """
+        self.period = float(period)
+        self._global = TokenBucket(rate / self.period, burst) if rate else None
+        self._domain_rate = domain_rate
+        self._domain_limits = {domain.lower(): limit for domain, limit in (domain_limits or {}).items()}
+        self._burst = burst
+        self._domains = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_delay(cls, delay, burst=1, domain_per_minute=0):
+        """Builds a limiter from the GUI's settings.
+
+        Args:
+            delay (float): Seconds between emails; 0 disables the overall limit.
+            burst (int, optional): Emails that may go out back to back.
+            domain_per_minute (int, optional): Emails per minute to any one
+                domain; 0 disables the per-domain limit.
+
+        Returns:
+            RateLimiter: The limiter.
+        """
+        return cls(
+            rate=1.0 / delay if delay > 0 else None,
+            burst=burst,
+            domain_rate=domain_per_minute / 60.0 if domain_per_minute > 0 else None,
+        )
+
+    def _domain_bucket(self, email):
+        domain = email.rsplit("@", 1)[-1].lower()
+        limit = self._domain_limits.get(domain, self._domain_rate)
+        if not limit:
+            return None
+        with self._lock:
+            bucket = self._domains.get(domain)
+            if bucket is None:
+                bucket = self._domains[domain] = TokenBucket(limit / self.period, self._burst)
+            return bucket
+
+    def acquire(self, email):
+        """Waits until an email to `email` may be sent.
+
+        Args:
+            email (str): The recipient's address; its domain selects the
+                per-domain bucket.
+
+        Returns:
+            float: The number of seconds spent waiting.
+        """
+        waited = 0.0
+        bucket = self._domain_bucket(email)
+        if bucket is not None:
+            waited += bucket.acquire()
+        if self._global is not None:
+            waited += self._global.acquire()
+        return waited
+
+    async def acquire_async(self, email):
+        """Like `acquire`, but waits without blocking the event loop."""
+        waited = 0.0
+        bucket = self._domain_bucket(email)
+        if bucket is not None:
+            waited += await bucket.acquire_async()
+        if self._global is not None:
+            waited += await self._global.acquire_async()
+        return waited
+
+def backoff_delay(attempt, base=1.0, cap=60.0):
+    """Returns a jittered exponential backoff delay ("full jitter").
+
+    Args:
+        attempt (int): The number of the attempt that just failed, from 0.
+        base (float, optional): Delay ceiling after the first failure.
+        cap (float, optional): Largest delay ceiling.
+
+    Returns:
+        float: Seconds to wait before the next attempt, chosen uniformly
+            between 0 and `min(cap, base * 2 ** attempt)`.
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
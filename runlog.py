@@ -0,0 +1,134 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+LOG_FILENAME = "documint_log.jsonl"
+EXCEL_FILENAME = "documint_log.xlsx"
+COLUMNS = ("Name", "Email", "Status", "Timestamp")
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ", timespec="seconds")
+    return str(value)
+
+class RunLog:
+    """An append-only log of row outcomes, one JSON object per line.
+
+    Every record is written and flushed to the operating system as soon as it
+    is appended, so a crash loses at most what the OS had not yet written to
+    disk. Forcing the data to disk with fsync is batched: it happens after
+    every `sync_every` records or `sync_interval` seconds, whichever comes
+    first, and on close. Appending is thread-safe and costs the same no
+    matter how long the history is.
+    """
+
+    def __init__(self, path, sync_every=100, sync_interval=1.0):
+        """Opens the log for appending, creating it if needed.
+
+        Args:
+            path (str): Path to the .jsonl file.
+            sync_every (int, optional): Records between fsyncs.
+            sync_interval (float, optional): Maximum seconds between fsyncs.
+        """
+        self.path = path
+        self.sync_every = max(1, sync_every)
+        self.sync_interval = sync_interval
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def append(self, record):
+        """Writes one record, e.g. from `core.make_log_record`."""
+        line = json.dumps(record, default=_encode, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self._unsynced += 1
+            if self._unsynced >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_interval:
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        """Forces outstanding records to disk and closes the file."""
+        with self._lock:
+            if self._file.closed:
+                return
+            self._sync()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def open_run_log(logs_folder, **options):
+    """Opens the run log in a logs folder.
+
+    A folder that only has the Excel log written by earlier versions has its
+    history copied into the new log once, so nothing is lost.
+
+    Args:
+        logs_folder (str): Path to the logs folder.
+        **options: Passed to `RunLog`.
+
+    Returns:
+        RunLog: The open log.
+    """
+    path = os.path.join(logs_folder, LOG_FILENAME)
+    legacy_path = os.path.join(logs_folder, EXCEL_FILENAME)
+    if not os.path.exists(path) and os.path.exists(legacy_path):
+        import pandas as pd
+
+        legacy = pd.read_excel(legacy_path, dtype=object)
+        with RunLog(path + ".tmp", **options) as run_log:
+            for record in legacy.to_dict("records"):
+                run_log.append({key: "" if pd.isna(value) else value for key, value in record.items()})
+        os.replace(path + ".tmp", path)
+    return RunLog(path, **options)
+
+def read_records(path):
+    """Yields the records of a run log.
+
+    A last line cut short by a crash is ignored.
+
+    Args:
+        path (str): Path to the .jsonl file.
+
+    Yields:
+        dict: One record per line.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+def export_excel(logs_folder, excel_path=None):
+    """Writes the run log of a logs folder to an Excel workbook.
+
+    Args:
+        logs_folder (str): Path to the logs folder.
+        excel_path (str, optional): Where to write the workbook. Defaults to
+            documint_log.xlsx in the logs folder.
+
+    Returns:
+        str: The path of the workbook.
+    """
+    import pandas as pd
+
+    path = os.path.join(logs_folder, LOG_FILENAME)
+    excel_path = excel_path or os.path.join(logs_folder, EXCEL_FILENAME)
+    records = read_records(path) if os.path.exists(path) else []
+    frame = pd.DataFrame(records)
+    frame = frame.reindex(columns=list(COLUMNS) + [c for c in frame.columns if c not in COLUMNS])
+    frame.to_excel(excel_path, index=False)
+    return excel_path
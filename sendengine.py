@@ -0,0 +1,122 @@
+import asyncio
+import threading
+from contextlib import nullcontext
+from ratelimit import backoff_delay
+
+class SendCancelled(Exception):
+    """Reported for messages that were still pending when the engine was cancelled."""
+
+class AsyncSendEngine:
+    """Sends email from one asyncio event loop running in a background thread.
+
+    Any thread may `submit` messages. Up to `concurrency` sends are in flight
+    at once; further submissions block until one finishes, so callers feel
+    backpressure instead of queueing without bound. Each attempt waits for
+    the rate limiter, is bounded by `timeout` seconds and is retried with a
+    jittered exponential backoff. A slow recipient only holds its own slot.
+    """
+
+    def __init__(self, transport, rate_limiter, concurrency=100, timeout=60, retries=1, retry_backoff=1.0, metrics=None):
+        """Starts the event loop thread.
+
+        Args:
+            transport (Transport): Sends the messages via `send_async`.
+            rate_limiter (RateLimiter): Paces the sends.
+            concurrency (int, optional): Maximum number of sends in flight.
+            timeout (float, optional): Seconds allowed for one send attempt.
+            retries (int, optional): Attempts per message; at least one.
+            retry_backoff (float, optional): Backoff ceiling in seconds after
+                the first failed attempt.
+            metrics (Metrics, optional): Records the time spent waiting for
+                the rate limiter and sending.
+        """
+        self.transport = transport
+        self.rate_limiter = rate_limiter
+        self.timeout = timeout
+        self.attempts = max(1, retries)
+        self.retry_backoff = retry_backoff
+        self.metrics = metrics
+        self._slots = threading.BoundedSemaphore(max(1, concurrency))
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._cancelled = False
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="send-engine", daemon=True)
+        self._thread.start()
+
+    def _timed(self, stage):
+        return self.metrics.time(stage) if self.metrics is not None else nullcontext()
+
+    async def _send(self, message):
+        for attempt in range(self.attempts):
+            try:
+                with self._timed("rate_limit"):
+                    await self.rate_limiter.acquire_async(message.to)
+                with self._timed("send"):
+                    await asyncio.wait_for(self.transport.send_async(message), self.timeout)
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt == self.attempts - 1:
+                    if isinstance(e, asyncio.TimeoutError):
+                        raise TimeoutError(f"Sending timed out after {self.timeout}s") from e
+                    raise
+                await asyncio.sleep(backoff_delay(attempt, self.retry_backoff))
+
+    def submit(self, message, callback):
+        """Queues a message for sending.
+
+        Args:
+            message (OutgoingMessage): The message to send.
+            callback (callable): Called as `callback(error)` once the message
+                is sent (`error` is None) or has finally failed, been
+                cancelled or timed out. Runs on the engine's thread.
+        """
+        if self._cancelled:
+            callback(SendCancelled("Sending was cancelled"))
+            return
+        self._slots.acquire()
+        future = asyncio.run_coroutine_threadsafe(self._send(message), self._loop)
+        with self._lock:
+            self._pending.add(future)
+
+        def done(future):
+            try:
+                error = future.exception()
+            except BaseException:
+                error = SendCancelled("Sending was cancelled")
+            try:
+                callback(error)
+            finally:
+                with self._lock:
+                    self._pending.discard(future)
+                    self._idle.notify_all()
+                self._slots.release()
+
+        future.add_done_callback(done)
+
+    def cancel(self):
+        """Cancels every pending send and rejects further submissions."""
+        self._cancelled = True
+        with self._lock:
+            pending = list(self._pending)
+        for future in pending:
+            future.cancel()
+
+    def close(self):
+        """Waits for the sends in flight, then stops the event loop."""
+        with self._lock:
+            while self._pending:
+                self._idle.wait()
+        asyncio.run_coroutine_threadsafe(self.transport.close_async(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,114 @@
+import csv
+import os
+
+SUPPORTED_EXTENSIONS = (".xlsx", ".xlsm", ".xls", ".csv", ".parquet")
+
+def _clean_header(values):
+    return [str(value).strip() if value is not None else "" for value in values]
+
+def _clean_value(value):
+    return "" if value is None else value
+
+def _xlsx_rows(data_file):
+    from openpyxl import load_workbook
+
+    # Read-only mode streams the sheet XML instead of building the whole
+    # workbook in memory.
+    workbook = load_workbook(data_file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = _clean_header(next(rows, ()))
+        yield header
+        for values in rows:
+            yield [_clean_value(value) for value in values or ()]
+    finally:
+        workbook.close()
+
+def _xls_rows(data_file):
+    # The legacy .xls format can't be streamed; read it whole with pandas.
+    import pandas as pd
+
+    df = pd.read_excel(data_file, dtype=object)
+    yield _clean_header(df.columns)
+    for values in df.itertuples(index=False, name=None):
+        yield ["" if pd.isna(value) else value for value in values]
+
+def _csv_rows(data_file):
+    with open(data_file, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        yield _clean_header(next(reader, []))
+        for values in reader:
+            yield values
+
+def _parquet_rows(data_file, chunk_size):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Reading Parquet files requires the 'pyarrow' package.")
+
+    parquet_file = pq.ParquetFile(data_file)
+    yield _clean_header(parquet_file.schema_arrow.names)
+    for batch in parquet_file.iter_batches(batch_size=chunk_size):
+        columns = [column.to_pylist() for column in batch.columns]
+        for values in zip(*columns):
+            yield [_clean_value(value) for value in values]
+
+def _raw_rows(data_file, chunk_size=10000):
+    """Yields the header row and then each data row as a list of values."""
+    extension = os.path.splitext(data_file)[1].lower()
+    if extension in (".xlsx", ".xlsm"):
+        return _xlsx_rows(data_file)
+    if extension == ".xls":
+        return _xls_rows(data_file)
+    if extension == ".csv":
+        return _csv_rows(data_file)
+    if extension == ".parquet":
+        return _parquet_rows(data_file, chunk_size)
+    raise ValueError(f"Unsupported data file type '{extension}'. Use one of: {', '.join(SUPPORTED_EXTENSIONS)}")
+
+def read_columns(data_file):
+    """Returns the column names of a data file without reading its rows.
+
+    Args:
+        data_file (str): Path to an .xlsx, .xls, .csv or .parquet file.
+
+    Returns:
+        list: The column names, with surrounding whitespace removed.
+    """
+    rows = _raw_rows(data_file)
+    try:
+        return next(rows)
+    finally:
+        rows.close()
+
+def iter_rows(data_file, chunk_size=10000):
+    """Streams the rows of a data file.
+
+    Rows are read lazily, so the first row is available right away and memory
+    use does not grow with the size of the file. Excel workbooks are read in
+    read-only mode from the first sheet; Parquet files are read in batches of
+    `chunk_size` rows (requires `pyarrow`).
+
+    Args:
+        data_file (str): Path to an .xlsx, .xls, .csv or .parquet file.
+        chunk_size (int, optional): Rows per Parquet batch.
+
+    Yields:
+        tuple: `(index, row)`, where `index` counts data rows from 0 (so the
+            spreadsheet row number is `index + 2`) and `row` is a dict that
+            maps each column name to its value. Empty cells are "", and
+            entirely empty rows are skipped.
+    """
+    rows = _raw_rows(data_file, chunk_size)
+    # Closing this generator early closes the file right away.
+    try:
+        header = next(rows)
+        width = len(header)
+        for index, values in enumerate(rows):
+            if all(value == "" for value in values):
+                continue
+            if len(values) < width:
+                values = list(values) + [""] * (width - len(values))
+            yield index, dict(zip(header, values))
+    finally:
+        rows.close()
@@ -0,0 +1,81 @@
+"""Loads the GUI's heavy modules in the background and measures startup.
+
+pandas and python-docx take most of the time before the first window can
+appear. The GUI therefore only imports light modules itself and hands the
+rest to a `ModuleLoader`, which imports them on a background thread while
+the user reads the welcome page. Code that needs one of them calls `load`,
+which returns at once once the module is loaded and otherwise waits for it.
+
+Run `python gui.py --import-times` to see how long the window took to
+appear and how long each heavy module took to import.
+"""
+import importlib
+import sys
+import threading
+import time
+
+# Imported in this order: the big third-party packages first, so the time
+# of each DocuMint module below them only counts its own code.
+HEAVY_MODULES = ("pandas", "docx", "core", "bundle", "preview")
+
+# Written when stderr is missing, as in the windowed executable.
+IMPORT_TIMES_FILENAME = "documint_startup.txt"
+
+# Reference point for the measurements; as close to process start as a
+# module imported first by gui.py gets.
+STARTED = time.perf_counter()
+
+class ModuleLoader:
+    """Imports modules on a background thread and hands them out on demand.
+
+    Attributes:
+        times (dict): Seconds each module took to import, in import order.
+            A module that was already loaded counts as 0.
+    """
+
+    def __init__(self, names=HEAVY_MODULES):
+        self.names = names
+        self.times = {}
+        self.errors = {}
+        self.done = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Starts importing the modules in the background."""
+        self._thread = threading.Thread(target=self._run, name="documint-warmup", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        for name in self.names:
+            start = time.perf_counter()
+            try:
+                importlib.import_module(name)
+            except Exception as e:
+                # `load` raises the error again where the module is needed.
+                self.errors[name] = e
+            self.times[name] = time.perf_counter() - start
+        self.done.set()
+
+    def load(self, name):
+        """Returns a module, importing it now if the background thread hasn't.
+
+        Python's import lock makes a call that races the background thread
+        wait for its import to finish instead of importing twice.
+        """
+        return importlib.import_module(name)
+
+def report_lines(loader, window_seconds):
+    """Returns the measurements of a startup as text lines."""
+    lines = [f"Window shown after {window_seconds * 1000:.0f} ms"]
+    lines.extend(f"  {name}: {seconds * 1000:.0f} ms" + (" (failed)" if name in loader.errors else "")
+                 for name, seconds in loader.times.items())
+    lines.append(f"All modules loaded after {(time.perf_counter() - STARTED) * 1000:.0f} ms")
+    return lines
+
+def write_report(lines):
+    """Prints the measurements, or writes them to a file without a console."""
+    if sys.stderr is not None:
+        print("\n".join(lines), file=sys.stderr, flush=True)
+        return
+    with open(IMPORT_TIMES_FILENAME, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
@@ -0,0 +1,206 @@
+import copy
+import re
+from bisect import bisect_right
+from docx import Document
+from docx.opc.constants import CONTENT_TYPE as CT
+from docx.opc.part import XmlPart
+from docx.oxml.ns import qn
+
+PLACEHOLDER_PATTERN = re.compile(r"<[^<>]+>")
+
+# Parts whose text is searched for placeholders. Headers and footers live in
+# their own parts; text boxes and nested tables are ordinary `w:p` elements
+# inside these.
+TEXT_CONTENT_TYPES = (
+    CT.WML_DOCUMENT_MAIN,
+    CT.WML_HEADER,
+    CT.WML_FOOTER,
+    CT.WML_FOOTNOTES,
+    CT.WML_ENDNOTES,
+)
+
+_W_P = qn("w:p")
+_W_T = qn("w:t")
+_XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+
+def _element_path(root, element):
+    """Returns the child-index path leading from `root` down to `element`."""
+    path = []
+    while element is not root:
+        parent = element.getparent()
+        path.append(parent.index(element))
+        element = parent
+    return tuple(reversed(path))
+
+def _resolve_path(root, path):
+    """Follows a child-index path produced by `_element_path`."""
+    element = root
+    for index in path:
+        element = element[index]
+    return element
+
+def _paragraph_text_nodes(p):
+    """Returns the `w:t` nodes that belong directly to paragraph `p`.
+
+    Text of paragraphs nested inside `p` (e.g. a text box anchored in one of
+    its runs) is excluded so that each paragraph is tokenized on its own.
+    """
+    return [t for t in p.iter(_W_T) if next(t.iterancestors(_W_P)) is p]
+
+def tokenize_text_nodes(texts):
+    """Splits the text of consecutive runs into literal and placeholder pieces.
+
+    Placeholders may be split across runs (Word does this when it spell-checks
+    or when formatting changes mid-word). A placeholder is assigned to the run
+    it starts in, so the value inherits that run's formatting, and its
+    remaining characters are dropped from the runs it spills into.
+
+    Args:
+        texts (list): The text of each `w:t` node of a paragraph, in order.
+
+    Returns:
+        dict: Maps the index of every node affected by a placeholder to a
+            tuple of `(text, is_placeholder)` pieces. Empty if the paragraph
+            has no placeholders.
+    """
+    full_text = "".join(texts)
+    matches = list(PLACEHOLDER_PATTERN.finditer(full_text))
+    if not matches:
+        return {}
+
+    starts = []
+    offset = 0
+    for text in texts:
+        starts.append(offset)
+        offset += len(text)
+
+    pieces = [[] for _ in texts]
+    touched = set()
+
+    def add_literal(begin, end):
+        if begin >= end:
+            return
+        for index, start in enumerate(starts):
+            stop = start + len(texts[index])
+            if stop > begin and start < end:
+                pieces[index].append((full_text[max(begin, start):min(end, stop)], False))
+
+    cursor = 0
+    for match in matches:
+        add_literal(cursor, match.start())
+        first = bisect_right(starts, match.start()) - 1
+        last = bisect_right(starts, match.end() - 1) - 1
+        pieces[first].append((match.group(), True))
+        touched.update(range(first, last + 1))
+        cursor = match.end()
+    add_literal(cursor, len(full_text))
+
+    return {index: tuple(pieces[index]) for index in sorted(touched)}
+
+def _fill(pieces, replacements):
+    """Joins the pieces of one text node, substituting known placeholders."""
+    return "".join(
+        str(replacements.get(text, text)) if is_placeholder else text
+        for text, is_placeholder in pieces
+    )
+
+def _set_text(t, text):
+    """Sets the text of a `w:t` node, keeping leading and trailing spaces."""
+    t.text = text
+    t.set(_XML_SPACE, "preserve")
+
+def replace_placeholders_in_element(element, replacements):
+    """Replaces placeholders in every paragraph below an XML element.
+
+    This covers body paragraphs, table cells at any nesting depth and text
+    boxes. Run formatting is kept.
+
+    Args:
+        element (lxml.etree._Element): The root element to search, e.g. a
+            document, header or footer part element.
+        replacements (dict): A dictionary where keys are placeholders
+            and values are the replacement strings.
+    """
+    for p in element.iter(_W_P):
+        nodes = _paragraph_text_nodes(p)
+        slots = tokenize_text_nodes([t.text or "" for t in nodes])
+        for index, pieces in slots.items():
+            _set_text(nodes[index], _fill(pieces, replacements))
+
+def text_parts(doc):
+    """Returns the XML parts of a document that may hold placeholders."""
+    return [
+        part for part in doc.part.package.iter_parts()
+        if isinstance(part, XmlPart) and part.content_type in TEXT_CONTENT_TYPES
+    ]
+
+class CompiledTemplate:
+    """A .docx template that is parsed once and rendered for many rows.
+
+    The template package is loaded a single time and every placeholder is
+    tokenized up front, across the document body, headers, footers, text
+    boxes and nested tables. Rendering a row copies only the pre-parsed XML
+    of those parts and rewrites the recorded text nodes in one pass, so
+    styles, numbering, media and the rest of the package are never re-read
+    from disk and the cost per row does not grow with the column count.
+
+    A compiled template owns one working package and is not thread-safe;
+    each worker should compile its own.
+    """
+
+    def __init__(self, template_file):
+        """Loads the template and records its placeholder slots.
+
+        Args:
+            template_file (str): Path to the .docx template file.
+        """
+        self.template_file = template_file
+        self._document = Document(template_file)
+        self._parts = text_parts(self._document)
+        self._masters = [copy.deepcopy(part._element) for part in self._parts]
+        self.placeholders = set()
+        self.slots = self._find_slots()
+
+    def _find_slots(self):
+        """Tokenizes every paragraph of every text part.
+
+        Also records every placeholder seen in `self.placeholders`.
+
+        Returns:
+            list: `(part_index, node_path, pieces)` tuples, one for each
+                `w:t` node whose text depends on a placeholder.
+        """
+        slots = []
+        for part_index, master in enumerate(self._masters):
+            for p in master.iter(_W_P):
+                nodes = _paragraph_text_nodes(p)
+                tokens = tokenize_text_nodes([t.text or "" for t in nodes])
+                for index, pieces in tokens.items():
+                    self.placeholders.update(text for text, is_placeholder in pieces if is_placeholder)
+                    slots.append((part_index, _element_path(master, nodes[index]), pieces))
+        return slots
+
+    @property
+    def has_placeholders_outside_body(self):
+        """True if headers, footers or notes use placeholders."""
+        main = self._document.part
+        return any(self._parts[part_index] is not main for part_index, _, _ in self.slots)
+
+    def render(self, replacements):
+        """Renders the template for one row.
+
+        Args:
+            replacements (dict): A dictionary where keys are placeholders
+                and values are the replacement strings.
+
+        Returns:
+            docx.Document: The rendered document, ready to be saved. It is
+                only valid until the next call to `render`.
+        """
+        roots = []
+        for part, master in zip(self._parts, self._masters):
+            part._element = copy.deepcopy(master)
+            roots.append(part._element)
+        for part_index, path, pieces in self.slots:
+            _set_text(_resolve_path(roots[part_index], path), _fill(pieces, replacements))
+        return self._document.part.document
@@ -0,0 +1,53 @@
+import os
+import pytest
+from checkpoint import CONVERTED, SENDING, SENT, Checkpoint, UnfinishedRunError, is_unfinished
+
+ROWS = [{"ID": str(number), "Email": f"user{number}@example.com"} for number in range(4)]
+
+def interrupted_run(path):
+    checkpoint = Checkpoint(path, "ID", run_info={"data_file": "data.csv"})
+    checkpoint.mark(ROWS[0], SENT)
+    checkpoint.mark(ROWS[1], SENDING)
+    checkpoint.mark(ROWS[2], CONVERTED)
+    checkpoint.close()
+
+def test_resume_keeps_the_states_of_the_interrupted_run(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    interrupted_run(path)
+    assert is_unfinished(path)
+    checkpoint = Checkpoint(path, "ID", resume=True)
+    assert checkpoint.run_info == {"data_file": "data.csv"}
+    assert [checkpoint.state(row) for row in ROWS] == [SENT, SENDING, CONVERTED, None]
+    assert checkpoint.counts() == {SENT: 1, SENDING: 1, CONVERTED: 1}
+    checkpoint.mark(ROWS[2], SENT)
+    checkpoint.mark(ROWS[3], SENT)
+    checkpoint.finish()
+    checkpoint.close()
+    assert not is_unfinished(path)
+
+def test_new_run_refuses_to_replace_an_unfinished_journal(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    interrupted_run(path)
+    with pytest.raises(UnfinishedRunError):
+        Checkpoint(path, "ID")
+    assert Checkpoint(path, "ID", resume=True).state(ROWS[0]) == SENT
+
+def test_fresh_run_archives_an_unfinished_journal(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    interrupted_run(path)
+    checkpoint = Checkpoint(path, "ID", fresh=True)
+    assert checkpoint.state(ROWS[0]) is None
+    assert checkpoint.archived and os.path.exists(checkpoint.archived)
+    checkpoint.close()
+    archived = Checkpoint(checkpoint.archived, "ID", resume=True)
+    assert archived.state(ROWS[0]) == SENT
+
+def test_new_run_replaces_a_finished_journal(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    checkpoint = Checkpoint(path, "ID")
+    checkpoint.mark(ROWS[0], SENT)
+    checkpoint.finish()
+    checkpoint.close()
+    checkpoint = Checkpoint(path, "ID")
+    assert checkpoint.state(ROWS[0]) is None
+    assert checkpoint.archived is None
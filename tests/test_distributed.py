@@ -0,0 +1,35 @@
+from distributed import WorkQueue
+
+def test_stale_claim_is_requeued_and_its_old_owner_locked_out(tmp_path):
+    queue = WorkQueue(str(tmp_path))
+    queue.add("shard-00000", 10)
+    shard, old_token = queue.claim("worker-a")
+    assert shard == "shard-00000"
+    assert queue.heartbeat(shard, old_token)
+
+    # Worker a stops answering; its claim goes back in the queue and worker b takes it.
+    assert queue.requeue_stale(stale_after=-1) == [shard]
+    assert queue.pending() == [shard]
+    assert not queue.heartbeat(shard, old_token)
+    shard, new_token = queue.claim("worker-b")
+    assert new_token != old_token
+
+    # Worker a comes back; nothing it does affects worker b's claim.
+    assert not queue.heartbeat(shard, old_token)
+    queue.requeue(shard, old_token)
+    assert queue.claimed() == [shard]
+    assert not queue.complete(shard, {"succeeded": 1}, old_token)
+    assert queue.done() == []
+
+    assert queue.heartbeat(shard, new_token)
+    assert queue.complete(shard, {"succeeded": 10}, new_token)
+    assert queue.done() == [shard]
+    assert queue.claimed() == []
+
+def test_completed_shard_is_not_claimed_again(tmp_path):
+    queue = WorkQueue(str(tmp_path))
+    queue.add("shard-00000", 10)
+    shard, token = queue.claim("worker-a")
+    assert queue.complete(shard, {"succeeded": 10}, token)
+    queue.add(shard, 10)
+    assert queue.claim("worker-b") is None
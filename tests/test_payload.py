@@ -0,0 +1,28 @@
+import pytest
+from payload import PayloadBuilder
+from transports import OutgoingMessage
+
+def headers(raw):
+    return raw.split(b"\r\n\r\n", 1)[0].split(b"\r\n")
+
+def test_line_breaks_in_subject_cannot_add_headers():
+    builder = PayloadBuilder("DocuMint <sender@example.com>")
+    raw = builder.build(OutgoingMessage("to@example.com", "Hello John\r\nBcc: victim@example.com", "<p>Hi</p>", []))
+    lines = headers(raw)
+    assert b"Subject: Hello John Bcc: victim@example.com" in lines
+    assert not any(line.lower().startswith(b"bcc:") for line in lines)
+
+def test_line_breaks_in_non_ascii_subject_are_folded():
+    builder = PayloadBuilder("sender@example.com")
+    raw = builder.build(OutgoingMessage("to@example.com", "Grüße\nBcc: victim@example.com", "", []))
+    assert not any(line.lower().startswith(b"bcc:") for line in headers(raw))
+
+@pytest.mark.parametrize("to", ["to@example.com\r\nBcc: victim@example.com", "to@example.com\nX-Injected: 1"])
+def test_line_breaks_in_recipient_are_rejected(to):
+    builder = PayloadBuilder("sender@example.com")
+    with pytest.raises(ValueError):
+        builder.build(OutgoingMessage(to, "Subject", "", []))
+
+def test_line_breaks_in_sender_are_rejected():
+    with pytest.raises(ValueError):
+        PayloadBuilder("sender@example.com\r\nBcc: victim@example.com")
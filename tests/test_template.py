@@ -0,0 +1,36 @@
+from docx import Document
+from template import CompiledTemplate
+
+def make_template(path):
+    document = Document()
+    paragraph = document.add_paragraph()
+    # Word often splits a placeholder over several runs, e.g. after an edit.
+    paragraph.add_run("Dear <Na")
+    paragraph.add_run("me>, your ID is <").bold = True
+    paragraph.add_run("ID>.")
+    document.sections[0].header.paragraphs[0].text = "Card for <Name>"
+    document.save(path)
+    return path
+
+def test_placeholders_split_across_runs(tmp_path):
+    template = CompiledTemplate(make_template(tmp_path / "template.docx"))
+    assert template.placeholders == {"<Name>", "<ID>"}
+    document = template.render({"<Name>": "Alice", "<ID>": "7"})
+    paragraph = document.paragraphs[0]
+    assert paragraph.text == "Dear Alice, your ID is 7."
+    # The runs and their formatting are kept.
+    assert len(paragraph.runs) == 3
+    assert paragraph.runs[1].bold
+
+def test_headers_and_repeated_renders(tmp_path):
+    template = CompiledTemplate(make_template(tmp_path / "template.docx"))
+    assert template.has_placeholders_outside_body
+    template.render({"<Name>": "Alice", "<ID>": "7"})
+    document = template.render({"<Name>": "Bob", "<ID>": "8"})
+    assert document.paragraphs[0].text == "Dear Bob, your ID is 8."
+    assert document.sections[0].header.paragraphs[0].text == "Card for Bob"
+
+def test_missing_placeholders_are_left_as_is(tmp_path):
+    template = CompiledTemplate(make_template(tmp_path / "template.docx"))
+    document = template.render({"<Name>": "Alice"})
+    assert document.paragraphs[0].text == "Dear Alice, your ID is <ID>."
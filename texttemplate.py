@@ -0,0 +1,203 @@
+"""Compiles the email subject, body and file name formats once per run.
+
+These formats are `str.format` strings whose fields are placeholders such
+as `{<Name>}`. Calling `str.format` for every row parses the string again
+each time and needs a dict holding every column of the row, although most
+columns are never used. A `TextTemplate` parses its string once and knows
+which placeholders it references; a `RowFormatter` combines the templates
+of a run with the placeholders of the document template, so each row only
+converts the values that something actually uses.
+"""
+import re
+import string
+
+# Characters Windows doesn't allow in file names, and control characters.
+_UNSAFE_FILENAME_CHARACTERS = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+
+_RESERVED_FILENAMES = {"CON", "PRN", "AUX", "NUL"} | {f"{name}{n}" for name in ("COM", "LPT") for n in range(1, 10)}
+
+_CONVERSIONS = {"s": str, "r": repr, "a": ascii}
+
+# A `{<Column>}` placeholder, with an optional conversion and simple spec.
+_PLACEHOLDER_FIELD = re.compile(r"\{<[^<>{}]*>(?:![rsa])?(?::[^{}]*)?\}")
+
+# Formats that were plain text before they took placeholders; braces in them
+# that aren't part of a placeholder are literal.
+_PLACEHOLDER_ONLY_FORMATS = frozenset({"subject"})
+
+def escape_literal_braces(text):
+    """Doubles every brace that isn't part of a `{<Column>}` placeholder.
+
+    Turns text that may contain stray braces, such as the subject
+    "Results {final}", into a format string that renders them as they are.
+
+    Args:
+        text (str): The text, with `{<Column>}` placeholders.
+
+    Returns:
+        str: A `str.format` string.
+    """
+    parts = []
+    position = 0
+    for match in _PLACEHOLDER_FIELD.finditer(text):
+        parts.append(text[position:match.start()].replace("{", "{{").replace("}", "}}"))
+        parts.append(match.group())
+        position = match.end()
+    parts.append(text[position:].replace("{", "{{").replace("}", "}}"))
+    return "".join(parts)
+
+def sanitize_filename(name):
+    """Makes a formatted file name safe to create on Windows and elsewhere.
+
+    Path separators and other forbidden characters become "_", trailing dots
+    and spaces are dropped and reserved device names such as "CON" are
+    prefixed with "_".
+
+    Args:
+        name (str): The file name, without extension.
+
+    Returns:
+        str: A name that is never empty.
+    """
+    name = _UNSAFE_FILENAME_CHARACTERS.sub("_", name).rstrip(" .")
+    if name.split(".")[0].upper() in _RESERVED_FILENAMES:
+        name = "_" + name
+    return name or "_"
+
+def unique_filename(name, used):
+    """Numbers repeats of a file name, ignoring case.
+
+    Args:
+        name (str): The file name, with extension.
+        used (set): Lowercased names handed out so far; updated.
+
+    Returns:
+        str: `name`, or e.g. "name (2).pdf" if it was used before.
+    """
+    stem, extension = name.rsplit(".", 1) if "." in name else (name, "")
+    extension = f".{extension}" if extension else ""
+    candidate = name
+    number = 2
+    while candidate.lower() in used:
+        candidate = f"{stem} ({number}){extension}"
+        number += 1
+    used.add(candidate.lower())
+    return candidate
+
+def row_value(value):
+    """Returns the text a data cell contributes to documents and emails."""
+    return str(value).strip()
+
+class TextTemplate:
+    """A `str.format` string with `{<Column>}` fields, parsed once.
+
+    Rendering gives exactly what `text.format(**replacements)` would,
+    including format specs, conversions and doubled braces, and raises the
+    same errors for missing fields.
+
+    Attributes:
+        text (str): The format string.
+        fields (frozenset): The placeholders it references, e.g. `<ID>`.
+    """
+
+    def __init__(self, text):
+        """Parses the format string.
+
+        Args:
+            text (str): The format string.
+
+        Raises:
+            ValueError: If the format string is malformed.
+        """
+        self.text = text
+        self._pieces = []
+        # Fields that aren't plain placeholders, such as "{}" or "{<a>.b}",
+        # or specs with nested fields, are left to str.format.
+        self._simple = True
+        for literal, field, spec, conversion in string.Formatter().parse(text):
+            if literal:
+                self._pieces.append((literal, None, None, None))
+            if field is None:
+                continue
+            if not (field.startswith("<") and field.endswith(">")) or "{" in spec:
+                self._simple = False
+            self._pieces.append((None, field, spec, _CONVERSIONS.get(conversion)))
+        # "{<a>.b}" and "{<a>[0]}" need the value of "<a>".
+        self.fields = frozenset(re.split(r"[.\[]", field, maxsplit=1)[0] for _, field, _, _ in self._pieces if field)
+
+    def render(self, replacements):
+        """Formats the string for one row.
+
+        Args:
+            replacements (dict): Maps placeholders to their values.
+
+        Raises:
+            KeyError: If a field has no value.
+        """
+        if not self._simple:
+            return self.text.format(**replacements)
+        parts = []
+        for literal, field, spec, conversion in self._pieces:
+            if field is None:
+                parts.append(literal)
+                continue
+            value = replacements[field]
+            if conversion is not None:
+                value = conversion(value)
+            parts.append(format(value, spec) if spec else str(value))
+        return "".join(parts)
+
+class RowFormatter:
+    """The text templates of a run, and the row values they need.
+
+    Attributes:
+        templates (dict): The compiled `TextTemplate` of each named format.
+        placeholders (frozenset): Every placeholder used by the document
+            template or any of the formats.
+    """
+
+    def __init__(self, placeholders=(), **formats):
+        """Compiles the formats.
+
+        Args:
+            placeholders (iterable, optional): Placeholders of the document
+                template, e.g. `CompiledTemplate.placeholders`.
+            **formats: Format strings by name, e.g. `subject`, `body` or
+                `filename`. Formats that are None are left out. In the
+                `subject`, only `{<Column>}` placeholders are fields and any
+                other braces are kept as they are.
+
+        Raises:
+            ValueError: If a format string is malformed, naming which one.
+        """
+        self.templates = {}
+        for name, text in formats.items():
+            if text is None:
+                continue
+            if name in _PLACEHOLDER_ONLY_FORMATS:
+                text = escape_literal_braces(text)
+            try:
+                self.templates[name] = TextTemplate(text)
+            except ValueError as e:
+                raise ValueError(f"The {name} format is not a valid format string: {e}") from e
+        self.placeholders = frozenset(placeholders).union(*(template.fields for template in self.templates.values()))
+        self._columns = tuple((placeholder, placeholder[1:-1]) for placeholder in sorted(self.placeholders))
+
+    def replacements(self, row):
+        """Returns the values of the placeholders a row's outputs need.
+
+        Placeholders with no matching column are left out, so the document
+        template keeps them as they are and formats raise `KeyError`.
+
+        Args:
+            row (dict): The data row, mapping column names to values.
+        """
+        return {placeholder: row_value(row[column]) for placeholder, column in self._columns if column in row}
+
+    def format(self, name, replacements):
+        """Renders one of the formats for a row."""
+        return self.templates[name].render(replacements)
+
+    def filename(self, replacements):
+        """Renders the `filename` format for a row and sanitizes the result."""
+        return sanitize_filename(self.format("filename", replacements))
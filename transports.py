@@ -0,0 +1,328 @@
+import asyncio
+import os
+import queue
+import smtplib
+import ssl
+import threading
+from collections import namedtuple
+from email.utils import parseaddr
+from payload import PayloadBuilder
+
+OutgoingMessage = namedtuple("OutgoingMessage", "to subject html_body attachments shared", defaults=((),))
+OutgoingMessage.__doc__ = """One email to send: recipient, subject, HTML body and attachment paths.
+
+`shared` holds the `payload.SharedAttachment`s sent with every message of the run."""
+
+class Transport:
+    """Base class for the ways DocuMint can send email.
+
+    `send` may be called from several threads at once.
+    """
+
+    name = "base"
+
+    def send(self, message):
+        """Sends one message.
+
+        Args:
+            message (OutgoingMessage): The message to send.
+
+        Raises:
+            Exception: If the message could not be sent.
+        """
+        raise NotImplementedError
+
+    async def send_async(self, message):
+        """Sends one message from an asyncio event loop.
+
+        Transports without native asyncio support run `send` in a worker
+        thread. If the await is cancelled or times out, that thread may
+        still finish sending.
+
+        Args:
+            message (OutgoingMessage): The message to send.
+        """
+        await asyncio.to_thread(self.send, message)
+
+    def close(self):
+        """Releases connections or other resources held by the transport."""
+
+    async def close_async(self):
+        """Releases resources that belong to the event loop `send_async` ran on."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class OutlookTransport(Transport):
+    """Sends email through the local Microsoft Outlook installation."""
+
+    name = "outlook"
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _outlook(self):
+        # COM objects can't be shared between threads, so every thread that
+        # sends mail gets its own.
+        if not hasattr(self._local, "app"):
+            import pythoncom
+            import win32com.client
+
+            pythoncom.CoInitialize()
+            self._local.app = win32com.client.Dispatch("Outlook.Application")
+        return self._local.app
+
+    def send(self, message):
+        mail = self._outlook().CreateItem(0)
+        mail.To = message.to
+        mail.Subject = message.subject
+        mail.HTMLBody = message.html_body
+        for path in message.attachments:
+            mail.Attachments.Add(os.path.abspath(path))
+        # Outlook only takes attachments by path, so shared files can't be
+        # handed over pre-encoded.
+        for shared in message.shared:
+            mail.Attachments.Add(shared.path)
+        mail.Send()
+
+class SMTPTransport(Transport):
+    """Sends email over a pool of persistent, authenticated SMTP connections.
+
+    Up to `pool_size` connections are opened on demand and reused for every
+    following message, so the TCP, TLS and AUTH handshakes happen once per
+    connection instead of once per message. Several threads can send at the
+    same time, each over its own connection. A connection the server has
+    dropped is replaced and the message is sent again once.
+
+    Messages are assembled as raw bytes by a `payload.PayloadBuilder`, so
+    shared attachments and repeated bodies are encoded once per run.
+
+    If the optional `aiosmtplib` package is installed, `send_async` keeps a
+    second pool of asyncio connections, so one event loop thread can drive
+    all of them at once.
+    """
+
+    name = "smtp"
+
+    def __init__(self, host, port=587, username=None, password=None, sender=None,
+                 starttls=True, use_ssl=False, pool_size=4, timeout=30):
+        """Configures the transport. No connection is opened yet.
+
+        Args:
+            host (str): SMTP server host name.
+            port (int, optional): SMTP server port.
+            username (str, optional): Login name; no AUTH if omitted.
+            password (str, optional): Login password.
+            sender (str, optional): The From address. Defaults to `username`.
+            starttls (bool, optional): Upgrade plain connections with STARTTLS.
+            use_ssl (bool, optional): Connect with implicit TLS (port 465).
+            pool_size (int, optional): Maximum number of open connections.
+            timeout (int, optional): Socket timeout in seconds.
+        """
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.sender = sender or username
+        if not self.sender:
+            raise ValueError("An SMTP sender address or username is required.")
+        if not parseaddr(self.sender)[1]:
+            raise ValueError(f"'{self.sender}' is not a valid sender address.")
+        self._payload = PayloadBuilder(self.sender)
+        self.starttls = starttls and not use_ssl
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max(1, pool_size))
+        self._lock = threading.Lock()
+        self._open = []
+        self._pool_size = max(1, pool_size)
+        self._async_idle = None
+        self._async_slots = None
+        self._async_open = []
+
+    def _connect(self):
+        context = ssl.create_default_context()
+        if self.use_ssl:
+            connection = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout, context=context)
+        else:
+            connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        # A connection that fails to start TLS or log in is closed here; it
+        # isn't tracked yet, so nothing else would close it.
+        try:
+            if self.starttls:
+                connection.starttls(context=context)
+            if self.username:
+                connection.login(self.username, self.password or "")
+        except BaseException:
+            connection.close()
+            raise
+        with self._lock:
+            self._open.append(connection)
+        return connection
+
+    def _discard(self, connection):
+        with self._lock:
+            if connection in self._open:
+                self._open.remove(connection)
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def build(self, message):
+        """Returns the raw MIME bytes of an `OutgoingMessage`."""
+        return self._payload.build(message)
+
+    def send(self, message):
+        raw = self.build(message)
+        with self._slots:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                connection = self._connect()
+            try:
+                connection.sendmail(self.sender or "", [message.to], raw)
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                self._discard(connection)
+                connection = self._connect()
+                try:
+                    connection.sendmail(self.sender or "", [message.to], raw)
+                except Exception:
+                    self._discard(connection)
+                    raise
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+                # The server rejected this message; the connection is fine.
+                self._idle.put(connection)
+                raise
+            except Exception:
+                self._discard(connection)
+                raise
+            self._idle.put(connection)
+
+    def close(self):
+        with self._lock:
+            connections, self._open = self._open, []
+        for connection in connections:
+            try:
+                connection.quit()
+            except Exception:
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+
+    async def _connect_async(self, aiosmtplib):
+        connection = aiosmtplib.SMTP(
+            hostname=self.host, port=self.port, timeout=self.timeout,
+            use_tls=self.use_ssl, start_tls=self.starttls,
+            tls_context=ssl.create_default_context(),
+        )
+        try:
+            await connection.connect()
+            if self.username:
+                await connection.login(self.username, self.password or "")
+        except BaseException:
+            connection.close()
+            raise
+        self._async_open.append(connection)
+        return connection
+
+    async def _discard_async(self, connection):
+        if connection in self._async_open:
+            self._async_open.remove(connection)
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    async def send_async(self, message):
+        try:
+            import aiosmtplib
+        except ImportError:
+            return await super().send_async(message)
+
+        if self._async_slots is None:
+            self._async_idle = asyncio.LifoQueue()
+            self._async_slots = asyncio.Semaphore(self._pool_size)
+        raw = self.build(message)
+        async with self._async_slots:
+            try:
+                connection = self._async_idle.get_nowait()
+            except asyncio.QueueEmpty:
+                connection = await self._connect_async(aiosmtplib)
+            try:
+                await connection.sendmail(self.sender or "", [message.to], raw)
+            except (aiosmtplib.SMTPServerDisconnected, ConnectionError):
+                await self._discard_async(connection)
+                connection = await self._connect_async(aiosmtplib)
+                try:
+                    await connection.sendmail(self.sender or "", [message.to], raw)
+                except BaseException:
+                    await self._discard_async(connection)
+                    raise
+            except (aiosmtplib.SMTPResponseException, aiosmtplib.SMTPRecipientsRefused):
+                # The server rejected this message; the connection is fine.
+                self._async_idle.put_nowait(connection)
+                raise
+            except BaseException:
+                # Includes cancellation and timeouts, which leave the
+                # connection mid-transaction.
+                await self._discard_async(connection)
+                raise
+            self._async_idle.put_nowait(connection)
+
+    async def close_async(self):
+        connections, self._async_open = self._async_open, []
+        for connection in connections:
+            try:
+                await connection.quit()
+            except Exception:
+                connection.close()
+        self._async_idle = None
+        self._async_slots = None
+
+class StubTransport(Transport):
+    """Accepts every message without sending it anywhere.
+
+    Intended for tests and benchmarks; `sent` counts the accepted messages.
+    """
+
+    name = "stub"
+
+    def __init__(self):
+        self.sent = 0
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        with self._lock:
+            self.sent += 1
+
+    async def send_async(self, message):
+        self.send(message)
+
+def create_transport(name="outlook", **options):
+    """Creates a transport by name.
+
+    Args:
+        name (str, optional): "outlook", "smtp" or "stub".
+        **options: Passed to the transport, e.g. `host` and `port` for SMTP.
+
+    Returns:
+        Transport: The transport.
+    """
+    if name == "outlook":
+        return OutlookTransport()
+    if name == "smtp":
+        return SMTPTransport(**options)
+    if name == "stub":
+        return StubTransport()
+    raise ValueError(f"Unknown transport '{name}'. Choose from: outlook, smtp, stub")
@@ -0,0 +1,187 @@
+import re
+import string
+import pandas as pd
+from sources import iter_rows
+from texttemplate import escape_literal_braces, sanitize_filename
+
+EMAIL_PATTERN = re.compile(r"^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}$")
+
+def format_fields(format_string):
+    """Returns the field names used by a `str.format` string, e.g. `<ID>`."""
+    return [field for _, field, _, _ in string.Formatter().parse(format_string) if field]
+
+def read_frame(data_file, columns):
+    """Reads selected columns of a data file into a DataFrame of strings.
+
+    Rows are streamed and only the requested columns are kept, so memory
+    stays proportional to those columns. The index matches the row indexes
+    yielded by `sources.iter_rows`.
+
+    Args:
+        data_file (str): Path to the data file.
+        columns (list): Names of the columns to keep.
+
+    Returns:
+        pandas.DataFrame: One stripped string column per requested column.
+    """
+    index = []
+    values = {column: [] for column in columns}
+    for row_index, row in iter_rows(data_file):
+        index.append(row_index)
+        for column in columns:
+            values[column].append(row.get(column, ""))
+    frame = pd.DataFrame(values, index=index, dtype=object)
+    return frame.astype(str).apply(lambda column: column.str.strip())
+
+def format_column(frame, format_string):
+    """Applies a `str.format` string with `<Column>` fields to every row.
+
+    Plain `{<Column>}` fields are joined column-wise with vectorized string
+    operations; format strings that use conversions or format specs fall
+    back to formatting row by row.
+
+    Args:
+        frame (pandas.DataFrame): String columns named after the fields.
+        format_string (str): E.g. "Admit_{<ID>}".
+
+    Returns:
+        pandas.Series: The formatted string for each row.
+    """
+    parsed = list(string.Formatter().parse(format_string))
+    if any(spec or conversion for _, field, spec, conversion in parsed if field):
+        return frame.apply(lambda row: format_string.format(**{f"<{k}>": v for k, v in row.items()}), axis=1)
+    result = pd.Series("", index=frame.index, dtype=object)
+    for literal, field, _, _ in parsed:
+        result = result + literal.replace("{{", "{").replace("}}", "}")
+        if field:
+            result = result + frame[field[1:-1]]
+    return result
+
+class ValidationReport:
+    """The outcome of checking a whole data file before a run.
+
+    Attributes:
+        total_rows (int): Number of data rows checked.
+        errors (list): Problems that make the run pointless, e.g. a column
+            the PDF filename needs is missing. The run should not start.
+        warnings (list): Problems worth telling the user about that don't
+            stop the run, e.g. template placeholders with no column.
+        skipped (dict): Maps the index of each row that must not be
+            processed to the reason why.
+        invalid_emails (int): Rows skipped for a malformed email address.
+        duplicate_emails (int): Rows whose email address appeared before.
+        filename_collisions (int): Rows whose PDF filename an earlier row
+            produces too.
+    """
+
+    def __init__(self):
+        self.total_rows = 0
+        self.errors = []
+        self.warnings = []
+        self.skipped = {}
+        self.invalid_emails = 0
+        self.duplicate_emails = 0
+        self.filename_collisions = 0
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def accepts(self, index):
+        """Returns True if the row with this index is in the work set."""
+        return index not in self.skipped
+
+    def summary_lines(self):
+        """Returns the report as log lines."""
+        if self.errors:
+            return ["❌ Validation failed; nothing was processed."] + [f"❌ {error}" for error in self.errors]
+        lines = [
+            f"Validated {self.total_rows} rows: {self.total_rows - len(self.skipped)} to process, "
+            f"{self.invalid_emails} invalid emails, {self.duplicate_emails} duplicate emails, "
+            f"{self.filename_collisions} filename collisions."
+        ]
+        lines.extend(f"⚠ {warning}" for warning in self.warnings)
+        return lines
+
+def validate_dataset(data_file, columns, placeholders, pdf_filename_format, email_body="",
+                     email_column="Email", skip_duplicate_emails=False, email_subject="",
+                     skip_filename_collisions=False):
+    """Checks the whole data file before anything is rendered.
+
+    Only the columns the checks need are read. Emails are matched with a
+    precompiled pattern and duplicates and filename collisions are found
+    with pandas string operations over whole columns.
+
+    Args:
+        data_file (str): Path to the data file.
+        columns (list): The data file's column names.
+        placeholders (set): Placeholders used by the template, e.g. `<Name>`.
+        pdf_filename_format (str): The format for the PDF filenames.
+        email_body (str, optional): The HTML body of the email.
+        email_column (str, optional): The column holding email addresses.
+        skip_duplicate_emails (bool, optional): If True, rows repeating an
+            earlier email address are skipped instead of only counted.
+        email_subject (str, optional): The subject of the email. Braces
+            that aren't part of a placeholder are literal.
+        skip_filename_collisions (bool, optional): If True, rows whose PDF
+            filename an earlier row produces are skipped. By default they
+            are only counted, and the run numbers their names.
+
+    Returns:
+        ValidationReport: The report, including the rows to skip.
+    """
+    report = ValidationReport()
+    available = set(columns)
+
+    if email_column not in available:
+        report.errors.append(f"The data file has no '{email_column}' column.")
+    missing = sorted({placeholder for placeholder in placeholders if placeholder[1:-1] not in available})
+    if missing:
+        report.warnings.append(f"Template placeholders with no matching column (left as is): {', '.join(missing)}")
+    fields_by_label = {}
+    for label, format_string in (("PDF filename format", pdf_filename_format), ("email subject", escape_literal_braces(email_subject)),
+                                 ("email body", email_body)):
+        try:
+            fields = fields_by_label[label] = format_fields(format_string)
+        except ValueError as e:
+            report.errors.append(f"The {label} is not a valid format string: {e}")
+            continue
+        unknown = sorted({field for field in fields if not (field.startswith("<") and field.endswith(">")) or field[1:-1] not in available})
+        if unknown:
+            report.errors.append(f"The {label} uses fields with no matching column: {', '.join(unknown)}")
+    if report.errors:
+        return report
+
+    filename_fields = fields_by_label["PDF filename format"]
+    needed = [email_column] + [field[1:-1] for field in filename_fields if field[1:-1] != email_column]
+    frame = read_frame(data_file, list(dict.fromkeys(needed)))
+    report.total_rows = len(frame)
+
+    emails = frame[email_column]
+    invalid = ~emails.str.match(EMAIL_PATTERN)
+    report.invalid_emails = int(invalid.sum())
+    for index in emails.index[invalid]:
+        report.skipped[index] = "Invalid Email Format"
+
+    valid = emails[~invalid]
+    duplicated = valid.str.lower().duplicated(keep="first")
+    report.duplicate_emails = int(duplicated.sum())
+    if skip_duplicate_emails:
+        for index in valid.index[duplicated]:
+            report.skipped.setdefault(index, "Duplicate Email")
+    elif report.duplicate_emails:
+        report.warnings.append(f"{report.duplicate_emails} rows repeat an email address used by an earlier row.")
+
+    # Compare the names the files will really get; Windows file names are
+    # case-insensitive, so compare them lowercased.
+    filenames = format_column(frame[~invalid], pdf_filename_format).map(sanitize_filename)
+    collisions = filenames.str.lower().duplicated(keep="first")
+    report.filename_collisions = int(collisions.sum())
+    if skip_filename_collisions:
+        for index in filenames.index[collisions]:
+            report.skipped.setdefault(index, f"Duplicate PDF filename '{filenames[index]}'")
+    elif report.filename_collisions:
+        report.warnings.append(f"{report.filename_collisions} rows produce a PDF filename used by an earlier row; "
+                               "they get numbered names such as 'Card (2).pdf'.")
+
+    return report